@@ -1,9 +1,11 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import pandas as pd
 from db.database import TraderDatabase
 import numpy as np
 from data.HyperliquidAnalytics import HyperliquidAnalytics
 from data.HyperliquidDataService import HyperliquidDataService
+from data.ColumnarStore import OrderBatch, DAY_NAMES
+from data.CohortAggregator import CohortAggregator, prompt_table
 from llm_agent import LLMAgent, LLMProvider
 import json
 from time import sleep
@@ -22,7 +24,8 @@ class AnalysisAgent:
         self.data_service = data_service or HyperliquidDataService()
         self.llm = llm_agent or LLMAgent(provider=LLMProvider.ANTHROPIC)
         
-    def analyze_all_traders(self, trader_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def analyze_all_traders(self, trader_data: List[Dict[str, Any]],
+                            market_activity: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Analyze trading patterns across traders
         
         Args:
@@ -30,98 +33,74 @@ class AnalysisAgent:
                 If None, will fetch top N traders from data service.
             top_n (int, optional): Number of top traders to analyze if trader_data is None.
                 Defaults to 100.
+            market_activity (Dict[str, Any], optional): Market activity insights already
+                generated for the whole cohort. If None, they are generated from the
+                coin flows of these traders.
         """
         all_trader_data = trader_data
             
         # Generate insights using LLM
-        insights = self._generate_insights(all_trader_data)
+        insights = self._generate_insights(all_trader_data, market_activity)
         
         return {
             'insights': insights,
             'trader_count': len(all_trader_data)
         }
     
-    def _summarize_trader_data(self, orders_df: pd.DataFrame) -> Dict[str, Any]:
-        """Summarize trader's order data to reduce context size"""
-        if orders_df.empty:
+    def _summarize_trader_data(self, orders: OrderBatch) -> Dict[str, Any]:
+        """Summarize trader's order data to reduce context size
+
+        Works directly on the columnar batch: counts come from bincounts over
+        the categorical codes and the millisecond timestamps.
+        """
+        if len(orders) == 0:
             return {}
             
+        hours = orders.hour_of_day()
+        hourly = np.bincount(hours, minlength=24)
+        days = np.bincount(orders.day_of_week(), minlength=7)
+        daily = {DAY_NAMES[day]: int(days[day]) for day in np.argsort(DAY_NAMES) if days[day] > 0}
+
         # Basic statistics
         summary = {
-            'total_orders': len(orders_df),
-            'unique_coins': orders_df['coin'].nunique(),
-            'order_types': orders_df['orderType'].value_counts().to_dict(),
-            'side_distribution': orders_df['side'].value_counts().to_dict(),
+            'total_orders': len(orders),
+            'unique_coins': int(np.unique(orders.coin.codes[orders.coin.codes >= 0]).size),
+            'order_types': orders.category_counts(orders.order_type),
+            'side_distribution': orders.category_counts(orders.side),
             'time_distribution': {
-                'hourly': orders_df.groupby(orders_df['timestamp'].dt.hour).size().to_dict(),
-                'daily': orders_df.groupby(orders_df['timestamp'].dt.day_name()).size().to_dict()
+                'hourly': {hour: int(hourly[hour]) for hour in range(24) if hourly[hour] > 0},
+                'daily': daily
             }
         }
         
         # Position analysis
         positions = {}
-        for coin in orders_df['coin'].unique():
-            coin_orders = orders_df[orders_df['coin'] == coin]
+        for code, coin in enumerate(orders.coin.categories):
+            mask = orders.coin.codes == code
+            sizes = orders.sz[mask]
             positions[coin] = {
-                'total_orders': len(coin_orders),
-                'avg_size': coin_orders['sz'].mean(),
-                'max_size': coin_orders['sz'].max(),
-                'side_distribution': coin_orders['side'].value_counts().to_dict()
+                'total_orders': int(mask.sum()),
+                'avg_size': float(np.nanmean(sizes)) if not np.isnan(sizes).all() else float('nan'),
+                'max_size': float(np.nanmax(sizes)) if not np.isnan(sizes).all() else float('nan'),
+                'side_distribution': orders.category_counts(orders.side, mask)
             }
         summary['positions'] = positions
         
         # Time-based patterns
         summary['trading_hours'] = {
-            'most_active_hour': orders_df.groupby(orders_df['timestamp'].dt.hour).size().idxmax(),
-            'most_active_day': orders_df.groupby(orders_df['timestamp'].dt.day_name()).size().idxmax()
+            'most_active_hour': int(np.argmax(hourly)),
+            'most_active_day': max(daily, key=daily.get)
         }
         
         return summary
     
-    def _generate_insights(self, all_trader_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _generate_insights(self, all_trader_data: List[Dict[str, Any]],
+                           market_activity: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Generate insights using LLM by analyzing summarized trading data"""
-        # First, analyze current market activity
-        current_prompt = f"""
-        You are an expert cryptocurrency trading analyst. Analyze the following trading data 
-        and focus specifically on current market activity and trader behavior.
-
-        TRADER DATA:
-        {json.dumps(all_trader_data, indent=2)}
-
-        Analyze this data and provide insights about current market activity in the following JSON format:
-        {{
-            "market_activity": {{
-                "active_traders": "Number of active traders in the last 24 hours",
-                "most_bought_assets": ["List of assets with highest buy volume in last 24h"],
-                "most_sold_assets": ["List of assets with highest sell volume in last 24h"],
-                "buying_pressure": {{
-                    "assets": ["List of assets showing strong buying pressure"],
-                    "evidence": ["Evidence supporting buying pressure for each asset"]
-                }},
-                "selling_pressure": {{
-                    "assets": ["List of assets showing strong selling pressure"],
-                    "evidence": ["Evidence supporting selling pressure for each asset"]
-                }},
-                "position_changes": {{
-                    "increasing_positions": ["Assets where traders are increasing positions"],
-                    "decreasing_positions": ["Assets where traders are decreasing positions"]
-                }},
-                "market_sentiment": "Overall market sentiment based on trader behavior",
-                "notable_patterns": ["List of notable patterns in current trading activity"]
-            }}
-        }}
-
-        Focus on identifying current market trends and trader behavior and do not be generic.
-        Consider order sizes, frequency, and timing.
-        Return ONLY valid JSON, no other text.
-        """
-        
-        current_response = self.llm.generate_response(current_prompt)
-        current_insights = self.llm.parse_json_response(current_response)
-        
-        print(current_insights)
-        
-        sleep(10)
+        # First, analyze current market activity from the per-coin flows
+        if market_activity is None:
+            coin_flows = CohortAggregator(TraderDatabase()).build(analyses=all_trader_data)
+            market_activity = self._generate_market_activity(coin_flows)
         
         # Then analyze trading styles
         style_prompt = f"""
@@ -239,7 +218,7 @@ class AnalysisAgent:
         
         # Combine all insights into a structured format
         return {
-            "market_activity": current_insights.get("data", {}).get("market_activity", {}),
+            "market_activity": market_activity,
             "trading_styles": style_insights.get("data", {}).get("trading_styles", {}),
             "market_behavior": market_insights.get("data", {}).get("market_behavior", {}),
             "risk_analysis": market_insights.get("data", {}).get("risk_analysis", {}),
@@ -249,6 +228,70 @@ class AnalysisAgent:
             "evolution": strategy_insights.get("data", {}).get("evolution", {})
         }
     
+    def _generate_market_activity(self, coin_flows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Generate market activity insights from per-coin flows
+        
+        The buy/sell volumes, net flows, trader counts and position changes
+        are computed by CohortAggregator, so the LLM only interprets a small
+        table of numbers instead of reading raw trader analyses.
+        
+        Args:
+            coin_flows (List[Dict[str, Any]]): Rows from CohortAggregator, most traded first
+            
+        Returns:
+            Dict[str, Any]: The market_activity insights
+        """
+        table = prompt_table(coin_flows)
+        hours = table['window_hours'] or 24
+        prompt = f"""
+        You are an expert cryptocurrency trading analyst. Analyze the following per-coin aggregates 
+        of all tracked traders and focus specifically on current market activity and trader behavior.
+
+        COIN FLOWS (one row per coin, most traded first):
+        - traders, order_count: analysed traders trading the coin and their orders
+        - active_traders, buyers, sellers: traders with fills in the last {hours}h, and those buying or selling
+        - buy_volume, sell_volume, net_flow: USD notional filled in the last {hours}h and buy minus sell
+        - net_position_change: summed change in position size (coin units) in the last {hours}h
+        - increasing_positions, decreasing_positions: traders whose absolute position grew or shrank
+
+        {json.dumps(table, separators=(',', ':'))}
+
+        Analyze this data and provide insights about current market activity in the following JSON format:
+        {{
+            "market_activity": {{
+                "active_traders": "Number of active traders in the last {hours} hours",
+                "most_bought_assets": ["List of assets with highest buy volume in last {hours}h"],
+                "most_sold_assets": ["List of assets with highest sell volume in last {hours}h"],
+                "buying_pressure": {{
+                    "assets": ["List of assets showing strong buying pressure"],
+                    "evidence": ["Evidence supporting buying pressure for each asset"]
+                }},
+                "selling_pressure": {{
+                    "assets": ["List of assets showing strong selling pressure"],
+                    "evidence": ["Evidence supporting selling pressure for each asset"]
+                }},
+                "position_changes": {{
+                    "increasing_positions": ["Assets where traders are increasing positions"],
+                    "decreasing_positions": ["Assets where traders are decreasing positions"]
+                }},
+                "market_sentiment": "Overall market sentiment based on trader behavior",
+                "notable_patterns": ["List of notable patterns in current trading activity"]
+            }}
+        }}
+
+        Base every claim on the numbers above and do not be generic.
+        Return ONLY valid JSON, no other text.
+        """
+        
+        response = self.llm.generate_response(prompt)
+        insights = self.llm.parse_json_response(response)
+        
+        print(insights)
+        
+        sleep(10)
+        
+        return insights.get("data", {}).get("market_activity", {})
+    
     def process_traders_in_batches(self, batch_size: int = 40) -> Dict[str, Any]:
         """Process traders in batches and aggregate results
         
@@ -262,6 +305,11 @@ class AnalysisAgent:
         total_traders = db.get_total_trader_count()
         all_insights = []
         
+        # Market activity comes from one numeric pass over every stored analysis and fill
+        coin_flows = CohortAggregator(db).refresh()
+        print(f'Aggregated flows for {len(coin_flows)} coins')
+        market_activity = self._generate_market_activity(coin_flows)
+        
         # Process in batches
         ## TODO:Put limit on total traders for now 
         total_traders = 1000
@@ -270,7 +318,7 @@ class AnalysisAgent:
             analyses = db.get_all_trader_analyses(limit=35, offset=offset)
             
             # Analyze batch
-            batch_results = self.analyze_all_traders(trader_data=analyses)
+            batch_results = self.analyze_all_traders(trader_data=analyses, market_activity=market_activity)
             print(f'Batch {offset} results: {batch_results}')
             all_insights.append(batch_results['insights'])
             
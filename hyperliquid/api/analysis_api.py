@@ -1,12 +1,17 @@
-from fastapi import FastAPI, HTTPException
-from typing import List, Dict, Any
+from fastapi import FastAPI, HTTPException, Response
+from typing import List, Dict, Any, Optional
 from agent.AnalysisAgent import AnalysisAgent
 from db.database import TraderDatabase
 from datetime import datetime, timedelta
 from data.SentimentDataService import SentimentDataService
 from data.VaultDataService import VaultDataService
-from data.HyperliquidDataService import HyperliquidDataService
+from data.HyperliquidDataService import HyperliquidDataService, HyperliquidAPIError
+from data.ChartRenderer import ChartRenderer, chart_inputs, chart_key
+from data.RollingMetrics import RollingMetrics, WINDOWS
+from data.SimilarityIndex import SimilarityIndex
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import json
 import os
 
@@ -26,6 +31,14 @@ sentiment_service = SentimentDataService()
 vault_service = VaultDataService()
 hyperliquid_service = HyperliquidDataService()
 analysis_agent = AnalysisAgent()
+# Render processes are only started by the first chart request
+chart_renderer = ChartRenderer()
+# Built from the stored analyses by the first similarity request
+similarity_index = SimilarityIndex(TraderDatabase())
+
+@app.on_event("shutdown")
+def stop_chart_renderer():
+    chart_renderer.shutdown()
 
 @app.get("/analysis/recent", response_model=Dict[str, Any])
 async def get_recent_analysis():
@@ -182,6 +195,31 @@ async def get_coin_metrics(limit: int = 50, min_galaxy_score: float = None):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/analysis/flows", response_model=Dict[str, Any])
+async def get_coin_flows(limit: int = 50):
+    """Get per-coin buy/sell volume, net flow, trader counts and position changes
+    
+    Served from the coin_flows table written by the analysis job.
+    
+    Args:
+        limit (int): Number of coins to return, most traded first. Defaults to 50.
+    """
+    try:
+        db = TraderDatabase()
+        flows = await run_in_threadpool(db.get_coin_flows, limit)
+        return {
+            "status": "success",
+            "data": {
+                "coins": flows
+            },
+            "metadata": {
+                "timestamp": datetime.utcnow().isoformat(),
+                "updated_at": flows[0]['updated_at'] if flows else None
+            }
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/analysis/trader/{address}", response_model=Dict[str, Any])
 async def get_trader_analysis(address: str):
     """Get analysis for a specific trader
@@ -419,11 +457,15 @@ async def get_user_positions(address: str):
         Dict[str, Any]: User's current positions and analysis
     """
     try:
-        # Get user positions
-        positions = hyperliquid_service.get_user_positions(address)
+        # Get user positions off the event loop; concurrent requests for the
+        # same address share one upstream call
+        try:
+            positions = await run_in_threadpool(hyperliquid_service.get_user_positions, address)
+        except HyperliquidAPIError as e:
+            raise HTTPException(status_code=502, detail=str(e))
         
         # Analyze positions against market data
-        analysis = analysis_agent.analyze_user_positions(positions)
+        analysis = await run_in_threadpool(analysis_agent.analyze_user_positions, positions)
         
         return {
             "status": "success",
@@ -436,6 +478,119 @@ async def get_user_positions(address: str):
                 "timestamp": datetime.utcnow().isoformat()
             }
         }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/analysis/charts/{address}/{name}")
+async def get_trader_chart(address: str, name: str):
+    """Get a chart of a trader's latest analysis as a PNG
+    
+    Charts are rendered in a separate process on first request and cached
+    by a hash of their input data.
+    
+    Args:
+        address (str): Trader's address
+        name (str): Chart name, "hourly_activity" or "asset_distribution"
+    """
+    try:
+        db = TraderDatabase()
+        analysis = await run_in_threadpool(db.get_trader_analysis, address)
+        if not analysis:
+            raise HTTPException(status_code=404, detail="Trader analysis not found")
+        
+        inputs = chart_inputs(analysis[0].get('metrics', {}))
+        if name not in inputs:
+            raise HTTPException(status_code=404, detail=f"Chart {name} not available for this trader")
+        
+        png = await asyncio.wrap_future(chart_renderer.render(name, inputs[name]))
+        return Response(
+            content=png,
+            media_type="image/png",
+            headers={"ETag": f'"{chart_key(name, inputs[name])}"'}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/analysis/windows/{address}", response_model=Dict[str, Any])
+async def get_trader_windows(address: str, window: Optional[str] = None, hours: Optional[int] = None):
+    """Get a trader's PnL, volume, trade count and win rate over rolling windows
+    
+    Windows are read off the hourly prefix sums stored with the trader's
+    latest analysis, relative to the current time.
+    
+    Args:
+        address (str): Trader's address
+        window (str, optional): One of "24h", "7d", "30d", "90d" or "all"
+        hours (int, optional): A custom window length in hours
+    """
+    try:
+        if window is not None and window != 'all' and window not in WINDOWS:
+            raise HTTPException(status_code=400, detail=f"Unknown window {window}, expected one of {', '.join(WINDOWS)} or all")
+        if hours is not None and hours <= 0:
+            raise HTTPException(status_code=400, detail="hours must be positive")
+        
+        db = TraderDatabase()
+        series = await run_in_threadpool(db.get_rolling_series, address)
+        if series is None:
+            raise HTTPException(status_code=404, detail="Rolling windows not found for this trader")
+        
+        rolling = RollingMetrics.from_dict(series)
+        if hours is not None:
+            data = {f"{hours}h": rolling.window(hours)}
+        elif window is not None:
+            data = {window: rolling.window(WINDOWS.get(window))}
+        else:
+            data = rolling.summary()
+        
+        return {
+            "status": "success",
+            "data": data,
+            "metadata": {
+                "address": address,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/analysis/similar/{address}", response_model=Dict[str, Any])
+async def get_similar_traders(address: str, k: int = 10):
+    """Get the traders whose behaviour most resembles a trader's
+    
+    Traders are compared on their hourly activity, asset mix, holding
+    period, sizing consistency and win rate, by cosine similarity over
+    all analysed traders.
+    
+    Args:
+        address (str): Trader's address
+        k (int): Number of similar traders to return. Defaults to 10.
+    """
+    try:
+        if k <= 0:
+            raise HTTPException(status_code=400, detail="k must be positive")
+        
+        await run_in_threadpool(similarity_index.refresh)
+        similar = similarity_index.similar(address, k)
+        if similar is None:
+            raise HTTPException(status_code=404, detail="Trader analysis not found")
+        
+        return {
+            "status": "success",
+            "data": similar,
+            "metadata": {
+                "address": address,
+                "indexed_traders": len(similarity_index),
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,123 @@
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from data.HyperliquidAnalytics import HyperliquidAnalytics
+from data.HyperliquidDataService import HyperliquidDataService
+from data.RequestScheduler import RequestScheduler, DEFAULT_WEIGHT_PER_MINUTE
+import multiprocessing
+import replay
+import os
+
+'''
+Process-pool execution of the trader analysis sweep.
+Addresses are split into chunks that are handed to worker processes, each
+with its own data service and analytics instance, and every chunk is
+analyzed in one vectorized analyze_traders pass. Finished chunks are yielded
+back to the calling process as they complete, so a single writer owns the
+database. The Hyperliquid weight budget is per IP, so each worker gets an
+equal share of it.
+
+Settings (environment):
+    ANALYSIS_WORKERS=1        (worker processes; 1 analyzes in-process)
+    ANALYSIS_CHUNK_SIZE=250   (traders per chunk)
+'''
+
+DEFAULT_CHUNK_SIZE = 250
+
+# Per-process analytics, created by _init_worker
+_analytics: Optional[HyperliquidAnalytics] = None
+
+
+def analysis_settings() -> Tuple[int, int]:
+    """Worker count and chunk size from ANALYSIS_WORKERS / ANALYSIS_CHUNK_SIZE"""
+    workers = max(1, int(os.getenv("ANALYSIS_WORKERS", "1")))
+    chunk_size = max(1, int(os.getenv("ANALYSIS_CHUNK_SIZE", str(DEFAULT_CHUNK_SIZE))))
+    return workers, chunk_size
+
+
+def analyze_chunks(addresses: List[str],
+                   workers: Optional[int] = None,
+                   chunk_size: Optional[int] = None,
+                   analytics: Optional[HyperliquidAnalytics] = None,
+                   account_values: Optional[Dict[str, float]] = None
+                   ) -> Iterator[Tuple[List[str], Optional[Dict[str, Dict[str, Any]]], Optional[Exception]]]:
+    """Analyze traders in chunks, across worker processes when workers > 1
+
+    Args:
+        addresses (List[str]): Trader addresses to analyze
+        workers (Optional[int]): Worker processes, defaults to ANALYSIS_WORKERS
+        chunk_size (Optional[int]): Traders per chunk, defaults to ANALYSIS_CHUNK_SIZE
+        analytics (Optional[HyperliquidAnalytics]): Instance used when running
+            in-process; a new one is created if omitted. With workers, results
+            are recorded in its memory as they arrive.
+        account_values (Optional[Dict[str, float]]): Account value per
+            address for the risk metrics, e.g. from the leaderboard
+
+    Yields:
+        Tuple: (chunk, analyses, error) per chunk in completion order, where
+            analyses is the analyze_traders result, or None with the error
+            if the chunk failed
+    """
+    default_workers, default_chunk_size = analysis_settings()
+    workers = workers or default_workers
+    chunk_size = chunk_size or default_chunk_size
+    chunks = [addresses[start:start + chunk_size] for start in range(0, len(addresses), chunk_size)]
+
+    if workers == 1 or len(chunks) <= 1:
+        analytics = analytics or HyperliquidAnalytics(HyperliquidDataService())
+        for chunk in chunks:
+            try:
+                yield chunk, analytics.analyze_traders(chunk, account_values=_chunk_values(chunk, account_values)), None
+            except Exception as e:
+                yield chunk, None, e
+        return
+
+    workers = min(workers, len(chunks))
+    # Spawned workers start clean instead of inheriting the parent's threads,
+    # locks and open connections
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(workers,)) as pool:
+        # Keep a couple of chunks queued per worker so finished results are
+        # written while the rest are still running
+        pending = {}
+        remaining = iter(chunks)
+        for chunk in remaining:
+            pending[pool.submit(_analyze_chunk, chunk, _chunk_values(chunk, account_values))] = chunk
+            if len(pending) >= workers * 2:
+                break
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = pending.pop(future)
+                try:
+                    analyses = future.result()
+                except Exception as e:
+                    yield chunk, None, e
+                else:
+                    if analytics is not None:
+                        for analysis in analyses.values():
+                            analytics.memory.record(analysis)
+                    yield chunk, analyses, None
+                next_chunk = next(remaining, None)
+                if next_chunk is not None:
+                    pending[pool.submit(_analyze_chunk, next_chunk, _chunk_values(next_chunk, account_values))] = next_chunk
+
+
+def _init_worker(workers: int):
+    """Set up one worker's analytics with its share of the weight budget"""
+    global _analytics
+    replay.install_from_env()
+    scheduler = RequestScheduler(weight_per_minute=max(1, DEFAULT_WEIGHT_PER_MINUTE // workers))
+    _analytics = HyperliquidAnalytics(HyperliquidDataService(scheduler=scheduler))
+
+
+def _analyze_chunk(chunk: List[str], account_values: Optional[Dict[str, float]]) -> Dict[str, Dict[str, Any]]:
+    return _analytics.analyze_traders(chunk, account_values=account_values)
+
+
+def _chunk_values(chunk: List[str], account_values: Optional[Dict[str, float]]) -> Optional[Dict[str, float]]:
+    """The account values of one chunk, so workers are only sent what they need"""
+    if account_values is None:
+        return None
+    return {address: account_values[address] for address in chunk if address in account_values}
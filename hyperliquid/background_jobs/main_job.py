@@ -1,51 +1,82 @@
+from typing import Dict, List, Optional
 from llm_agent import LLMAgent
 from data.HyperliquidAnalytics import HyperliquidAnalytics
 from data.HyperliquidDataService import HyperliquidDataService
+from data.FillIngestionService import FillIngestionService
+from data.MetricState import TraderMetricState
+from data.AnalysisMemory import AnalysisMemory
 from db.database import TraderDatabase
 from background_jobs.analysis_job import run_analysis_job
+from background_jobs.analysis_pool import analyze_chunks, analysis_settings
+import replay
+import os
 import time
 from datetime import datetime, timedelta
 
-def run_main_job():
-    """Run the main trader analysis job"""
-    print(f"Starting main job at {datetime.now()}")
+def run_main_job(incremental: bool = None, diff: bool = None):
+    """Run the main trader analysis job
+
+    Args:
+        incremental (bool): Ingest only fills newer than each trader's watermark,
+            re-analyze only traders with new fills and update their metrics by
+            folding those fills into the persisted metric state. Defaults to the
+            INCREMENTAL_INGESTION environment variable.
+        diff (bool): Re-analyze only traders whose leaderboard volume, PnL or
+            account value changed since the previous snapshot, plus traders
+            whose last change has not been analysed yet (e.g. the analysis
+            failed). Defaults to the LEADERBOARD_DIFF environment variable
+            (on unless set to false).
+
+    Set ANALYSIS_HISTORY=true to also append every analysis summary to the
+    analysis_history table.
+    """
+    if incremental is None:
+        incremental = os.getenv("INCREMENTAL_INGESTION", "false").lower() == "true"
+    if diff is None:
+        diff = os.getenv("LEADERBOARD_DIFF", "true").lower() == "true"
+    print(f"Starting main job at {datetime.now()} (incremental={incremental}, diff={diff})")
     
     # Initialize components
     llm = LLMAgent()
-    analytics = HyperliquidAnalytics()
     data_service = HyperliquidDataService()
     db = TraderDatabase()
+    history = os.getenv("ANALYSIS_HISTORY", "false").lower() == "true"
+    memory = AnalysisMemory(sink=db.store_analysis_history if history else None)
+    analytics = HyperliquidAnalytics(data_service, memory=memory)
 
     try:
         # Fetch and store trader data
         print(f"Fetching trader data at {datetime.now()}")
-        top_traders = data_service.get_top_traders(limit=10000)
+        top_traders = data_service.get_top_traders(limit=10000, stream=True)
+
+        # Diff against the previous snapshot before it is overwritten
+        if diff:
+            addresses = db.get_changed_traders(top_traders)
+            print(f"{len(addresses)}/{len(top_traders)} traders changed since the last snapshot")
+        else:
+            addresses = [trader['address'] for trader in top_traders]
+
         db.store_traders(top_traders)
         print(f"Stored {len(top_traders)} traders in database")
 
-        # Analyze each trader and store results
+        # In incremental mode only traders with new fills since the last cycle are re-analyzed
+        if incremental:
+            print("\nIngesting new fills...")
+            # A recorded end time keeps the backfill windows identical under replay
+            new_fills = FillIngestionService(db, data_service).ingest(addresses, end_time=replay.now_ms("fill_history_end"))
+            addresses = [address for address in addresses if address in new_fills]
+            print(f"{len(addresses)} traders have new fills")
+
         print("\nAnalyzing traders...")
-        for i, trader in enumerate(top_traders):
-            try:
-                print(f"\nAnalyzing trader {i+1}/{len(top_traders)}: {trader['address']}")
-                analysis = analytics.analyze_trader(trader['address'])
-                if not analysis['metrics']:
-                    print(f"No metrics for {trader['address']}")
-                    continue
-                print(analysis['metrics'])
-                db.store_trader_analysis(trader['address'], analysis)
-                print(f"Stored analysis for {trader['address']}")
-                
-                # Run analysis job after every 1000 traders
-                # if (i + 1) % 1000 == 0:
-                #     print(f"\nReached {i+1} traders, running analysis job...")
-                #     run_analysis_job()
-                #     print("Analysis job completed, continuing with main job...")
-                
-            except Exception as e:
-                print(f"Error analyzing trader {trader['address']}: {e}")
-                continue
+        account_values = {trader['address']: trader['account_value'] for trader in top_traders}
+        if incremental:
+            analyze_incrementally(analytics, db, addresses, account_values)
+        else:
+            analyze_in_batches(analytics, db, addresses, account_values)
 
+        memory.flush()
+        print(f"\nResponse cache: {data_service.cache.stats()}")
+        print(f"Request scheduler: {data_service.scheduler.stats()}")
         print("\nAnalysis complete. Waiting 5 minutes before next update...")
         time.sleep(300)
 
@@ -53,6 +84,68 @@ def run_main_job():
         print(f"Error occurred: {e}")
         time.sleep(60)  # Wait 1 minute before retrying
 
+def analyze_in_batches(analytics: HyperliquidAnalytics, db: TraderDatabase, addresses: List[str],
+                       account_values: Optional[Dict[str, float]] = None):
+    """Analyze traders in chunks, each analyzed in one vectorized pass.
+
+    With ANALYSIS_WORKERS > 1 the chunks run in worker processes; results
+    stream back here in completion order and are written by this process.
+    """
+    workers, chunk_size = analysis_settings()
+    print(f"Analyzing {len(addresses)} traders in chunks of {chunk_size} with {workers} worker(s)")
+    done = 0
+    for chunk, analyses, error in analyze_chunks(addresses, workers, chunk_size, analytics, account_values):
+        done += len(chunk)
+        if error is not None:
+            print(f"Error analyzing a chunk of {len(chunk)} traders: {error}")
+            continue
+
+        stored = 0
+        for address in chunk:
+            try:
+                analysis = analyses.get(address)
+                if analysis is None:
+                    print(f"Failed to fetch orders for {address}")
+                    continue
+                if not analysis['metrics']:
+                    print(f"No metrics for {address}")
+                    continue
+                db.store_trader_analysis(address, analysis)
+                stored += 1
+            except Exception as e:
+                print(f"Error storing analysis for {address}: {e}")
+                continue
+        print(f"Stored analyses for {stored}/{len(chunk)} traders ({done}/{len(addresses)} done)")
+
+        # Run analysis job after every 1000 traders
+        # if done % 1000 == 0:
+        #     print(f"\nReached {done} traders, running analysis job...")
+        #     run_analysis_job()
+        #     print("Analysis job completed, continuing with main job...")
+
+
+def analyze_incrementally(analytics: HyperliquidAnalytics,
+                          db: TraderDatabase,
+                          addresses: List[str],
+                          account_values: Optional[Dict[str, float]] = None):
+    """Fold each trader's newly ingested fills into its persisted metric state"""
+    for i, address in enumerate(addresses):
+        try:
+            print(f"\nAnalyzing trader {i+1}/{len(addresses)}: {address}")
+            state = TraderMetricState(db.get_metric_state(address))
+            fills = db.get_trader_fills(address, start_time=state.watermark or None)
+            analysis = analytics.analyze_trader_incremental(address, state, fills, (account_values or {}).get(address))
+            db.store_metric_state(address, state.to_dict())
+            if not analysis['metrics']:
+                print(f"No metrics for {address}")
+                continue
+            db.store_trader_analysis(address, analysis)
+            print(f"Stored analysis for {address}")
+        except Exception as e:
+            print(f"Error analyzing trader {address}: {e}")
+            continue
+
 if __name__ == "__main__":
+    replay.install_from_env()
     while True:
         run_main_job() 
\ No newline at end of file
@@ -1,4 +1,5 @@
 from data.SentimentDataService import SentimentDataService
+import replay
 import json
 import time
 from datetime import datetime
@@ -65,5 +66,6 @@ def run_sentiment_job():
         time.sleep(300)  # Wait 5 minutes before retrying
 
 if __name__ == "__main__":
+    replay.install_from_env()
     while True:
         run_sentiment_job() 
\ No newline at end of file
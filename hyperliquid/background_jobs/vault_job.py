@@ -1,5 +1,6 @@
 from agent.AnalysisAgent import AnalysisAgent
 from data.VaultDataService import VaultDataService
+import replay
 from datetime import datetime
 import time
 import json
@@ -38,5 +39,6 @@ def run_vault_analysis_job():
         print(f"Error in vault analysis job: {e}")
 
 if __name__ == "__main__":
+    replay.install_from_env()
     # Run the job
     run_vault_analysis_job()
@@ -0,0 +1,55 @@
+'''
+Times PositionEngine against the iterrows position loop it replaced, and
+the batch trading-style analysis over many traders, on synthetic orders.
+Run from the hyperliquid directory:
+    python -m benchmarks.position_engine [counts ...]
+The loop is only timed up to LOOP_LIMIT orders; it takes minutes beyond.
+INPUTS:
+    Order counts to time, 10k, 100k and 1M by default
+OUTPUTS:
+    One line per count with the timings
+'''
+import sys
+import numpy as np
+from data.HyperliquidAnalytics import HyperliquidAnalytics
+from data.HyperliquidDataService import HyperliquidDataService
+from data.ColumnarStore import OrderBatch
+from data.PositionEngine import PositionEngine
+from benchmarks.process_orders import best_of
+from tests import reference
+from tests.synthetic import generate_orders
+
+LOOP_LIMIT = 100_000
+# Orders per trader in the batch style benchmark
+ORDERS_PER_TRADER = 1_000
+
+
+def run_engine(df):
+    df = df.sort_values('timestamp')
+    return PositionEngine().run(
+        df['coin'].to_numpy(), df['side'].to_numpy(),
+        df['limitPx'].to_numpy(), df['sz'].to_numpy(),
+        times=df['timestamp'].to_numpy(), mask=(df['status'] == 'filled').to_numpy()
+    )
+
+
+def main(counts):
+    service = HyperliquidDataService()
+    analytics = HyperliquidAnalytics(service)
+    for count in counts:
+        orders = generate_orders(count, coins=30, seed=7)
+        df = service.process_orders_to_dataframe(orders)
+        engine = best_of(lambda: run_engine(df))
+        loop = f"{best_of(lambda: reference.track_positions(df), repeats=1):7.3f}s" if count <= LOOP_LIMIT else "    n/a"
+
+        # The same orders split across traders and analysed in one batch
+        batch = OrderBatch.from_orders(orders)
+        traders = np.arange(count) // ORDERS_PER_TRADER
+        trader_count = int(traders[-1]) + 1
+        style = best_of(lambda: analytics._analyze_trading_style_batch(batch, traders, trader_count))
+        print(f"{count:>9,} orders: iterrows loop {loop}  engine {engine:7.3f}s  "
+              f"batch style ({trader_count:,} traders) {style:7.3f}s")
+
+
+if __name__ == "__main__":
+    main([int(count) for count in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
@@ -0,0 +1,39 @@
+'''
+Times HyperliquidDataService.process_orders_to_dataframe against the
+row-wise version it replaced, on synthetic historicalOrders payloads.
+Run from the hyperliquid directory:
+    python -m benchmarks.process_orders [counts ...]
+INPUTS:
+    Order counts to time, 10k and 100k by default
+OUTPUTS:
+    One line per count with both timings and the speed-up
+'''
+import sys
+import time
+from data.HyperliquidDataService import HyperliquidDataService
+from tests import reference
+from tests.synthetic import generate_orders
+
+
+def best_of(function, repeats: int = 3) -> float:
+    """Fastest of `repeats` runs in seconds"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(counts):
+    service = HyperliquidDataService()
+    for count in counts:
+        orders = generate_orders(count, coins=30, seed=7)
+        vectorised = best_of(lambda: service.process_orders_to_dataframe(orders))
+        row_wise = best_of(lambda: reference.process_orders_to_dataframe(orders), repeats=1)
+        print(f"{count:>9,} orders: row-wise {row_wise:7.3f}s  vectorised {vectorised:7.3f}s  "
+              f"{row_wise / vectorised:5.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(count) for count in sys.argv[1:]] or [10_000, 100_000])
@@ -0,0 +1,89 @@
+from typing import Dict, Any, Callable, Iterator, List, Optional
+from collections import OrderedDict, deque
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Records kept in memory unless ANALYSIS_MEMORY_SIZE says otherwise
+DEFAULT_MEMORY_SIZE = 10000
+# Records buffered before they are handed to the history sink
+DEFAULT_FLUSH_SIZE = 500
+
+'''
+This class is the bounded record of recent analyses kept by HyperliquidAnalytics.
+The newest records live in a fixed-size ring buffer, with an index of the
+latest record per trader for O(1) lookups, so a long-running job keeps a
+flat memory footprint. Records can optionally be handed in batches to a
+sink, e.g. TraderDatabase.store_analysis_history, to keep the full history
+on disk.
+INPUTS:
+    max_entries: Records kept in memory, defaults to ANALYSIS_MEMORY_SIZE
+    sink: Callable receiving lists of records to persist, or None
+    flush_size: Records buffered before the sink is called
+OUTPUTS:
+    None
+'''
+class AnalysisMemory:
+    """Ring buffer of recent analysis records with an optional history sink"""
+
+    def __init__(self,
+                 max_entries: Optional[int] = None,
+                 sink: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                 flush_size: int = DEFAULT_FLUSH_SIZE):
+        if max_entries is None:
+            max_entries = int(os.getenv("ANALYSIS_MEMORY_SIZE", str(DEFAULT_MEMORY_SIZE)))
+        self.max_entries = max(1, max_entries)
+        self.sink = sink
+        self.flush_size = flush_size
+        self._entries = deque(maxlen=self.max_entries)
+        self._latest = OrderedDict()  # user_address -> newest record
+        self._pending = []
+
+    def append(self, record: Dict[str, Any]):
+        """Add a record, evicting the oldest once the buffer is full"""
+        self._entries.append(record)
+
+        address = record.get('user_address')
+        self._latest[address] = record
+        self._latest.move_to_end(address)
+        if len(self._latest) > self.max_entries:
+            self._latest.popitem(last=False)
+
+        if self.sink is not None:
+            self._pending.append(record)
+            if len(self._pending) >= self.flush_size:
+                self.flush()
+
+    def record(self, analysis: Dict[str, Any]):
+        """Add the summary record of an analysis result"""
+        self.append({
+            "timestamp": analysis['timestamp'],
+            "user_address": analysis['user_address'],
+            "reputation_score": analysis['reputation_scores'].get('overall'),
+            "trader_style": analysis['trading_style'].get('primary_style', 'Unknown')
+        })
+
+    def latest(self, user_address: str) -> Optional[Dict[str, Any]]:
+        """Most recent record for a trader, if it is still in memory"""
+        return self._latest.get(user_address)
+
+    def recent(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Newest records first"""
+        return [self._entries[-i] for i in range(1, min(limit, len(self._entries)) + 1)]
+
+    def flush(self):
+        """Hand buffered records to the sink; they are dropped if the sink fails"""
+        if self.sink is None or not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        try:
+            self.sink(pending)
+        except Exception as e:
+            logger.error(f"Failed to persist {len(pending)} analysis records: {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._entries)
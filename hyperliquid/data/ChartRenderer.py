@@ -0,0 +1,147 @@
+from typing import Dict, Any, Optional
+from concurrent.futures import Future, ProcessPoolExecutor
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from .ResponseCache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+# Charts that can be drawn from an analysis' metrics
+CHART_NAMES = ('hourly_activity', 'asset_distribution')
+# Assets shown in the asset distribution pie
+TOP_ASSETS = 10
+# Rendered charts never go stale for the same input, so they only leave the cache through LRU eviction
+CHART_TTL = 24 * 3600
+
+'''
+This class renders analysis charts to PNG outside the analysis loop.
+matplotlib is only imported inside the worker processes, with the Agg
+backend, the first time a chart is drawn, so jobs and the API that never
+draw a chart don't pay for it. Each chart is identified by a hash of its
+input data; rendered images are kept in an LRU cache under that key and
+concurrent requests for the same chart share one render.
+INPUTS:
+    workers: Render processes, defaults to CHART_WORKERS (2)
+    cache: Cache for rendered PNGs, defaults to a 64 MB ResponseCache
+OUTPUTS:
+    None
+'''
+class ChartRenderer:
+    """Process-pool chart renderer with a content-addressed PNG cache"""
+
+    def __init__(self, workers: Optional[int] = None, cache: Optional[ResponseCache] = None):
+        self.workers = workers or int(os.getenv("CHART_WORKERS", "2"))
+        self.cache = cache if cache is not None else ResponseCache(
+            ttls={'chart': CHART_TTL}, max_bytes=64 * 1024 * 1024
+        )
+        self._pool = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def render(self, name: str, data: Dict[str, Any]) -> Future:
+        """Render a chart in the pool, or return the cached image
+
+        Args:
+            name (str): One of CHART_NAMES
+            data (Dict[str, Any]): The chart input from chart_inputs
+
+        Returns:
+            Future: Resolves to the PNG bytes
+        """
+        if name not in CHART_NAMES:
+            raise ValueError(f"Unknown chart: {name}")
+        cache_key = f"chart_{chart_key(name, data)}"
+
+        png = self.cache.get(cache_key)
+        if png is not None:
+            future = Future()
+            future.set_result(png)
+            return future
+
+        with self._lock:
+            future = self._inflight.get(cache_key)
+            submitted = future is None
+            if submitted:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+                future = self._pool.submit(_render_png, name, data)
+                self._inflight[cache_key] = future
+        # Outside the lock: a future that is already done runs the callback, which takes the lock, right away
+        if submitted:
+            future.add_done_callback(lambda done: self._finish(cache_key, done))
+        return future
+
+    def _finish(self, cache_key: str, future: Future):
+        with self._lock:
+            self._inflight.pop(cache_key, None)
+        # Renders still queued are cancelled when the pool shuts down
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            self.cache.set(cache_key, future.result())
+        else:
+            logger.error(f"Error rendering {cache_key}: {error}")
+
+    def shutdown(self):
+        """Stop the render processes"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+def chart_inputs(metrics: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Chart input data derived from an analysis' metrics
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Input per chart name, JSON-serializable;
+            charts without data are left out
+    """
+    inputs = {}
+    hourly = metrics.get('hourly_distribution')
+    if hourly:
+        inputs['hourly_activity'] = {str(int(hour)): int(count) for hour, count in sorted(hourly.items(), key=lambda item: int(item[0]))}
+    assets = metrics.get('asset_distribution')
+    if assets:
+        top = sorted(assets.items(), key=lambda item: -item[1])[:TOP_ASSETS]
+        inputs['asset_distribution'] = {str(coin): int(count) for coin, count in top}
+    return inputs
+
+
+def chart_key(name: str, data: Dict[str, Any]) -> str:
+    """Hash identifying a chart by its name and input data"""
+    canonical = json.dumps([name, data], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _render_png(name: str, data: Dict[str, Any]) -> bytes:
+    """Draw one chart; runs in a render process"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    try:
+        if name == 'hourly_activity':
+            ax.bar(list(data.keys()), list(data.values()), color='skyblue')
+            ax.set_title('Trading Activity by Hour of Day')
+            ax.set_xlabel('Hour')
+            ax.set_ylabel('Number of Orders')
+            ax.tick_params(axis='x', labelrotation=45)
+        else:
+            ax.pie(list(data.values()), labels=list(data.keys()), autopct='%1.1f%%')
+            ax.set_title('Distribution of Trading Activity by Asset')
+        fig.tight_layout()
+
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png')
+        return buf.getvalue()
+    finally:
+        plt.close(fig)
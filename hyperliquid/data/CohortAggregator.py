@@ -0,0 +1,171 @@
+from typing import Dict, Any, List, Optional
+import os
+import time
+import numpy as np
+import pandas as pd
+from .ColumnarStore import MS_PER_HOUR
+
+# Hours of fills aggregated unless COHORT_WINDOW_HOURS says otherwise
+DEFAULT_WINDOW_HOURS = 24
+# Coins handed to the LLM, most traded first
+PROMPT_COINS = 40
+# Fields of a coin flow row besides the coin, in table order
+FLOW_FIELDS = (
+    'traders', 'order_count', 'active_traders', 'buyers', 'sellers',
+    'buy_volume', 'sell_volume', 'net_flow', 'net_position_change',
+    'increasing_positions', 'decreasing_positions'
+)
+
+'''
+This class aggregates market-wide buy and sell pressure per coin.
+The latest stored analysis of each trader gives, per coin, how many
+analysed traders trade it and how many orders they placed. Stored fills over the recent window give
+buy and sell notional, net flow, the number of buying and selling traders,
+the net change in position size and how many traders grew or shrank their
+position. Both are grouped sums over flat columns, so the whole cohort is
+reduced to one row per coin that the LLM can read instead of raw analyses.
+INPUTS:
+    db: TraderDatabase holding analyses and ingested fills
+    window_hours: Hours of fills to aggregate, defaults to COHORT_WINDOW_HOURS (24)
+OUTPUTS:
+    None
+'''
+class CohortAggregator:
+    """Per-coin flow aggregation over all stored analyses and fills"""
+
+    def __init__(self, db, window_hours: Optional[int] = None):
+        self.db = db
+        self.window_hours = window_hours or int(os.getenv("COHORT_WINDOW_HOURS", str(DEFAULT_WINDOW_HOURS)))
+
+    def build(self, analyses: Optional[List[Dict[str, Any]]] = None, now_ms: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Aggregate per coin
+
+        Args:
+            analyses (Optional[List[Dict[str, Any]]]): Analyses to aggregate,
+                with fills limited to their traders; the latest stored analysis
+                of every trader and all fills if omitted
+            now_ms (Optional[int]): End of the fill window, defaults to now
+
+        Returns:
+            List[Dict[str, Any]]: One row per coin, most traded first
+        """
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        fills = self.db.get_fills_since(now_ms - self.window_hours * MS_PER_HOUR)
+        if analyses is None:
+            analyses = self.db.get_latest_analyses()
+        else:
+            addresses = {analysis.get('user_address') for analysis in analyses}
+            fills = [fill for fill in fills if fill['trader_address'] in addresses]
+
+        flows = aggregate_analyses(analyses).join(aggregate_fills(fills), how='outer')
+        flows = flows.reindex(columns=list(FLOW_FIELDS)).fillna(0)
+        flows['total_volume'] = flows['buy_volume'] + flows['sell_volume']
+        flows = flows.sort_values(['total_volume', 'order_count'], ascending=False, kind='stable')
+
+        rows = []
+        for coin, row in zip(flows.index.tolist(), flows.itertuples(index=False)):
+            flow = {'coin': coin, 'window_hours': self.window_hours}
+            for field in FLOW_FIELDS:
+                value = getattr(row, field)
+                flow[field] = float(value) if field in ('buy_volume', 'sell_volume', 'net_flow', 'net_position_change') else int(value)
+            rows.append(flow)
+        return rows
+
+    def refresh(self, now_ms: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Aggregate the latest analyses and all fills and replace the coin_flows table"""
+        flows = self.build(now_ms=now_ms)
+        self.db.store_coin_flows(flows)
+        return flows
+
+
+def aggregate_analyses(analyses: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Analysed traders and their order counts per coin, from each analysis' asset_distribution
+
+    Accepts analyses as returned by analyze_trader or by
+    TraderDatabase.get_all_trader_analyses (under 'raw_analysis'). Traders
+    are keyed by user_address and only the last analysis of each counts, so
+    a history with several analyses per trader is not counted twice.
+    """
+    latest = {}
+    for position, analysis in enumerate(analyses):
+        raw = analysis.get('raw_analysis') or analysis
+        address = analysis.get('user_address') or raw.get('user_address') or position
+        latest[address] = raw.get('metrics', {}).get('asset_distribution') or {}
+
+    traders, coins, counts = [], [], []
+    for trader, distribution in latest.items():
+        traders.extend([trader] * len(distribution))
+        coins.extend(distribution.keys())
+        counts.extend(distribution.values())
+
+    orders = pd.DataFrame({'trader': traders, 'coin': coins, 'orders': np.asarray(counts, dtype=np.int64)})
+    by_coin = orders.groupby('coin', sort=False)
+    return pd.DataFrame({
+        'traders': by_coin['trader'].nunique(),
+        'order_count': by_coin['orders'].sum()
+    })
+
+
+def aggregate_fills(fills: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Buy/sell notional, net flow, trader counts and position changes per coin
+
+    Args:
+        fills (List[Dict[str, Any]]): Rows from TraderDatabase.get_fills_since
+
+    Returns:
+        pd.DataFrame: One row per coin; net_position_change is in coin units
+    """
+    columns = ('trader_address', 'time', 'coin', 'side', 'px', 'sz', 'start_position')
+    fills = pd.DataFrame.from_records(fills, columns=columns)
+    fills = fills.sort_values(['trader_address', 'coin', 'time'], kind='stable')
+
+    buy = (fills['side'] == 'B').to_numpy()
+    sizes = fills['sz'].to_numpy(dtype=np.float64)
+    notional = fills['px'].to_numpy(dtype=np.float64) * sizes
+    fills['signed_size'] = np.where(buy, sizes, -sizes)
+    fills['buy_volume'] = np.where(buy, notional, 0.0)
+    fills['sell_volume'] = np.where(buy, 0.0, notional)
+
+    # One row per (trader, coin): volumes, net size and the position before the first fill
+    positions = fills.groupby(['trader_address', 'coin'], sort=False).agg(
+        buy_volume=('buy_volume', 'sum'),
+        sell_volume=('sell_volume', 'sum'),
+        net_size=('signed_size', 'sum'),
+        start_position=('start_position', 'first')
+    )
+    start = positions['start_position'].abs()
+    end = (positions['start_position'] + positions['net_size']).abs()
+    positions['bought'] = positions['buy_volume'] > 0
+    positions['sold'] = positions['sell_volume'] > 0
+    positions['increasing'] = end > start
+    positions['decreasing'] = end < start
+
+    by_coin = positions.groupby(level='coin', sort=False)
+    flows = pd.DataFrame({
+        'active_traders': by_coin.size(),
+        'buyers': by_coin['bought'].sum(),
+        'sellers': by_coin['sold'].sum(),
+        'buy_volume': by_coin['buy_volume'].sum(),
+        'sell_volume': by_coin['sell_volume'].sum(),
+        'net_position_change': by_coin['net_size'].sum(),
+        'increasing_positions': by_coin['increasing'].sum(),
+        'decreasing_positions': by_coin['decreasing'].sum()
+    })
+    flows['net_flow'] = flows['buy_volume'] - flows['sell_volume']
+    return flows
+
+
+def prompt_table(flows: List[Dict[str, Any]], limit: int = PROMPT_COINS) -> Dict[str, Any]:
+    """The most traded coins as a compact column/row table for an LLM prompt"""
+    def compact(field, value):
+        if field == 'net_position_change':
+            return round(value, 4)
+        return int(round(value))
+
+    rows = [[flow['coin']] + [compact(field, flow[field]) for field in FLOW_FIELDS] for flow in flows[:limit]]
+    return {
+        'window_hours': flows[0]['window_hours'] if flows else None,
+        'columns': ['coin'] + list(FLOW_FIELDS),
+        'rows': rows
+    }
@@ -0,0 +1,232 @@
+from typing import Dict, Any, List
+import numpy as np
+import pandas as pd
+
+DAY_NAMES = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'], dtype=object)
+MS_PER_HOUR = 3_600_000
+MS_PER_DAY = 86_400_000
+
+
+class _ColumnarBatch:
+    """Shared helpers for typed columnar batches.
+
+    Numeric columns are NumPy arrays, low-cardinality string columns are
+    pandas Categoricals (small integer codes plus a categories index) and
+    timestamps are int64 milliseconds.
+    """
+
+    _columns: tuple = ()
+    # Column holding each row's int64 millisecond timestamp
+    _time_column: str = ''
+
+    def __len__(self) -> int:
+        return len(self.timestamps_ms)
+
+    @property
+    def timestamps_ms(self) -> np.ndarray:
+        return getattr(self, self._time_column)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the batch's columns"""
+        total = 0
+        for name in self._columns:
+            column = getattr(self, name)
+            if isinstance(column, pd.Categorical):
+                total += column.codes.nbytes + int(column.categories.memory_usage(deep=True))
+            else:
+                total += column.nbytes
+        return total
+
+    def hour_of_day(self) -> np.ndarray:
+        """UTC hour (0-23) of every row"""
+        return (self.timestamps_ms // MS_PER_HOUR) % 24
+
+    def day_of_week(self) -> np.ndarray:
+        """UTC weekday of every row, Monday=0 (1970-01-01 was a Thursday)"""
+        return (self.timestamps_ms // MS_PER_DAY + 3) % 7
+
+    @staticmethod
+    def category_counts(column: pd.Categorical, mask: np.ndarray = None) -> Dict[Any, int]:
+        """Count rows per category, most frequent first, skipping missing values"""
+        codes = column.codes if mask is None else column.codes[mask]
+        counts = np.bincount(codes[codes >= 0], minlength=len(column.categories))
+        order = np.argsort(-counts, kind='stable')
+        return {column.categories[i]: int(counts[i]) for i in order if counts[i] > 0}
+
+
+'''
+This class holds historical orders as typed columns.
+It is built once from the historicalOrders payload and replaces the list of
+nested dicts of numeric strings for everything downstream.
+INPUTS:
+    orders: Raw historicalOrders payload
+OUTPUTS:
+    OrderBatch with categorical coin/side/status/orderType/tif, float64
+    prices and sizes and int64 millisecond timestamps
+'''
+class OrderBatch(_ColumnarBatch):
+    """Compact columnar representation of a trader's historical orders"""
+
+    _columns = ('coin', 'side', 'limit_px', 'sz', 'orig_sz', 'oid', 'timestamp',
+                'order_type', 'tif', 'reduce_only', 'status', 'status_timestamp')
+    _time_column = 'timestamp'
+
+    def __init__(self, **columns):
+        for name in self._columns:
+            setattr(self, name, columns[name])
+
+    @classmethod
+    def from_orders(cls, orders: List[Dict[str, Any]]) -> "OrderBatch":
+        """Parse a historicalOrders payload"""
+        details = [order_data['order'] for order_data in orders]
+        count = len(details)
+        return cls(
+            coin=_to_categorical([order['coin'] for order in details]),
+            side=_to_categorical([order['side'] for order in details], lower=True),
+            limit_px=_to_float_array([order['limitPx'] for order in details]),
+            sz=_to_float_array([order['sz'] for order in details]),
+            orig_sz=_to_float_array([order['origSz'] for order in details]),
+            oid=np.fromiter((order['oid'] for order in details), dtype=np.int64, count=count),
+            timestamp=np.fromiter((order['timestamp'] for order in details), dtype=np.int64, count=count),
+            order_type=_to_categorical([order['orderType'] for order in details]),
+            tif=_to_categorical([order['tif'] for order in details]),
+            reduce_only=np.fromiter((bool(order['reduceOnly']) for order in details), dtype=bool, count=count),
+            status=_to_categorical([order_data['status'] for order_data in orders]),
+            status_timestamp=np.fromiter((order_data['statusTimestamp'] for order_data in orders), dtype=np.int64, count=count)
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """Flat DataFrame with the historicalOrders field names and plain object string columns"""
+        return pd.DataFrame({
+            'coin': _to_objects(self.coin),
+            'side': _to_objects(self.side),
+            'limitPx': self.limit_px,
+            'sz': self.sz,
+            'origSz': self.orig_sz,
+            'oid': self.oid,
+            'timestamp': self.timestamp,
+            'orderType': _to_objects(self.order_type),
+            'tif': _to_objects(self.tif),
+            'reduceOnly': self.reduce_only,
+            'status': _to_objects(self.status),
+            'statusTimestamp': self.status_timestamp
+        })
+
+
+'''
+This class holds fills as typed columns.
+It accepts both the userFills / userFillsByTime payloads and rows read back
+from the trader_fills table.
+INPUTS:
+    fills: Raw fills
+OUTPUTS:
+    FillBatch with categorical coin/side/dir, float64 prices, sizes, PnL
+    and fees and int64 millisecond times
+'''
+class FillBatch(_ColumnarBatch):
+    """Compact columnar representation of a trader's fills"""
+
+    _columns = ('coin', 'side', 'dir', 'px', 'sz', 'start_position', 'closed_pnl',
+                'fee', 'time', 'oid', 'tid', 'crossed')
+    _time_column = 'time'
+
+    def __init__(self, **columns):
+        for name in self._columns:
+            setattr(self, name, columns[name])
+
+    @classmethod
+    def from_fills(cls, fills: List[Dict[str, Any]]) -> "FillBatch":
+        """Parse a fills payload"""
+        count = len(fills)
+        return cls(
+            coin=_to_categorical([fill['coin'] for fill in fills]),
+            side=_to_categorical([fill['side'] for fill in fills], lower=True),
+            dir=_to_categorical([fill.get('dir') for fill in fills]),
+            px=_to_float_array([fill['px'] for fill in fills]),
+            sz=_to_float_array([fill['sz'] for fill in fills]),
+            start_position=_to_float_array([fill.get('startPosition', 0) for fill in fills]),
+            closed_pnl=_to_float_array([fill.get('closedPnl', 0) for fill in fills]),
+            fee=_to_float_array([fill.get('fee', 0) for fill in fills]),
+            time=np.fromiter((fill['time'] for fill in fills), dtype=np.int64, count=count),
+            oid=np.fromiter((fill.get('oid') or 0 for fill in fills), dtype=np.int64, count=count),
+            tid=np.fromiter((fill.get('tid') or 0 for fill in fills), dtype=np.int64, count=count),
+            crossed=np.fromiter((bool(fill.get('crossed')) for fill in fills), dtype=bool, count=count)
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """Flat DataFrame with the userFills field names and plain object string columns"""
+        return pd.DataFrame({
+            'coin': _to_objects(self.coin),
+            'px': self.px,
+            'sz': self.sz,
+            'side': _to_objects(self.side),
+            'time': self.time,
+            'startPosition': self.start_position,
+            'dir': _to_objects(self.dir),
+            'closedPnl': self.closed_pnl,
+            'oid': self.oid,
+            'crossed': self.crossed,
+            'fee': self.fee,
+            'tid': self.tid
+        })
+
+
+def _to_float_array(values) -> np.ndarray:
+    """Parse numeric strings into a float64 array, coercing bad values to NaN"""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+
+
+def _to_categorical(values: List[Any], lower: bool = False) -> pd.Categorical:
+    """Encode strings as a Categorical; missing values get code -1"""
+    codes, categories = pd.factorize(pd.Series(values, dtype=object))
+    if lower and len(categories):
+        lowered = [c.lower() if isinstance(c, str) else c for c in categories]
+        remap, categories = pd.factorize(pd.Series(lowered, dtype=object))
+        codes = np.where(codes >= 0, remap[codes], -1)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def _to_objects(column: pd.Categorical) -> np.ndarray:
+    """Decode a Categorical into an object array, with None for missing values"""
+    lookup = np.empty(len(column.categories) + 1, dtype=object)
+    lookup[:-1] = column.categories.to_numpy(dtype=object)
+    lookup[-1] = None
+    return lookup[column.codes]
+
+
+def _signed_sizes(batch: FillBatch, rows: np.ndarray) -> np.ndarray:
+    """Fill sizes signed by side: positive for buys, negative for sells"""
+    categories = batch.side.categories
+    signs = np.zeros(len(categories) + 1)  # the last slot is for missing sides (code -1)
+    signs[:-1] = [1.0 if side == 'b' else -1.0 if side == 'a' else 0.0 for side in categories]
+    return signs[batch.side.codes[rows]] * batch.sz[rows]
+
+
+def _reducing_fills(batch: FillBatch, rows: np.ndarray) -> np.ndarray:
+    """Fills that trade against an open position, i.e. close, reduce or flip it"""
+    start = batch.start_position[rows]
+    return (start != 0) & (np.sign(start) == -np.sign(_signed_sizes(batch, rows)))
+
+
+def _position_events(batch: FillBatch, rows: np.ndarray):
+    """Reducing, position-opening and position-closing fills among `rows`
+
+    A position opens on a fill that starts flat (or flips it) and closes on
+    a fill that returns it to flat (or flips it). A partial reduce, which
+    leaves the position on the same side, neither opens nor closes.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: (reducing, opens, closes) masks
+    """
+    start = batch.start_position[rows]
+    end = start + _signed_sizes(batch, rows)
+    reducing = _reducing_fills(batch, rows)
+    flat_end = np.abs(end) <= 1e-9 * np.abs(start)
+    flips = reducing & ~flat_end & (np.sign(end) == -np.sign(start))
+    opens = ((start == 0) & (end != 0)) | flips
+    closes = reducing & (flat_end | flips)
+    return reducing, opens, closes
@@ -0,0 +1,90 @@
+from typing import Dict, List, Optional
+from collections import defaultdict
+import logging
+import time
+from .HyperliquidDataService import HyperliquidDataService, FILLS_PAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+'''
+This class incrementally ingests trader fills into the database.
+Each trader has a last_seen_time watermark; every run only asks the
+time-ranged fills endpoint for fills at or after it and appends them to
+the trader_fills table, so the cost of a cycle scales with new activity
+rather than with the size of the trader's history.
+INPUTS:
+    data_service: Service used to fetch fills
+    db: TraderDatabase storing fills and watermarks
+OUTPUTS:
+    None
+'''
+class FillIngestionService:
+    """Watermark-based incremental fill ingestion"""
+
+    def __init__(self,
+                 db,
+                 data_service: Optional[HyperliquidDataService] = None,
+                 page_size: int = FILLS_PAGE_SIZE):
+        self.db = db
+        self.data = data_service or HyperliquidDataService()
+        self.page_size = page_size
+
+    def ingest(self, addresses: List[str], end_time: Optional[int] = None) -> Dict[str, int]:
+        """Fetch and store fills newer than each trader's watermark
+
+        Traders without a watermark get their whole history backfilled
+        with parallel time-window fetches. A trader whose backfill came back
+        incomplete gets no watermark, so the backfill is retried next run;
+        one without any fills gets end_time as its watermark. For the rest,
+        a full page means more fills may follow, so the trader is asked
+        again from the newest fill's time until a short page comes back. The
+        watermark itself is inclusive; fills sharing its millisecond are
+        de-duplicated by tid when stored.
+
+        Args:
+            addresses (List[str]): Traders to ingest
+            end_time (Optional[int]): End of the backfilled histories in ms,
+                defaults to now. Pass a fixed (e.g. recorded) time to make
+                the backfill requests repeatable.
+
+        Returns:
+            Dict[str, int]: Number of newly stored fills per trader that had any
+        """
+        watermarks = self.db.get_fill_watermarks(addresses)
+        new_fills = defaultdict(int)
+
+        # Backfill traders seen for the first time with parallel time-window fetches
+        backfill = [address for address in dict.fromkeys(addresses) if address not in watermarks]
+        if backfill:
+            if end_time is None:
+                end_time = int(time.time() * 1000)
+            for address, fills in self.data.fetch_fill_histories(backfill, end_time=end_time):
+                if fills is None:
+                    logger.error(f"Backfill for {address} is incomplete; retrying next run")
+                    continue
+                if not fills:
+                    self.db.advance_fill_watermark(address, end_time)
+                    continue
+                inserted = self.db.store_fills(address, fills)
+                if inserted:
+                    new_fills[address] += inserted
+
+        pending = {address: watermarks[address] for address in addresses if address in watermarks}
+        while pending:
+            next_round = {}
+            for address, fills in self.data.fetch_fills_since(pending):
+                # A failed request (None) leaves the watermark where it was
+                if not fills:
+                    continue
+
+                inserted = self.db.store_fills(address, fills)
+                if inserted:
+                    new_fills[address] += inserted
+
+                newest = max(fill['time'] for fill in fills)
+                if len(fills) >= self.page_size and newest > pending[address]:
+                    next_round[address] = newest
+            pending = next_round
+
+        logger.info(f"Ingested {sum(new_fills.values())} new fills for {len(new_fills)} traders")
+        return dict(new_fills)
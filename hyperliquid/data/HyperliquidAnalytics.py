@@ -1,50 +1,76 @@
 from typing import Dict, Any, List, Optional
 from datetime import datetime
-from .HyperliquidDataService import HyperliquidDataService
+from .HyperliquidDataService import HyperliquidDataService, HyperliquidAPIError
+from .PositionEngine import PositionEngine
+from .MetricState import TraderMetricState
+from .AnalysisMemory import AnalysisMemory
+from .ChartRenderer import chart_inputs, chart_key
+from .RollingMetrics import RollingMetrics, rolling_by_group
+from .RiskMetrics import risk_metrics_by_group, risk_profile
+from .ColumnarStore import (OrderBatch, FillBatch, DAY_NAMES, MS_PER_HOUR, MS_PER_DAY, _to_objects,
+                           _reducing_fills, _position_events)
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import io
-import base64
 import logging
 import json
+import os
 
 logger = logging.getLogger(__name__)
 
+# "orders" replays historicalOrders through the position engine; "fills"
+# reads realized PnL and fees from userFills
+ANALYSIS_MODES = ("orders", "fills")
+
 
 class HyperliquidAnalytics:
     """Analytics class for Hyperliquid trading data.
     
     This class provides comprehensive analysis of trader performance based on their order history.
-    It calculates various metrics, analyzes trading style, and generates visualizations.
+    It calculates various metrics, analyzes trading style, and references charts that
+    are rendered on demand.
     The class also calls the data service to get the data for the trader.
     
     Attributes:
         data (HyperliquidDataService): Service for fetching trader data
-        memory (List[Dict]): List of historical analyses
+        memory (AnalysisMemory): Bounded record of recent analyses
     """
     
-    def __init__(self, data_service: Optional[HyperliquidDataService] = None):
+    def __init__(self,
+                 data_service: Optional[HyperliquidDataService] = None,
+                 memory: Optional[AnalysisMemory] = None):
         """Initialize the analytics service.
         
         Args:
             data_service (Optional[HyperliquidDataService]): Service for fetching trader data.
                 If None, a new instance will be created.
+            memory (Optional[AnalysisMemory]): Record of recent analyses. If None,
+                an in-memory one sized by ANALYSIS_MEMORY_SIZE is created.
         """
         self.data = data_service or HyperliquidDataService()
-        self.memory = []
+        self.memory = memory if memory is not None else AnalysisMemory()
+        # Data the analyze_* methods work from unless a call picks one (see ANALYSIS_MODES)
+        self.mode = _check_mode(os.getenv("ANALYSIS_MODE", "orders"))
+        # Add chart references to every analysis when ANALYSIS_CHARTS is set
+        self.include_charts = os.getenv("ANALYSIS_CHARTS", "false").lower() == "true"
 
-    def analyze_trader(self, user_address: str) -> Dict[str, Any]:
+    def analyze_trader(self, user_address: str, mode: Optional[str] = None,
+                       account_value: Optional[float] = None) -> Dict[str, Any]:
         """Analyze a trader's performance based on their order history.
         
+        In "fills" mode the analysis is computed from the trader's fills
+        instead (see `analyze_traders`).
+        
         This method performs a comprehensive analysis including:
         - Basic trading metrics
         - Trading style analysis
         - Reputation scoring
-        - Data visualizations
+        - Chart references (when ANALYSIS_CHARTS is set)
         
         Args:
             user_address (str): The Ethereum address of the trader to analyze
+            mode (Optional[str]): "orders" or "fills", defaults to the instance's mode
+            account_value (Optional[float]): Current account value, used as the
+                end of the trader's equity curve for the risk metrics
             
         Returns:
             Dict[str, Any]: Analysis results containing:
@@ -53,26 +79,27 @@ class HyperliquidAnalytics:
                 - metrics (Dict): Trading performance metrics
                 - trading_style (Dict): Trading style characteristics
                 - reputation_scores (Dict): Reputation score components
-                - visualizations (Dict): Base64 encoded visualization images
+                - visualizations (Dict): Chart key per chart name, when enabled
         """
         logger.info(f"Starting comprehensive analysis for trader {user_address}")
+        if _check_mode(mode or self.mode) == "fills":
+            fills = self._fetch_or_empty(self.data.get_user_trades, user_address, [])
+            return self._analyze_fills({user_address: fills}, {user_address: account_value})[user_address]
         
         # Get data
-        orders = self.data.get_user_orders(user_address)
+        orders = self._fetch_or_empty(self.data.get_user_order_batch, user_address, OrderBatch.from_orders([]))
         orders_df = self.data.process_orders_to_dataframe(orders)
         
         # Calculate metrics
-        metrics = self._calculate_metrics(orders_df)
+        metrics = self._calculate_metrics(orders_df, account_value)
         
         # Analyze trading style
         style = self._analyze_trading_style(orders_df)
+        _add_risk_profile(style, metrics)
         
         # Calculate reputation score
         reputation = self._calculate_reputation_score(metrics, style)
         
-        # Create visualizations
-        # visualizations = self._create_visualizations(orders_df)
-        
         # Record this analysis in memory
         self.memory.append({
             "timestamp": datetime.now().isoformat(),
@@ -81,16 +108,566 @@ class HyperliquidAnalytics:
             "trader_style": style.get('primary_style', 'Unknown')
         })
         
-        return {
+        return self._build_analysis(user_address, metrics, style, reputation)
+
+    def analyze_trader_incremental(self, user_address: str, state: TraderMetricState,
+                                   fills: List[Dict[str, Any]],
+                                   account_value: Optional[float] = None) -> Dict[str, Any]:
+        """Refresh a trader's analysis from a persisted metric state.
+        
+        Only fills newer than the state's watermark are folded in, so the
+        cost tracks new activity instead of the full history. The result
+        matches the fills-mode `analyze_trader` over the same fills, without
+        the rolling windows and with approximate holding-period quantiles.
+        
+        Args:
+            user_address (str): The Ethereum address of the trader to analyze
+            state (TraderMetricState): The trader's state, updated in place;
+                the caller persists it alongside the analysis
+            fills (List[Dict[str, Any]]): The trader's stored fills from the
+                state's watermark on, see `TraderMetricState.fold`
+            account_value (Optional[float]): Current account value, see `analyze_trader`
+            
+        Returns:
+            Dict[str, Any]: Analysis results shaped like `analyze_trader`
+        """
+        folded = state.fold(fills)
+        logger.info(f"Folded {folded} new fills into the metric state of {user_address}")
+        
+        metrics = state.metrics(account_value)
+        style = state.style()
+        _add_risk_profile(style, metrics)
+        reputation = self._calculate_reputation_score(metrics, style)
+        
+        self.memory.append({
+            "timestamp": datetime.now().isoformat(),
+            "user_address": user_address,
+            "reputation_score": reputation.get('overall'),
+            "trader_style": style.get('primary_style', 'Unknown')
+        })
+        
+        return self._build_analysis(user_address, metrics, style, reputation)
+
+    def analyze_traders(self, user_addresses: List[str], mode: Optional[str] = None,
+                        account_values: Optional[Dict[str, float]] = None) -> Dict[str, Dict[str, Any]]:
+        """Analyze many traders in one vectorized pass.
+        
+        In the default "orders" mode, orders are fetched concurrently and parsed into a single OrderBatch
+        whose rows are keyed by a trader code. Metrics and
+        trading style are then computed with grouped array operations over
+        the whole cohort, and the position engine runs once over
+        (trader, coin) groups, so the cost tracks the total number of orders
+        rather than the number of traders. Results match `analyze_trader`
+        up to floating-point summation order and the tie-break between
+        orders sharing a timestamp.
+        
+        In "fills" mode the traders' userFills are used instead. Realized PnL,
+        fees and turnover are summed directly from the exchange-reported
+        closedPnl, fee, px and sz of each fill, so there is no position
+        replay and partial fills and fees are accounted for exactly. A
+        trade is the set of fills of one order that reduce a position, and
+        its PnL is net of the fees of those fills. Holding periods run from
+        the fill that opens a position to the one that returns it to flat.
+        Funding payments are not part of fills and are not included, and
+        userFills only returns a trader's most recent 2000 fills.
+        
+        Args:
+            user_addresses (List[str]): Ethereum addresses of the traders to analyze
+            mode (Optional[str]): "orders" or "fills", defaults to the instance's mode
+            account_values (Optional[Dict[str, float]]): Current account value
+                per address, e.g. from the leaderboard, see `analyze_trader`
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: Analysis per address, shaped like the
+                result of `analyze_trader`. Traders whose data could not be
+                fetched are left out.
+        """
+        logger.info(f"Starting batch analysis for {len(user_addresses)} traders")
+        mode = _check_mode(mode or self.mode)
+        kind = "fills" if mode == "fills" else "orders"
+        
+        fetched = {}
+        for address, _, data in self.data.fetch_many(user_addresses, kinds=(kind,)):
+            if data is None:
+                logger.error(f"Failed to fetch {kind} for {address}")
+                continue
+            fetched[address] = data
+        
+        if mode == "fills":
+            return self._analyze_fills({address: fetched[address] for address in user_addresses if address in fetched},
+                                       account_values)
+        addresses = [address for address in user_addresses if address in fetched]
+        
+        # Parse the whole cohort at once so string columns share one set of categories
+        batch = OrderBatch.from_orders([order for address in addresses for order in fetched[address]])
+        traders = np.repeat(np.arange(len(addresses)), [len(fetched[address]) for address in addresses])
+        
+        metrics = self._calculate_metrics_batch(batch, traders, len(addresses), _account_value_array(addresses, account_values))
+        styles = self._analyze_trading_style_batch(batch, traders, len(addresses))
+        return self._finish_batch(addresses, metrics, styles)
+
+    def _analyze_fills(self, fetched: Dict[str, List[Dict[str, Any]]],
+                       account_values: Optional[Dict[str, float]] = None) -> Dict[str, Dict[str, Any]]:
+        """Fills-mode analysis of the traders in `fetched` (address -> fills)"""
+        addresses = list(fetched)
+        batch = FillBatch.from_fills([fill for address in addresses for fill in fetched[address]])
+        traders = np.repeat(np.arange(len(addresses)), [len(fetched[address]) for address in addresses])
+        
+        metrics = self._calculate_fill_metrics_batch(batch, traders, len(addresses), _account_value_array(addresses, account_values))
+        styles = self._analyze_fill_style_batch(batch, traders, len(addresses))
+        return self._finish_batch(addresses, metrics, styles)
+
+    def _fetch_or_empty(self, fetch, user_address: str, empty: Any) -> Any:
+        """Fetch a trader's data, degrading to `empty` if the request fails after its retries"""
+        try:
+            return fetch(user_address)
+        except HyperliquidAPIError as e:
+            logger.error(f"Failed to fetch data for {user_address}: {str(e)}")
+            return empty
+
+    def _finish_batch(self, addresses: List[str], metrics: List[Dict[str, Any]],
+                      styles: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Score, record and assemble the analyses of a batch"""
+        results = {}
+        for address, trader_metrics, style in zip(addresses, metrics, styles):
+            _add_risk_profile(style, trader_metrics)
+            reputation = self._calculate_reputation_score(trader_metrics, style)
+            self.memory.append({
+                "timestamp": datetime.now().isoformat(),
+                "user_address": address,
+                "reputation_score": reputation.get('overall'),
+                "trader_style": style.get('primary_style', 'Unknown')
+            })
+            results[address] = self._build_analysis(address, trader_metrics, style, reputation)
+        return results
+
+    def _build_analysis(self, user_address: str, metrics: Dict[str, Any],
+                        style: Dict[str, Any], reputation: Dict[str, Any]) -> Dict[str, Any]:
+        """Assemble the analysis result returned by the analyze_* methods"""
+        analysis = {
             "user_address": user_address,
             "timestamp": datetime.now().isoformat(),
             "metrics": metrics,
             "trading_style": style,
-            "reputation_scores": reputation,
-            # "visualizations": visualizations
+            "reputation_scores": reputation
         }
+        if self.include_charts:
+            analysis["visualizations"] = self._create_visualizations(metrics)
+        return analysis
+
+    def _calculate_metrics_batch(self, batch: OrderBatch, traders: np.ndarray, trader_count: int,
+                                 account_values: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Grouped equivalent of `_calculate_metrics` for stacked orders.
+        
+        Args:
+            batch (OrderBatch): Orders of every trader, stacked
+            traders (np.ndarray): Trader code of every order
+            trader_count (int): Number of traders
+            account_values (Optional[np.ndarray]): Account value per trader code, NaN where unknown
+            
+        Returns:
+            List[Dict[str, Any]]: Metrics per trader code
+        """
+        metrics = [{} for _ in range(trader_count)]
+        if len(batch) == 0:
+            return metrics
+        
+        # Rows newest first per trader, the row order analyze_trader sees
+        row_traders = traders
+        newest_first = np.lexsort((-batch.timestamp, row_traders))
+        traders = row_traders[newest_first]
+        timestamps = batch.timestamp[newest_first]
+        sides = batch.side[newest_first]
+        sizes = batch.sz[newest_first]
+        
+        self._add_activity_metrics_batch(metrics, traders, timestamps, sides, sizes, batch.coin[newest_first], trader_count)
+        
+        order_type_counts = _grouped_value_counts(traders, batch.order_type[newest_first], trader_count)
+        tif_counts = _grouped_value_counts(traders, batch.tif[newest_first], trader_count)
+        for trader in np.flatnonzero(np.bincount(traders, minlength=trader_count)).tolist():
+            trader_metrics = metrics[trader]
+            trader_metrics['order_type_distribution'] = dict(order_type_counts[trader])
+            trader_metrics['most_common_order_type'] = order_type_counts[trader][0][0] if order_type_counts[trader] else None
+            trader_metrics['time_in_force_distribution'] = dict(tif_counts[trader])
+            trader_metrics['most_common_tif'] = tif_counts[trader][0][0] if tif_counts[trader] else None
+        
+        # Performance metrics from one engine run over (trader, coin) positions
+        self._add_trade_metrics_batch(metrics, batch, row_traders, trader_count, account_values)
+        return metrics
+
+    def _add_activity_metrics_batch(self, metrics: List[Dict[str, Any]], traders: np.ndarray, timestamps: np.ndarray,
+                                    sides: pd.Categorical, sizes: np.ndarray, coins: pd.Categorical, trader_count: int,
+                                    order_counts: Optional[np.ndarray] = None):
+        """Activity, volume and asset metrics shared by the order and fill paths.
+        
+        Rows must be grouped by trader, newest first. `total_orders` counts
+        rows unless `order_counts` gives the count per trader.
+        """
+        # Basic activity metrics
+        row_counts = np.bincount(traders, minlength=trader_count)
+        has_orders = row_counts > 0
+        if order_counts is None:
+            order_counts = row_counts
+        first = np.full(trader_count, np.iinfo(np.int64).max)
+        last = np.full(trader_count, np.iinfo(np.int64).min)
+        np.minimum.at(first, traders, timestamps)
+        np.maximum.at(last, traders, timestamps)
+        active_days = (last - first) // MS_PER_DAY + 1
+        
+        # Trading patterns
+        hourly = np.bincount(traders * 24 + (timestamps // MS_PER_HOUR) % 24, minlength=trader_count * 24).reshape(trader_count, 24)
+        daily = np.bincount(traders * 7 + (timestamps // MS_PER_DAY + 3) % 7, minlength=trader_count * 7).reshape(trader_count, 7)
+        peak_hours = np.argmax(hourly, axis=1)
+        hourly = hourly.tolist()
+        daily = daily.tolist()
+        day_order = np.argsort(DAY_NAMES).tolist()
+        
+        # Buy and sell volume, skipping missing sizes like Series.sum
+        volume = np.where(np.isnan(sizes), 0.0, sizes)
+        side_values = _to_objects(sides)
+        buy_volume = np.bincount(traders, weights=np.where(side_values == 'b', volume, 0.0), minlength=trader_count)
+        sell_volume = np.bincount(traders, weights=np.where(side_values == 'a', volume, 0.0), minlength=trader_count)
+        
+        asset_counts = _grouped_value_counts(traders, coins, trader_count)
+        
+        for trader in np.flatnonzero(has_orders).tolist():
+            trader_metrics = metrics[trader]
+            total_days = int(active_days[trader])
+            trader_metrics['first_activity'] = pd.Timestamp(int(first[trader]), unit='ms').isoformat()
+            trader_metrics['last_activity'] = pd.Timestamp(int(last[trader]), unit='ms').isoformat()
+            trader_metrics['active_days'] = total_days
+            trader_metrics['total_orders'] = int(order_counts[trader])
+            trader_metrics['activity_frequency'] = trader_metrics['total_orders'] / total_days if total_days > 0 else 0
+            
+            trader_metrics['hourly_distribution'] = {hour: count for hour, count in enumerate(hourly[trader]) if count}
+            trader_metrics['daily_distribution'] = {
+                DAY_NAMES[day]: daily[trader][day] for day in day_order if daily[trader][day]
+            }
+            trader_metrics['peak_activity_hour'] = int(peak_hours[trader])
+            
+            total_buy_volume = buy_volume[trader]
+            total_sell_volume = sell_volume[trader]
+            trader_metrics['total_buy_volume'] = total_buy_volume
+            trader_metrics['total_sell_volume'] = total_sell_volume
+            if total_buy_volume > total_sell_volume * 1.1:  # 10% threshold
+                trader_metrics['position_bias'] = 'Long'
+            elif total_sell_volume > total_buy_volume * 1.1:
+                trader_metrics['position_bias'] = 'Short'
+            else:
+                trader_metrics['position_bias'] = 'Neutral'
+            total_volume = total_buy_volume + total_sell_volume
+            if total_volume > 0:
+                trader_metrics['long_short_ratio'] = total_buy_volume / total_sell_volume if total_sell_volume > 0 else float('inf')
+                trader_metrics['buy_percentage'] = (total_buy_volume / total_volume) * 100
+                trader_metrics['sell_percentage'] = (total_sell_volume / total_volume) * 100
+            
+            coin_counts = asset_counts[trader]
+            trader_metrics['asset_distribution'] = dict(coin_counts)
+            trader_metrics['most_traded_asset'] = coin_counts[0][0] if coin_counts else None
+            trader_metrics['asset_count'] = len(coin_counts)
+            total_orders = sum(count for _, count in coin_counts)
+            if total_orders > 0:
+                concentration = sum((count/total_orders)**2 for _, count in coin_counts)
+                trader_metrics['asset_concentration'] = concentration
+                if concentration > 0.5:
+                    trader_metrics['diversification'] = "Low"
+                elif concentration > 0.3:
+                    trader_metrics['diversification'] = "Moderate"
+                else:
+                    trader_metrics['diversification'] = "High"
+
+    def _add_trade_metrics_batch(self, metrics: List[Dict[str, Any]], batch: OrderBatch, traders: np.ndarray, trader_count: int,
+                                 account_values: Optional[np.ndarray] = None):
+        """Grouped equivalent of the closed-trade metrics in `_calculate_metrics`"""
+        oldest_first = np.lexsort((batch.timestamp, traders))
+        traders = traders[oldest_first]
+        coin_count = len(batch.coin.categories) + 1
+        filled = _to_objects(batch.status[oldest_first]) == 'filled'
+        
+        trades = PositionEngine().run(
+            traders * coin_count + batch.coin.codes[oldest_first] + 1,
+            _to_objects(batch.side[oldest_first]),
+            batch.limit_px[oldest_first],
+            batch.sz[oldest_first],
+            times=batch.timestamp[oldest_first],
+            mask=filled
+        )
+        
+        # Rolling windows over trade close times and filled notional
+        rolling = rolling_by_group(
+            traders[trades.source_index], trades.closed_at, trades.pnl,
+            traders[filled], batch.timestamp[oldest_first][filled],
+            (batch.limit_px[oldest_first] * batch.sz[oldest_first])[filled],
+            trader_count
+        )
+        _add_rolling_metrics(metrics, rolling)
+        if len(trades) == 0:
+            return
+        
+        # Trades come back in processing order, so each trader's rows are contiguous and in time order
+        trades_df = pd.DataFrame({
+            'trader': traders[trades.source_index],
+            'pnl': trades.pnl,
+            'size': trades.size
+        })
+        by_trader = trades_df.groupby('trader', sort=True)
+        pnl = trades_df['pnl']
+        summary = pd.DataFrame({
+            'total_trades': by_trader.size(),
+            'total_pnl': by_trader['pnl'].sum(),
+            'win_rate': (pnl > 0).groupby(trades_df['trader']).mean(),
+            'avg_win': pnl.where(pnl > 0).groupby(trades_df['trader']).mean(),
+            'avg_loss': pnl.where(pnl < 0).groupby(trades_df['trader']).mean().abs(),
+            'avg_position_size': by_trader['size'].mean(),
+            'max_position_size': by_trader['size'].max()
+        })
+        
+        for trader, row in zip(summary.index.tolist(), summary.itertuples(index=False)):
+            trader_metrics = metrics[trader]
+            trader_metrics['total_trades'] = int(row.total_trades)
+            trader_metrics['total_pnl'] = row.total_pnl
+            trader_metrics['win_rate'] = row.win_rate
+            trader_metrics['avg_win'] = row.avg_win
+            trader_metrics['avg_loss'] = row.avg_loss
+            if trader_metrics.get('avg_loss', 0) > 0:
+                trader_metrics['risk_reward_ratio'] = trader_metrics.get('avg_win', 0) / trader_metrics.get('avg_loss', 1)
+            else:
+                trader_metrics['risk_reward_ratio'] = float('inf')
+            trader_metrics['avg_position_size'] = row.avg_position_size
+            trader_metrics['max_position_size'] = row.max_position_size
+        
+        # Risk metrics from each trader's daily equity curve
+        _add_risk_metrics(metrics, risk_metrics_by_group(
+            traders[trades.source_index], trades.closed_at, trades.pnl,
+            trades.entry_price * trades.size, trader_count, account_values
+        ))
+
+    def _analyze_trading_style_batch(self, batch: OrderBatch, traders: np.ndarray, trader_count: int) -> List[Dict[str, Any]]:
+        """Grouped equivalent of `_analyze_trading_style` for stacked orders.
+        
+        Args:
+            batch (OrderBatch): Orders of every trader, stacked
+            traders (np.ndarray): Trader code of every order
+            trader_count (int): Number of traders
+            
+        Returns:
+            List[Dict[str, Any]]: Trading style per trader code
+        """
+        styles = [{} for _ in range(trader_count)]
+        if len(batch) == 0:
+            return styles
+        
+        # Holding periods per (trader, coin), summarised per trader
+        coin_count = len(batch.coin.categories) + 1
+        position_keys = (traders * coin_count + batch.coin.codes).astype(object)
+        position_keys[batch.coin.codes < 0] = None
+        groups, holding_times = PositionEngine().holding_periods(
+            position_keys,
+            _to_objects(batch.side),
+            batch.timestamp.astype('datetime64[ms]'),
+            return_groups=True
+        )
+        self._add_holding_style_batch(styles, groups.astype(np.int64) // coin_count, holding_times)
+        self._add_sizing_style_batch(styles, traders, batch.sz)
+        return styles
 
-    def _calculate_metrics(self, orders_df: pd.DataFrame) -> Dict[str, Any]:
+    def _add_holding_style_batch(self, styles: List[Dict[str, Any]], traders: np.ndarray, holding_times: np.ndarray):
+        """Holding-period summary and primary style per trader from (trader, hours) pairs"""
+        if not len(holding_times):
+            return
+        held = pd.Series(holding_times).groupby(traders)
+        holding = pd.DataFrame({
+            'mean': held.mean(),
+            'median': held.median(),
+            'p90': held.quantile(0.9)
+        })
+        for trader, row in zip(holding.index.tolist(), holding.itertuples(index=False)):
+            style = styles[trader]
+            avg_holding = row.mean
+            style['avg_holding_period_hours'] = avg_holding
+            style['median_holding_period_hours'] = row.median
+            style['p90_holding_period_hours'] = row.p90
+            
+            if avg_holding < 1:
+                style['primary_style'] = 'Scalper'
+            elif avg_holding < 24:
+                style['primary_style'] = 'Day Trader'
+            elif avg_holding < 168:  # 7 days
+                style['primary_style'] = 'Swing Trader'
+            else:
+                style['primary_style'] = 'Position Trader'
+
+    def _add_sizing_style_batch(self, styles: List[Dict[str, Any]], traders: np.ndarray, sizes: np.ndarray):
+        """Position sizing consistency per trader"""
+        sizes = pd.Series(sizes).groupby(traders)
+        sizing = pd.DataFrame({'mean': sizes.mean(), 'std': sizes.std(), 'count': sizes.count()})
+        for trader, row in zip(sizing.index.tolist(), sizing.itertuples(index=False)):
+            if row.count == 0:
+                continue
+            size_std = row.std / row.mean if row.mean > 0 else 0
+            styles[trader]['position_size_consistency'] = size_std
+            
+            if size_std < 0.3:
+                styles[trader]['sizing_approach'] = 'Very Consistent'
+            elif size_std < 0.7:
+                styles[trader]['sizing_approach'] = 'Moderately Consistent'
+            else:
+                styles[trader]['sizing_approach'] = 'Variable'
+
+    def _calculate_fill_metrics_batch(self, batch: FillBatch, traders: np.ndarray, trader_count: int,
+                                      account_values: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Metrics per trader from stacked fills, with grouped sums over the fill columns.
+        
+        Args:
+            batch (FillBatch): Fills of every trader, stacked
+            traders (np.ndarray): Trader code of every fill
+            trader_count (int): Number of traders
+            account_values (Optional[np.ndarray]): Account value per trader code, NaN where unknown
+            
+        Returns:
+            List[Dict[str, Any]]: Metrics per trader code
+        """
+        metrics = [{} for _ in range(trader_count)]
+        if len(batch) == 0:
+            return metrics
+        
+        # Activity over fills; an order counts once however many fills it had
+        newest_first = np.lexsort((-batch.time, traders))
+        order_codes = _order_codes(traders, batch.oid)
+        order_traders = np.zeros(order_codes.max() + 1, dtype=np.int64)
+        order_traders[order_codes] = traders
+        order_counts = np.bincount(order_traders, minlength=trader_count)
+        self._add_activity_metrics_batch(
+            metrics, traders[newest_first], batch.time[newest_first], batch.side[newest_first],
+            batch.sz[newest_first], batch.coin[newest_first], trader_count, order_counts=order_counts
+        )
+        
+        # Realized PnL, fees and turnover straight from the fill columns
+        oldest_first = np.lexsort((batch.tid, batch.time, traders))
+        traders = traders[oldest_first]
+        sizes = batch.sz[oldest_first]
+        closed_pnl = np.nan_to_num(batch.closed_pnl[oldest_first])
+        fees = np.nan_to_num(batch.fee[oldest_first])
+        notional = np.nan_to_num(batch.px[oldest_first] * sizes)
+        fill_counts = np.bincount(traders, minlength=trader_count)
+        realized = np.bincount(traders, weights=closed_pnl, minlength=trader_count)
+        total_fees = np.bincount(traders, weights=fees, minlength=trader_count)
+        turnover = np.bincount(traders, weights=notional, minlength=trader_count)
+        for trader in np.flatnonzero(fill_counts).tolist():
+            trader_metrics = metrics[trader]
+            trader_metrics['total_fills'] = int(fill_counts[trader])
+            trader_metrics['realized_pnl'] = realized[trader]
+            trader_metrics['total_fees'] = total_fees[trader]
+            trader_metrics['total_pnl'] = realized[trader] - total_fees[trader]
+            trader_metrics['turnover'] = turnover[trader]
+            trader_metrics['fee_rate_bps'] = total_fees[trader] / turnover[trader] * 10000 if turnover[trader] > 0 else 0
+        
+        # Trades: the fills of one order that reduce (or flip) a position
+        times = batch.time[oldest_first]
+        reducing = _reducing_fills(batch, oldest_first)
+        if not reducing.any():
+            _add_rolling_metrics(metrics, rolling_by_group(
+                traders[:0], times[:0], closed_pnl[:0], traders, times, notional, trader_count
+            ))
+            return metrics
+        # Trade codes follow the first reducing fill of each order, so trades
+        # stay grouped by trader and in time order
+        trades = _order_codes(traders[reducing], batch.oid[oldest_first][reducing])
+        trade_count = trades.max() + 1
+        trade_traders = np.zeros(trade_count, dtype=np.int64)
+        trade_traders[trades] = traders[reducing]
+        trades_df = pd.DataFrame({
+            'trader': trade_traders,
+            'pnl': np.bincount(trades, weights=closed_pnl[reducing] - fees[reducing], minlength=trade_count),
+            'size': np.bincount(trades, weights=np.nan_to_num(sizes[reducing]), minlength=trade_count)
+        })
+        
+        # Rolling windows: a trade closes with its last reducing fill
+        trade_times = np.zeros(trade_count, dtype=np.int64)
+        np.maximum.at(trade_times, trades, times[reducing])
+        _add_rolling_metrics(metrics, rolling_by_group(
+            trade_traders, trade_times, trades_df['pnl'].to_numpy(), traders, times, notional, trader_count
+        ))
+        
+        by_trader = trades_df.groupby('trader', sort=True)
+        pnl = trades_df['pnl']
+        summary = pd.DataFrame({
+            'total_trades': by_trader.size(),
+            'win_rate': (pnl > 0).groupby(trades_df['trader']).mean(),
+            'avg_win': pnl.where(pnl > 0).groupby(trades_df['trader']).mean(),
+            'avg_loss': pnl.where(pnl < 0).groupby(trades_df['trader']).mean().abs(),
+            'avg_position_size': by_trader['size'].mean(),
+            'max_position_size': by_trader['size'].max()
+        })
+        
+        for trader, row in zip(summary.index.tolist(), summary.itertuples(index=False)):
+            trader_metrics = metrics[trader]
+            trader_metrics['total_trades'] = int(row.total_trades)
+            trader_metrics['win_rate'] = row.win_rate
+            trader_metrics['avg_win'] = row.avg_win
+            trader_metrics['avg_loss'] = row.avg_loss
+            if trader_metrics.get('avg_loss', 0) > 0:
+                trader_metrics['risk_reward_ratio'] = trader_metrics.get('avg_win', 0) / trader_metrics.get('avg_loss', 1)
+            else:
+                trader_metrics['risk_reward_ratio'] = float('inf')
+            trader_metrics['avg_position_size'] = row.avg_position_size
+            trader_metrics['max_position_size'] = row.max_position_size
+        
+        # Risk metrics from each trader's daily equity curve, on trade PnL net of fees
+        _add_risk_metrics(metrics, risk_metrics_by_group(
+            trade_traders, trade_times, trades_df['pnl'].to_numpy(),
+            np.bincount(trades, weights=notional[reducing], minlength=trade_count),
+            trader_count, account_values
+        ))
+        return metrics
+
+    def _analyze_fill_style_batch(self, batch: FillBatch, traders: np.ndarray, trader_count: int) -> List[Dict[str, Any]]:
+        """Trading style per trader from stacked fills.
+        
+        A position opens on a fill that starts flat (or flips it) and closes
+        on a fill that returns it to flat (or flips it); opens and closes of
+        each (trader, coin) are paired in order for the holding periods.
+        Sizing consistency uses order sizes, summed over each order's fills.
+        """
+        styles = [{} for _ in range(trader_count)]
+        if len(batch) == 0:
+            return styles
+        
+        oldest_first = np.lexsort((batch.tid, batch.time, traders))
+        traders = traders[oldest_first]
+        _, opens, closes = _position_events(batch, oldest_first)
+        
+        # Events in fill order, a flip's close before its open; closes before
+        # a (trader, coin)'s first open belong to a position opened earlier
+        coin_count = len(batch.coin.categories) + 1
+        position_keys = traders * coin_count + batch.coin.codes[oldest_first]
+        close_rows, open_rows = np.flatnonzero(closes), np.flatnonzero(opens)
+        rows = np.concatenate((close_rows, open_rows))
+        is_open = np.concatenate((np.zeros(len(close_rows), dtype=bool), np.ones(len(open_rows), dtype=bool)))
+        order = np.lexsort((is_open, rows, position_keys[rows]))
+        rows, is_open = rows[order], is_open[order]
+        keys = position_keys[rows]
+        opened = np.cumsum(is_open)
+        group_start = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(rows) else rows
+        opened_before = opened - np.repeat(opened[group_start] - is_open[group_start], np.diff(np.r_[group_start, len(rows)]))
+        keep = is_open | (opened_before > 0)
+        
+        groups, holding_times = PositionEngine().holding_periods(
+            keys[keep],
+            np.where(is_open[keep], 'b', 'a'),
+            batch.time[oldest_first][rows[keep]].astype('datetime64[ms]'),
+            return_groups=True
+        )
+        self._add_holding_style_batch(styles, groups.astype(np.int64) // coin_count, holding_times)
+        
+        orders = _order_codes(traders, batch.oid[oldest_first])
+        order_traders = np.zeros(orders.max() + 1, dtype=np.int64)
+        order_traders[orders] = traders
+        order_sizes = np.bincount(orders, weights=np.nan_to_num(batch.sz[oldest_first]))
+        self._add_sizing_style_batch(styles, order_traders, order_sizes)
+        return styles
+
+    def _calculate_metrics(self, orders_df: pd.DataFrame, account_value: Optional[float] = None) -> Dict[str, Any]:
         """Calculate trading performance metrics from order data.
         
         This method calculates various metrics including:
@@ -98,9 +675,11 @@ class HyperliquidAnalytics:
         - Trading patterns (hourly/daily distribution)
         - Asset diversity metrics
         - Performance metrics (PnL, win rate, etc.)
+        - Risk metrics (drawdown, Sharpe, Sortino, Calmar) from a daily equity curve
         
         Args:
             orders_df (pd.DataFrame): DataFrame containing order history
+            account_value (Optional[float]): Current account value, the end of the equity curve
             
         Returns:
             Dict[str, Any]: Dictionary of calculated metrics
@@ -197,70 +776,31 @@ class HyperliquidAnalytics:
             # Sort by timestamp for position tracking
             orders_df = orders_df.sort_values('timestamp')
             
-            # Initialize position tracking
-            positions = {}  # {coin: {'entry_price': price, 'size': size, 'side': side}}
-            trades = []     # List of completed trades with PnL
+            # Rebuild positions and closed trades from filled orders
+            trades = PositionEngine().run(
+                orders_df['coin'].to_numpy(),
+                orders_df['side'].to_numpy(),
+                orders_df['limitPx'].astype(float).to_numpy(),
+                orders_df['sz'].astype(float).to_numpy(),
+                times=orders_df['timestamp'].to_numpy(),
+                mask=(orders_df['status'] == 'filled').to_numpy()
+            )
             
-            # Process each order
-            for _, order in orders_df.iterrows():
-                
-                if order['status'] != 'filled':
-                    continue
-                # print(f"ORDER: {order}")
-                    
-                coin = order['coin']
-                side = order['side']
-                price = float(order['limitPx'])
-                size = float(order['sz'])
-                
-                # print(f"COIN: {coin} SIDE: {side} PRICE: {price} SIZE: {size}")
-                
-                if size == 0:
-                    continue
-                if coin not in positions:
-                    # print(f"OPENING NEW POSITION : {coin} {size} {side}")
-                    # Opening a new position
-                    positions[coin] = {
-                        'entry_price': price,
-                        'size': size,
-                        'side': side
-                    }
-                else:
-                    # Closing or reducing an existing position
-                    # print(f"REDUCING POSITION")
-                    pos = positions[coin]
-                    # Check if this is a closing order
-                    if (pos['side'] == 'b' and side == 'a') or (pos['side'] == 'a' and side == 'b'):
-                        # Calculate PnL
-                        if pos['side'] == 'b':  # Long position
-                            pnl = (price - pos['entry_price']) * min(size, pos['size'])
-                        else:  # Short position
-                            pnl = (pos['entry_price'] - price) * min(size, pos['size'])
-                            
-                        trades.append({
-                            'coin': coin,
-                            'entry_price': pos['entry_price'],
-                            'exit_price': price,
-                            'size': min(size, pos['size']),
-                            'pnl': pnl,
-                            'entry_side': pos['side']
-                        })
-                        
-                        # Update or remove position
-                        if size >= pos['size']:
-                            del positions[coin]
-                        else:
-                            pos['size'] -= size
-                    else:
-                        # Adding to existing position - update average entry price
-                        total_size = pos['size'] + size
-                        pos['entry_price'] = ((pos['entry_price'] * pos['size']) + (price * size)) / total_size
-                        pos['size'] = total_size
+            # Rolling windows over trade close times and filled notional
+            filled = orders_df['status'] == 'filled'
+            rolling = RollingMetrics.from_events(
+                _to_ms(trades.closed_at),
+                trades.pnl,
+                _to_ms(orders_df.loc[filled, 'timestamp'].to_numpy()),
+                (orders_df.loc[filled, 'limitPx'].astype(float) * orders_df.loc[filled, 'sz'].astype(float)).to_numpy()
+            )
+            if len(rolling.hours):
+                metrics['rolling_windows'] = rolling.summary()
+                metrics['rolling_series'] = rolling.to_dict()
             
             # Calculate metrics from completed trades
-            if trades:
-                # print(f"Trades: {trades}")
-                trades_df = pd.DataFrame(trades)
+            if len(trades):
+                trades_df = trades.to_frame()
                 metrics['total_trades'] = len(trades)
                 metrics['total_pnl'] = trades_df['pnl'].sum()
                 metrics['win_rate'] = (trades_df['pnl'] > 0).mean()
@@ -272,15 +812,18 @@ class HyperliquidAnalytics:
                 else:
                     metrics['risk_reward_ratio'] = float('inf')
                 
-                # Calculate drawdown
-                cumulative = trades_df['pnl'].cumsum()
-                running_max = cumulative.cummax()
-                drawdown = (cumulative - running_max) / running_max
-                metrics['max_drawdown'] = abs(drawdown.min()) if not drawdown.empty else 0
-                
                 # Position size metrics
                 metrics['avg_position_size'] = trades_df['size'].mean()
                 metrics['max_position_size'] = trades_df['size'].max()
+                
+                # Risk metrics from the daily equity curve
+                risk = risk_metrics_by_group(
+                    np.zeros(len(trades), dtype=np.int64), _to_ms(trades.closed_at), trades.pnl,
+                    trades.entry_price * trades.size, 1,
+                    np.array([np.nan if account_value is None else account_value], dtype=np.float64)
+                )[0]
+                if risk is not None:
+                    metrics.update(risk)
         
         return metrics
 
@@ -288,7 +831,7 @@ class HyperliquidAnalytics:
         """Analyze trading style and patterns from order data.
         
         This method determines:
-        - Average holding period
+        - Holding period distribution (mean, median, 90th percentile)
         - Primary trading style (Scalper/Day Trader/Swing Trader/Position Trader)
         - Position sizing consistency
         
@@ -303,25 +846,19 @@ class HyperliquidAnalytics:
         if orders_df.empty:
             return style
             
-        # Calculate average holding time
+        # Holding time distribution from buys and sells paired per coin
         if 'coin' in orders_df.columns and 'timestamp' in orders_df.columns and 'side' in orders_df.columns:
-            holding_times = []
+            holding_times = PositionEngine().holding_periods(
+                orders_df['coin'].to_numpy(),
+                orders_df['side'].to_numpy(),
+                orders_df['timestamp'].to_numpy()
+            )
             
-            for coin in orders_df['coin'].unique():
-                coin_trades = orders_df[orders_df['coin'] == coin].sort_values('timestamp')
-                
-                if len(coin_trades) > 1:
-                    buys = coin_trades[coin_trades['side'] == 'b'].reset_index()
-                    sells = coin_trades[coin_trades['side'] == 'a'].reset_index()
-                    
-                    for i in range(min(len(buys), len(sells))):
-                        if sells.loc[i, 'timestamp'] > buys.loc[i, 'timestamp']:
-                            holding_period = (sells.loc[i, 'timestamp'] - buys.loc[i, 'timestamp']).total_seconds() / 3600
-                            holding_times.append(holding_period)
-            
-            if holding_times:
+            if len(holding_times):
                 avg_holding = np.mean(holding_times)
                 style['avg_holding_period_hours'] = avg_holding
+                style['median_holding_period_hours'] = np.median(holding_times)
+                style['p90_holding_period_hours'] = np.percentile(holding_times, 90)
                 
                 if avg_holding < 1:
                     style['primary_style'] = 'Scalper'
@@ -432,65 +969,92 @@ class HyperliquidAnalytics:
                               
         return scores
 
-    def _create_visualizations(self, orders_df: pd.DataFrame) -> Dict[str, str]:
-        """Create data visualizations from order data.
+    def _create_visualizations(self, metrics: Dict[str, Any]) -> Dict[str, str]:
+        """Create references to the charts of an analysis.
         
-        This method generates:
-        - Hourly trading activity distribution
-        - Asset trading distribution
+        Charts are drawn from the hourly and asset distributions in the
+        metrics, so nothing is rendered here: each reference is the hash of
+        the chart's input data, and the API renders and caches the image
+        when it is requested (see ChartRenderer).
         
         Args:
-            orders_df (pd.DataFrame): DataFrame containing order history
+            metrics (Dict[str, Any]): Metrics from `_calculate_metrics`
             
         Returns:
-            Dict[str, str]: Dictionary of base64 encoded visualization images
+            Dict[str, str]: Chart key per chart name
         """
-        visualizations = {}
-        
-        if orders_df.empty:
-            return visualizations
-            
-        # Time distribution visualization
-        if 'timestamp' in orders_df.columns:
-            try:
-                plt.figure(figsize=(10, 6))
-                orders_df['hour'] = orders_df['timestamp'].dt.hour
-                hourly_counts = orders_df.groupby('hour').size()
-                hourly_counts.plot(kind='bar', color='skyblue')
-                plt.title('Trading Activity by Hour of Day')
-                plt.xlabel('Hour')
-                plt.ylabel('Number of Orders')
-                plt.xticks(rotation=45)
-                plt.tight_layout()
-                
-                buf = io.BytesIO()
-                plt.savefig(buf, format='png')
-                buf.seek(0)
-                img_str = base64.b64encode(buf.read()).decode('utf-8')
-                visualizations['hourly_activity'] = img_str
-                plt.close()
-            except Exception as e:
-                logger.error(f"Error creating time distribution visualization: {str(e)}")
-        
-        # Asset distribution visualization
-        if 'coin' in orders_df.columns:
-            try:
-                plt.figure(figsize=(10, 6))
-                coin_counts = orders_df['coin'].value_counts()
-                if len(coin_counts) > 10:
-                    coin_counts = coin_counts.head(10)
-                coin_counts.plot(kind='pie', autopct='%1.1f%%')
-                plt.title('Distribution of Trading Activity by Asset')
-                plt.ylabel('')
-                plt.tight_layout()
-                
-                buf = io.BytesIO()
-                plt.savefig(buf, format='png')
-                buf.seek(0)
-                img_str = base64.b64encode(buf.read()).decode('utf-8')
-                visualizations['asset_distribution'] = img_str
-                plt.close()
-            except Exception as e:
-                logger.error(f"Error creating asset distribution visualization: {str(e)}")
-        
-        return visualizations 
\ No newline at end of file
+        return {name: chart_key(name, data) for name, data in chart_inputs(metrics).items()}
+
+
+def _to_ms(times: np.ndarray) -> np.ndarray:
+    """int64 milliseconds from datetime64 or millisecond times"""
+    times = np.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64):
+        return times.astype('datetime64[ms]').view(np.int64)
+    return times.astype(np.int64)
+
+
+def _add_rolling_metrics(metrics: List[Dict[str, Any]], rolling: List[Optional[RollingMetrics]]):
+    """Store rolling_by_group results in each trader's metrics"""
+    now_ms = int(datetime.now().timestamp() * 1000)
+    for trader_metrics, trader_rolling in zip(metrics, rolling):
+        if trader_rolling is not None:
+            trader_metrics['rolling_windows'] = trader_rolling.summary(now_ms)
+            trader_metrics['rolling_series'] = trader_rolling.to_dict()
+
+
+def _add_risk_metrics(metrics: List[Dict[str, Any]], risk: List[Optional[Dict[str, Any]]]):
+    """Store risk_metrics_by_group results in each trader's metrics"""
+    for trader_metrics, trader_risk in zip(metrics, risk):
+        if trader_risk is not None:
+            trader_metrics.update(trader_risk)
+
+
+def _add_risk_profile(style: Dict[str, Any], metrics: Dict[str, Any]):
+    """Set the style's risk_profile, read by the reputation score, from the risk metrics"""
+    profile = risk_profile(metrics)
+    if profile is not None:
+        style['risk_profile'] = profile
+
+
+def _account_value_array(addresses: List[str], account_values: Optional[Dict[str, float]]) -> Optional[np.ndarray]:
+    """Account value per trader code, NaN where unknown"""
+    if not account_values:
+        return None
+    return np.array([np.nan if account_values.get(address) is None else account_values[address] for address in addresses],
+                    dtype=np.float64)
+
+
+def _check_mode(mode: str) -> str:
+    mode = mode.lower()
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"Unknown analysis mode: {mode}")
+    return mode
+
+
+def _order_codes(traders: np.ndarray, oids: np.ndarray) -> np.ndarray:
+    """Code per (trader, oid) pair, numbered in order of first appearance"""
+    keys = traders.astype(np.int64) * (int(oids.max()) + 1) + oids
+    return pd.factorize(keys)[0]
+
+
+def _grouped_value_counts(traders: np.ndarray, column: pd.Categorical, trader_count: int) -> List[List[tuple]]:
+    """Per-trader `value_counts` of a categorical column.
+
+    Rows must be grouped by trader in the order `value_counts` would see
+    them; counts are sorted descending with ties in order of first appearance.
+    """
+    counts_by_trader = [[] for _ in range(trader_count)]
+    valid = column.codes >= 0
+    category_count = max(1, len(column.categories))
+    keys = traders[valid].astype(np.int64) * category_count + column.codes[valid]
+    if not len(keys):
+        return counts_by_trader
+    
+    unique_keys, first_seen, counts = np.unique(keys, return_index=True, return_counts=True)
+    key_traders = unique_keys // category_count
+    order = np.lexsort((first_seen, -counts, key_traders))
+    categories = column.categories
+    for trader, code, count in zip(key_traders[order].tolist(), (unique_keys % category_count)[order].tolist(), counts[order].tolist()):
+        counts_by_trader[trader].append((categories[code], count))
+    return counts_by_trader
@@ -1,8 +1,41 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterable, Iterator, AsyncIterator, Optional, Tuple, Union
+import asyncio
+import codecs
+import concurrent.futures
+import heapq
+import json
+import math
+import queue
+import re
+import threading
+import httpx
 import requests
+import numpy as np
 import pandas as pd
 import logging
+import os
+import time
 from datetime import datetime
+from .ResponseCache import ResponseCache
+from .PersistentResponseCache import PersistentResponseCache
+from .RequestScheduler import RequestScheduler, parse_retry_after
+from .ColumnarStore import OrderBatch, FillBatch, _to_float_array
+
+# Request kinds understood by the bulk fetcher: kind -> (info request type, cache key prefix)
+REQUEST_KINDS = {
+    "orders": ("historicalOrders", "orders"),
+    "fills": ("userFills", "trades"),
+    "positions": ("clearinghouseState", "positions"),
+}
+
+# The time-ranged fills endpoint returns at most this many fills per response
+FILLS_PAGE_SIZE = 2000
+# Earliest time a full-history fetch looks for fills (2023-01-01 UTC, before mainnet trading began)
+HISTORY_START_MS = 1_672_531_200_000
+
+
+class HyperliquidAPIError(Exception):
+    """Raised when an info request still fails after the scheduler's retries"""
 
 '''
 This class fetches correct data from the Hyperliquid API.
@@ -15,46 +48,96 @@ OUTPUTS:
 class HyperliquidDataService:
     """Service class for fetching and processing Hyperliquid data"""
     
-    def __init__(self):
+    def __init__(self,
+                 max_concurrency: int = 16,
+                 timeout: float = 30.0,
+                 cache: Optional[ResponseCache] = None,
+                 persistent_cache: Optional[PersistentResponseCache] = None,
+                 scheduler: Optional[RequestScheduler] = None):
         self.api_url = "https://api.hyperliquid.xyz/info"
         self.headers = {"Content-Type": "application/json"}
-        self.cache = {}
+        self.cache = cache if cache is not None else ResponseCache()
+        # Optional on-disk cache shared with other processes, enabled by
+        # passing one in or by setting HYPERLIQUID_CACHE_DB
+        cache_db = os.getenv("HYPERLIQUID_CACHE_DB")
+        if persistent_cache is None and cache_db:
+            persistent_cache = PersistentResponseCache(cache_db)
+        self.persistent_cache = persistent_cache
+        self.scheduler = scheduler or RequestScheduler.default()
+        # Single-flight registry: payload key -> future shared by every caller
+        # waiting on the same in-flight upstream request (sync or async)
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
         self.leaderboard_url = "https://stats-data.hyperliquid.xyz/Mainnet/leaderboard"
+        self.session = requests.Session()
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
 
     def get_user_orders(self, user_address: str) -> List[Dict[str, Any]]:
         """Fetch historical orders for a user"""
         cache_key = f"orders_{user_address}"
-        if cache_key in self.cache:
-            return self.cache[cache_key]
-        print(f"Fetching orders for {user_address}")
-
         payload = {
             "type": "historicalOrders",
             "user": user_address
         }
+        cached = self._get_cached(cache_key, payload)
+        if cached is not None:
+            return cached
+        print(f"Fetching orders for {user_address}")
         
         return self._make_api_request(payload, cache_key)
 
     def get_user_trades(self, user_address: str) -> List[Dict[str, Any]]:
         """Fetch user trades"""
         cache_key = f"trades_{user_address}"
-        if cache_key in self.cache:
-            return self.cache[cache_key]
-
         payload = {
             "type": "userFills",
             "user": user_address
         }
+        cached = self._get_cached(cache_key, payload)
+        if cached is not None:
+            return cached
         
         return self._make_api_request(payload, cache_key)
+
+    def get_user_order_batch(self, user_address: str) -> OrderBatch:
+        """Fetch historical orders for a user as a compact columnar batch
+
+        The batch is cached next to the raw payload, so callers of
+        get_user_orders for the same trader don't refetch it.
+        """
+        return self._get_batch(user_address, "orders", self.get_user_orders, OrderBatch.from_orders)
+
+    def get_user_fill_batch(self, user_address: str) -> FillBatch:
+        """Fetch user fills as a compact columnar batch"""
+        return self._get_batch(user_address, "trades", self.get_user_trades, FillBatch.from_fills)
+
+    def _get_batch(self, user_address: str, prefix: str, fetch, parse):
+        cache_key = f"{prefix}_columnar_{user_address}"
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        batch = parse(fetch(user_address))
+        self.cache.set(cache_key, batch)
+        return batch
     
     def get_top_traders(self, 
                        limit: int = 10, 
                        min_daily_volume: float = 0,
                        min_daily_pnl: float = float('-inf'),
-                       min_roi: float = float('-inf')) -> List[Dict[str, Any]]:
-        """Get top traders with optional filtering"""
+                       min_roi: float = float('-inf'),
+                       stream: bool = False) -> List[Dict[str, Any]]:
+        """Get top traders with optional filtering
+
+        With stream=True the leaderboard is parsed row by row as it downloads,
+        filtered per row and reduced with a bounded heap, so peak memory is
+        O(limit) rather than O(leaderboard size).
+        """
         try:
+            if stream:
+                return self._get_top_traders_streaming(limit, min_daily_volume, min_daily_pnl, min_roi)
+
             response = requests.get(self.leaderboard_url)
             response.raise_for_status()
             data = response.json()
@@ -63,23 +146,7 @@ class HyperliquidDataService:
                 return []
                 
             # Convert to DataFrame for easier filtering
-            rows = []
-            for row in data['leaderboardRows']:
-                # Extract performance metrics
-                performances = {p[0]: p[1] for p in row['windowPerformances']}
-                
-                row_data = {
-                    'address': row['ethAddress'],
-                    'account_value': float(row['accountValue']),
-                    'display_name': row['displayName'] or 'Unknown',
-                    'daily_pnl': float(performances['day']['pnl']),
-                    'daily_roi': float(performances['day']['roi']),
-                    'daily_volume': float(performances['day']['vlm']),
-                    'weekly_pnl': float(performances['week']['pnl']),
-                    'monthly_pnl': float(performances['month']['pnl']),
-                    'all_time_pnl': float(performances['allTime']['pnl'])
-                }
-                rows.append(row_data)
+            rows = [self._leaderboard_row(row) for row in data['leaderboardRows']]
             
             df = pd.DataFrame(rows)
             
@@ -99,114 +166,547 @@ class HyperliquidDataService:
         except Exception as e:
             logging.error(f"Error getting top traders: {str(e)}")
             return []
+
+    def _get_top_traders_streaming(self,
+                                   limit: int,
+                                   min_daily_volume: float,
+                                   min_daily_pnl: float,
+                                   min_roi: float) -> List[Dict[str, Any]]:
+        """Keep the top `limit` filtered rows by account value while streaming the leaderboard"""
+        if limit <= 0:
+            return []
+
+        # Min-heap of (account_value, -position, row); on ties the earlier row wins
+        top = []
+        with self.session.get(self.leaderboard_url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for position, raw_row in enumerate(_iter_json_array_items(response.iter_content(chunk_size=1 << 16), "leaderboardRows")):
+                row = self._leaderboard_row(raw_row)
+                if (row['daily_volume'] < min_daily_volume or
+                        row['daily_pnl'] < min_daily_pnl or
+                        row['daily_roi'] < min_roi):
+                    continue
+
+                entry = (row['account_value'], -position, row)
+                if len(top) < limit:
+                    heapq.heappush(top, entry)
+                elif entry[:2] > top[0][:2]:
+                    heapq.heapreplace(top, entry)
+
+        return [row for _, _, row in sorted(top, key=lambda entry: entry[:2], reverse=True)]
+
+    def _leaderboard_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Flatten a raw leaderboard row"""
+        # Extract performance metrics
+        performances = {p[0]: p[1] for p in row['windowPerformances']}
+
+        return {
+            'address': row['ethAddress'],
+            'account_value': float(row['accountValue']),
+            'display_name': row['displayName'] or 'Unknown',
+            'daily_pnl': float(performances['day']['pnl']),
+            'daily_roi': float(performances['day']['roi']),
+            'daily_volume': float(performances['day']['vlm']),
+            'weekly_pnl': float(performances['week']['pnl']),
+            'monthly_pnl': float(performances['month']['pnl']),
+            'all_time_pnl': float(performances['allTime']['pnl'])
+        }
     
-    def _make_api_request(self, payload: Dict[str, Any], cache_key: str) -> List[Dict[str, Any]]:
-        """Make API request with caching"""
+    def _make_api_request(self, payload: Dict[str, Any], cache_key: Optional[str]) -> List[Dict[str, Any]]:
+        """Make API request with caching (skipped when cache_key is None)
+
+        Concurrent callers asking for the same payload share one upstream
+        request and all receive its result (or its error).
+
+        Raises:
+            HyperliquidAPIError: If the request fails after all retries
+        """
+        flight_key, future, leader = self._join_flight(payload)
+        if not leader:
+            return future.result()
+
         try:
-            print(f"Making API request with payload: {payload}")
-            print(f"API URL: {self.api_url}")
-            print(f"Headers: {self.headers}")
-            response = requests.post(self.api_url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            data = response.json()
-            # print(f"Data: {data}")
-            self.cache[cache_key] = data
+            data = self._send_api_request(payload, cache_key)
+        except BaseException as e:
+            self._finish_flight(flight_key, future, error=e)
+            raise
+        self._finish_flight(flight_key, future, result=data)
+        return data
+
+    def _send_api_request(self, payload: Dict[str, Any], cache_key: Optional[str]) -> List[Dict[str, Any]]:
+        """Send one API request, caching the response
+
+        The request waits for weight budget from the scheduler and is retried
+        with backoff on rate limits, server errors and connection failures.
+
+        Raises:
+            HyperliquidAPIError: If the request fails after all retries
+        """
+        weight = self.scheduler.weight_for(payload)
+        error = None
+        retry_after = None
+        for attempt in range(self.scheduler.max_retries + 1):
+            if attempt:
+                time.sleep(self.scheduler.backoff(attempt - 1, retry_after))
+            retry_after = None
+
+            self.scheduler.acquire(weight)
+            try:
+                logging.debug(f"Making API request with payload: {payload}")
+                response = self.session.post(self.api_url, headers=self.headers, json=payload, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                error = e
+                continue
+
+            if response.status_code == 429 or response.status_code >= 500:
+                error = f"HTTP {response.status_code}"
+                retry_after = self._handle_retryable_status(response.status_code, response.headers)
+                continue
+
+            try:
+                response.raise_for_status()
+                data = response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                raise HyperliquidAPIError(f"API request {payload.get('type')} failed: {str(e)}") from e
+
+            self._record_success(payload, data)
+            self._store(cache_key, payload, data)
             return data
-        except requests.exceptions.RequestException as e:
-            logging.error(f"API request failed: {str(e)}")
-            return []
+
+        logging.error(f"API request failed after {self.scheduler.max_retries + 1} attempts: {error}")
+        raise HyperliquidAPIError(f"API request {payload.get('type')} failed: {error}")
+
+    def fetch_many(self,
+                   addresses: Iterable[str],
+                   kinds: Tuple[str, ...] = ("orders", "fills", "positions"),
+                   max_concurrency: Optional[int] = None) -> Iterator[Tuple[str, str, Any]]:
+        """Fetch several request kinds for many addresses concurrently.
+
+        The requests run on a pooled async HTTP client in a background thread,
+        at most `max_concurrency` at a time. Results are yielded as
+        (address, kind, data) tuples in completion order and are cached just
+        like the single-address getters, so callers can start processing the
+        first trader while the rest of the sweep is still in flight.
+        """
+        return self._iterate_in_background(self.afetch_many(addresses, kinds, max_concurrency))
+
+    async def afetch_many(self,
+                          addresses: Iterable[str],
+                          kinds: Tuple[str, ...] = ("orders", "fills", "positions"),
+                          max_concurrency: Optional[int] = None) -> AsyncIterator[Tuple[str, str, Any]]:
+        """Async variant of `fetch_many` yielding results as they complete"""
+        for kind in kinds:
+            if kind not in REQUEST_KINDS:
+                raise ValueError(f"Unknown request kind: {kind}")
+
+        requests_to_make = []
+        for address in addresses:
+            for kind in kinds:
+                request_type, prefix = REQUEST_KINDS[kind]
+                payload = {
+                    "type": request_type,
+                    "user": address
+                }
+                requests_to_make.append(((address, kind), payload, f"{prefix}_{address}"))
+
+        async for (address, kind), data in self._afetch_payloads(requests_to_make, max_concurrency):
+            yield address, kind, data
+
+    def get_user_fills_since(self, user_address: str, start_time: int, end_time: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Fetch a user's fills with time >= start_time (ms) from the time-ranged fills endpoint"""
+        return self._make_api_request(self._fills_by_time_payload(user_address, start_time, end_time), None)
+
+    def fetch_fills_since(self,
+                          start_times: Dict[str, int],
+                          max_concurrency: Optional[int] = None) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """Fetch fills newer than a per-address start time (ms) for many addresses concurrently.
+
+        Yields (address, fills) tuples as requests complete. Time-ranged
+        responses are not cached since every cycle asks for a new range.
+        """
+        requests_to_make = [
+            (address, self._fills_by_time_payload(address, start_time), None)
+            for address, start_time in start_times.items()
+        ]
+        return self._iterate_in_background(self._afetch_payloads(requests_to_make, max_concurrency))
+
+    def get_user_fill_history(self,
+                              user_address: str,
+                              start_time: int = HISTORY_START_MS,
+                              end_time: Optional[int] = None,
+                              windows: int = 8) -> List[Dict[str, Any]]:
+        """Fetch a user's complete fill history between start_time and end_time (ms)
+
+        See `fetch_fill_histories`. Fills are returned oldest first.
+        
+        Raises:
+            HyperliquidAPIError: If a window still failed after its retries
+        """
+        for _, fills in self.fetch_fill_histories([user_address], start_time, end_time, windows):
+            if fills is None:
+                raise HyperliquidAPIError(f"Fill history for {user_address} is incomplete")
+            return fills
+        return []
+
+    def fetch_fill_histories(self,
+                             addresses: Iterable[str],
+                             start_time: int = HISTORY_START_MS,
+                             end_time: Optional[int] = None,
+                             windows: int = 8,
+                             max_concurrency: Optional[int] = None) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """Fetch complete fill histories for many addresses in parallel time windows.
+
+        Every trader's range is split into `windows` equal windows which are
+        requested concurrently. A window that comes back with a full page was
+        truncated, so the part after its newest fill is split again and
+        requested in the next round. Windows share their boundary
+        millisecond, and overlapping fills are merged by tid. Yields
+        (address, fills) tuples, fills oldest first, as each trader completes;
+        an address listed more than once is fetched once. fills is None if
+        any of the trader's windows still failed after its retries, so a
+        gap is never mistaken for a period without fills.
+
+        The windows depend on end_time, which defaults to now; pass a fixed
+        end time when the requests have to be repeatable (replay fixtures).
+        """
+        return self._iterate_in_background(
+            self._afetch_fill_histories(addresses, start_time, end_time, windows, max_concurrency)
+        )
+
+    async def _afetch_fill_histories(self,
+                                     addresses: Iterable[str],
+                                     start_time: int,
+                                     end_time: Optional[int],
+                                     windows: int,
+                                     max_concurrency: Optional[int]) -> AsyncIterator[Tuple[str, List[Dict[str, Any]]]]:
+        if end_time is None:
+            end_time = int(time.time() * 1000)
+        windows = max(1, windows)
+        # Per-address bookkeeping below assumes every address appears once
+        addresses = list(dict.fromkeys(addresses))
+
+        fills_by_tid = {}
+        pending_windows = {}
+        incomplete = set()
+        requests_to_make = []
+        for address in addresses:
+            fills_by_tid[address] = {}
+            pending_windows[address] = 0
+            for window_start, window_end in _split_range(start_time, end_time, windows):
+                requests_to_make.append(
+                    ((address, window_start, window_end), self._fills_by_time_payload(address, window_start, window_end), None)
+                )
+                pending_windows[address] += 1
+
+        while requests_to_make:
+            next_round = []
+            async for (address, window_start, window_end), fills in self._afetch_payloads(requests_to_make, max_concurrency):
+                pending_windows[address] -= 1
+                if fills is None:
+                    logging.error(f"Fill history for {address} is missing {window_start}-{window_end}")
+                    incomplete.add(address)
+                    fills = []
+
+                for fill in fills:
+                    fills_by_tid[address][fill.get('tid', (fill['time'], fill.get('oid'), fill.get('px'), fill.get('sz')))] = fill
+
+                newest = max((fill['time'] for fill in fills), default=window_start)
+                if len(fills) >= FILLS_PAGE_SIZE and newest < window_end:
+                    if newest == window_start:
+                        # A whole page within one millisecond: skip past it rather than loop
+                        logging.warning(f"More than {FILLS_PAGE_SIZE} fills for {address} at {newest}; keeping the first page")
+                        newest += 1
+                    # Size the follow-up windows from the fill rate seen so far, aiming
+                    # for half-full pages so one more round usually finishes the range
+                    rate = len(fills) / max(1, newest - window_start)
+                    parts = min(windows, max(2, math.ceil(2 * rate * (window_end - newest) / FILLS_PAGE_SIZE)))
+                    for sub_start, sub_end in _split_range(newest, window_end, parts):
+                        next_round.append(
+                            ((address, sub_start, sub_end), self._fills_by_time_payload(address, sub_start, sub_end), None)
+                        )
+                        pending_windows[address] += 1
+
+                if pending_windows[address] == 0:
+                    history = sorted(fills_by_tid.pop(address).values(), key=lambda fill: (fill['time'], fill.get('tid', 0)))
+                    yield address, None if address in incomplete else history
+            requests_to_make = next_round
+
+    def _fills_by_time_payload(self, user_address: str, start_time: int, end_time: Optional[int] = None) -> Dict[str, Any]:
+        payload = {
+            "type": "userFillsByTime",
+            "user": user_address,
+            "startTime": int(start_time)
+        }
+        if end_time is not None:
+            payload["endTime"] = int(end_time)
+        return payload
+
+    def _iterate_in_background(self, results_iterator: AsyncIterator[Any]) -> Iterator[Any]:
+        """Drive an async iterator on its own event loop thread and yield its items
+
+        If the consumer stops early (returns, raises or closes the generator)
+        the producer is cancelled, so no further requests are sent.
+        """
+        results = queue.Queue()
+        done = object()
+        stop = threading.Event()
+        producer = {}
+        producer_lock = threading.Lock()
+
+        def run():
+            async def produce():
+                with producer_lock:
+                    producer['loop'] = asyncio.get_running_loop()
+                    producer['task'] = asyncio.current_task()
+                try:
+                    async for result in results_iterator:
+                        if stop.is_set():
+                            break
+                        results.put(result)
+                finally:
+                    await results_iterator.aclose()
+            try:
+                if not stop.is_set():
+                    asyncio.run(produce())
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                results.put(e)
+            finally:
+                results.put(done)
+
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        try:
+            while True:
+                result = results.get()
+                if result is done:
+                    break
+                if isinstance(result, Exception):
+                    raise result
+                yield result
+            worker.join()
+        finally:
+            stop.set()
+            with producer_lock:
+                if 'task' in producer and worker.is_alive():
+                    try:
+                        producer['loop'].call_soon_threadsafe(producer['task'].cancel)
+                    except RuntimeError:
+                        pass  # the loop finished on its own in the meantime
+
+    async def _afetch_payloads(self,
+                               requests_to_make: List[Tuple[Any, Dict[str, Any], Optional[str]]],
+                               max_concurrency: Optional[int] = None) -> AsyncIterator[Tuple[Any, Any]]:
+        """Run (tag, payload, cache_key) requests on a pooled async client, yielding (tag, data) as they complete"""
+        limit = max_concurrency or self.max_concurrency
+        semaphore = asyncio.Semaphore(limit)
+        limits = httpx.Limits(max_connections=limit, max_keepalive_connections=limit)
+
+        async with httpx.AsyncClient(headers=self.headers, limits=limits, timeout=self.timeout) as client:
+            async def fetch(tag: Any, payload: Dict[str, Any], cache_key: Optional[str]) -> Tuple[Any, Any]:
+                if cache_key is not None:
+                    cached = self._get_cached(cache_key, payload)
+                    if cached is not None:
+                        return tag, cached
+
+                async with semaphore:
+                    try:
+                        data = await self._make_async_api_request(client, payload, cache_key)
+                    except HyperliquidAPIError as e:
+                        logging.error(str(e))
+                        data = None
+                return tag, data
+
+            tasks = [asyncio.ensure_future(fetch(*request)) for request in requests_to_make]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    async def _make_async_api_request(self, client: httpx.AsyncClient, payload: Dict[str, Any], cache_key: Optional[str]) -> Any:
+        """Make API request on a pooled async client, coalescing identical in-flight requests
+
+        Raises:
+            HyperliquidAPIError: If the request fails after all retries
+        """
+        flight_key, future, leader = self._join_flight(payload)
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            data = await self._send_async_api_request(client, payload, cache_key)
+        except BaseException as e:
+            self._finish_flight(flight_key, future, error=e)
+            raise
+        self._finish_flight(flight_key, future, result=data)
+        return data
+
+    async def _send_async_api_request(self, client: httpx.AsyncClient, payload: Dict[str, Any], cache_key: Optional[str]) -> Any:
+        """Send one API request on a pooled async client with caching and scheduler-driven retries
+
+        Raises:
+            HyperliquidAPIError: If the request fails after all retries
+        """
+        weight = self.scheduler.weight_for(payload)
+        error = None
+        retry_after = None
+        for attempt in range(self.scheduler.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.scheduler.backoff(attempt - 1, retry_after))
+            retry_after = None
+
+            await self.scheduler.acquire_async(weight)
+            try:
+                response = await client.post(self.api_url, json=payload)
+            except httpx.TransportError as e:
+                error = e
+                continue
+
+            if response.status_code == 429 or response.status_code >= 500:
+                error = f"HTTP {response.status_code}"
+                retry_after = self._handle_retryable_status(response.status_code, response.headers)
+                continue
+
+            try:
+                response.raise_for_status()
+                data = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                raise HyperliquidAPIError(f"API request {payload.get('type')} failed: {str(e)}") from e
+
+            self._record_success(payload, data)
+            self._store(cache_key, payload, data)
+            return data
+
+        logging.error(f"API request failed after {self.scheduler.max_retries + 1} attempts: {error}")
+        raise HyperliquidAPIError(f"API request {payload.get('type')} failed: {error}")
+
+    def _join_flight(self, payload: Dict[str, Any]) -> Tuple[str, concurrent.futures.Future, bool]:
+        """Return the in-flight future for a payload and whether the caller must perform the request"""
+        flight_key = PersistentResponseCache.make_key(payload)
+        with self._inflight_lock:
+            future = self._inflight.get(flight_key)
+            if future is not None:
+                return flight_key, future, False
+            future = concurrent.futures.Future()
+            self._inflight[flight_key] = future
+            return flight_key, future, True
+
+    def _finish_flight(self, flight_key: str, future: concurrent.futures.Future, result: Any = None, error: BaseException = None):
+        """Hand the leader's outcome to every waiting caller"""
+        with self._inflight_lock:
+            self._inflight.pop(flight_key, None)
+        if error is None:
+            future.set_result(result)
+        elif isinstance(error, Exception):
+            future.set_exception(error)
+        else:
+            # Cancellation or interpreter shutdown of the leader is not the followers' failure
+            future.set_exception(HyperliquidAPIError(f"API request {flight_key} was interrupted"))
+
+    def _handle_retryable_status(self, status_code: int, headers) -> Optional[float]:
+        """Tell the scheduler about a rate limit and return the Retry-After delay, if any"""
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+        if status_code == 429:
+            self.scheduler.on_rate_limited(retry_after)
+        return retry_after
+
+    def _record_success(self, payload: Dict[str, Any], data: Any):
+        self.scheduler.on_success()
+        self.scheduler.charge(self.scheduler.response_weight(payload, data))
+
+    def _get_cached(self, cache_key: str, payload: Dict[str, Any]) -> Any:
+        """Look up a response in memory, then in the shared on-disk cache"""
+        cached = self.cache.get(cache_key)
+        if cached is not None or self.persistent_cache is None:
+            return cached
+
+        cached, ttl = self.persistent_cache.get_entry(payload)
+        if cached is not None:
+            # Kept in memory only for what is left of its on-disk TTL
+            self.cache.set(cache_key, cached, ttl=ttl)
+        return cached
+
+    def _store(self, cache_key: Optional[str], payload: Dict[str, Any], data: Any):
+        """Store a fresh response in memory and in the shared on-disk cache"""
+        if cache_key is None:
+            return
+        self.cache.set(cache_key, data)
+        if self.persistent_cache is not None:
+            self.persistent_cache.set(payload, data, kind=cache_key.split('_', 1)[0])
         
-    def process_orders_to_dataframe(self, orders: List[Dict[str, Any]]) -> pd.DataFrame:
-        """Convert historical orders to DataFrame"""
-        if not orders:
+    def process_orders_to_dataframe(self, orders: Union[List[Dict[str, Any]], OrderBatch]) -> pd.DataFrame:
+        """Convert historical orders (raw payload or OrderBatch) to DataFrame
+
+        Columns come straight from the typed batch and the derived position,
+        PnL and ROI columns are computed with array operations.
+        """
+        if not isinstance(orders, OrderBatch):
+            if not orders:
+                return pd.DataFrame()
+            orders = OrderBatch.from_orders(orders)
+        if len(orders) == 0:
             return pd.DataFrame()
             
-        # Extract order details and status into a flat structure
-        processed_orders = []
-        for order_data in orders:
-            order = order_data['order']
-            status = order_data['status']
-            status_timestamp = order_data['statusTimestamp']
-            
-            processed_order = {
-                'coin': order['coin'],
-                'side': order['side'],
-                'limitPx': order['limitPx'],
-                'sz': order['sz'],
-                'origSz': order['origSz'],
-                'oid': order['oid'],
-                'timestamp': order['timestamp'],
-                'orderType': order['orderType'],
-                'tif': order['tif'],
-                'reduceOnly': order['reduceOnly'],
-                'status': status,
-                'statusTimestamp': status_timestamp
-            }
-            processed_orders.append(processed_order)
-            
-        df = pd.DataFrame(processed_orders)
+        df = orders.to_frame()
         
         # Convert timestamps
         df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
         df['statusTimestamp'] = pd.to_datetime(df['statusTimestamp'], unit='ms')
-        
-        # Convert numeric columns
-        numeric_columns = ['limitPx', 'sz', 'origSz']
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
                 
-        # Convert side to lowercase for consistency and add position type
-        if 'side' in df.columns:
-            df['side'] = df['side'].str.lower()
-            df['position_type'] = df['side'].map({'a': 'Short', 'b': 'Long'})
+        # Side is already lowercase in the batch; add position type
+        df['position_type'] = df['side'].map({'a': 'Short', 'b': 'Long'})
             
-        # Calculate PnL for filled orders
-        if all(col in df.columns for col in ['side', 'limitPx', 'sz', 'status']):
-            # Sort by timestamp ascending for calculations
-            df = df.sort_values('timestamp')
-            
-            # Calculate position size (negative for shorts, positive for longs)
-            df['position_size'] = df.apply(
-                lambda x: -float(x['sz']) if x['side'] == 'a' else float(x['sz']),
-                axis=1
-            )
-            
-            # Calculate cumulative position
-            df['cumulative_position'] = df.groupby('coin')['position_size'].cumsum()
-            
-            # Calculate entry price for each position
-            df['entry_price'] = df.groupby('coin')['limitPx'].transform('first')
-            
-            # Calculate PnL for filled orders
-            df['pnl'] = df.apply(
-                lambda x: (
-                    (float(x['limitPx']) - float(x['entry_price'])) * float(x['sz'])
-                    if x['side'] == 'b'  # Long position
-                    else (float(x['entry_price']) - float(x['limitPx'])) * float(x['sz'])
-                    if x['side'] == 'a'  # Short position
-                    else 0
-                ) if x['status'] == 'filled' else 0,
-                axis=1
-            )
-            
-            # Calculate cumulative PnL
-            df['cumulative_pnl'] = df.groupby('coin')['pnl'].cumsum()
-            
-            # Calculate ROI
-            df['roi'] = df['cumulative_pnl'] / (df['entry_price'] * df['position_size'].abs())
-            
-            # Sort back to descending order (newest first)
-            df = df.sort_values('timestamp', ascending=False)
+        # Sort by timestamp ascending for calculations
+        df = df.sort_values('timestamp')
+
+        side = df['side'].to_numpy()
+        is_sell = side == 'a'
+        is_buy = side == 'b'
+        size = df['sz'].to_numpy()
+        price = df['limitPx'].to_numpy()
+        
+        # Calculate position size (negative for shorts, positive for longs)
+        df['position_size'] = np.where(is_sell, -size, size)
+        
+        # Calculate cumulative position
+        df['cumulative_position'] = df.groupby('coin')['position_size'].cumsum()
+        
+        # Calculate entry price for each position
+        df['entry_price'] = df.groupby('coin')['limitPx'].transform('first')
+        entry_price = df['entry_price'].to_numpy()
+        
+        # Calculate PnL for filled orders: longs gain when price rises, shorts when it falls
+        filled = (df['status'] == 'filled').to_numpy()
+        direction = np.where(is_buy, 1.0, np.where(is_sell, -1.0, 0.0))
+        pnl = np.where(filled, direction * (price - entry_price) * size, 0.0)
+        # Orders with neither side contribute 0 even when the price is missing
+        pnl[filled & ~is_buy & ~is_sell] = 0.0
+        df['pnl'] = pnl
+        
+        # Calculate cumulative PnL
+        df['cumulative_pnl'] = df.groupby('coin')['pnl'].cumsum()
+        
+        # Calculate ROI
+        df['roi'] = df['cumulative_pnl'] / (df['entry_price'] * df['position_size'].abs())
+        
+        # Sort back to descending order (newest first)
+        df = df.sort_values('timestamp', ascending=False)
             
         return df
 
-    def process_trades_to_dataframe(self, trades: List[Dict[str, Any]]) -> pd.DataFrame:
-        """Convert trades to DataFrame"""
-        if not trades:
-            return pd.DataFrame()
-            
-        df = pd.DataFrame(trades)
+    def process_trades_to_dataframe(self, trades: Union[List[Dict[str, Any]], FillBatch]) -> pd.DataFrame:
+        """Convert trades (raw payload or FillBatch) to DataFrame"""
+        if isinstance(trades, FillBatch):
+            if len(trades) == 0:
+                return pd.DataFrame()
+            df = trades.to_frame()
+        else:
+            if not trades:
+                return pd.DataFrame()
+            df = pd.DataFrame(trades)
         
         # Convert time to timestamp
         if 'time' in df.columns:
@@ -216,7 +716,7 @@ class HyperliquidDataService:
         numeric_columns = ['px', 'sz', 'startPosition', 'closedPnl', 'fee']
         for col in numeric_columns:
             if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+                df[col] = _to_float_array(df[col].to_numpy())
                 
         # Convert side to lowercase for consistency and add position type
         if 'side' in df.columns:
@@ -225,17 +725,13 @@ class HyperliquidDataService:
             
         # Calculate position value and size
         if all(col in df.columns for col in ['px', 'sz', 'side']):
-            # Position value (negative for shorts, positive for longs)
-            df['position_value'] = df.apply(
-                lambda x: -float(x['px']) * float(x['sz']) if x['side'] == 'a' else float(x['px']) * float(x['sz']),
-                axis=1
-            )
-            
-            # Position size (negative for shorts, positive for longs)
-            df['position_size'] = df.apply(
-                lambda x: -float(x['sz']) if x['side'] == 'a' else float(x['sz']),
-                axis=1
-            )
+            sign = np.where(df['side'].to_numpy() == 'a', -1.0, 1.0)
+            size = df['sz'].to_numpy(dtype=np.float64)
+            price = df['px'].to_numpy(dtype=np.float64)
+
+            # Position value and size (negative for shorts, positive for longs)
+            df['position_value'] = sign * price * size
+            df['position_size'] = sign * size
             
             # Sort by timestamp ascending for calculations
             df = df.sort_values('timestamp')
@@ -243,15 +739,20 @@ class HyperliquidDataService:
             # Calculate cumulative position
             df['cumulative_position'] = df.groupby('coin')['position_size'].cumsum()
             
-            # Calculate weighted average price (VWAP) with zero size handling
-            def calculate_vwap(group):
-                """Calculate VWAP for a group of trades, handling zero sizes"""
-                total_value = (group['px'] * group['sz'].abs()).sum()
-                total_size = group['sz'].abs().sum()
-                return total_value / total_size if total_size > 0 else group['px'].mean()
-            
-            # Calculate VWAP for each coin and transform to fill all rows
-            df['vwap'] = df.groupby('coin').apply(calculate_vwap).reset_index(level=0, drop=True)
+            # Weighted average price (VWAP) per coin from per-row value and size sums,
+            # broadcast back to every row; coins with zero total size fall back to the mean price
+            abs_size = df['sz'].abs()
+            sums = pd.DataFrame({
+                'coin': df['coin'],
+                'value': df['px'] * abs_size,
+                'size': abs_size,
+                'px': df['px']
+            }).groupby('coin')
+            total_value = sums['value'].transform('sum').to_numpy()
+            total_size = sums['size'].transform('sum').to_numpy()
+            mean_price = sums['px'].transform('mean').to_numpy()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                df['vwap'] = np.where(total_size > 0, total_value / total_size, mean_price)
             
             # Sort back to descending order (newest first)
             df = df.sort_values('timestamp', ascending=False)
@@ -261,12 +762,97 @@ class HyperliquidDataService:
     def get_user_positions(self, user_address: str) -> Dict[str, Any]:
         """Fetch current positions for a user"""
         cache_key = f"positions_{user_address}"
-        if cache_key in self.cache:
-            return self.cache[cache_key]
-
         payload = {
             "type": "clearinghouseState",
             "user": user_address
         }
+        cached = self._get_cached(cache_key, payload)
+        if cached is not None:
+            return cached
         
-        return self._make_api_request(payload, cache_key) 
\ No newline at end of file
+        return self._make_api_request(payload, cache_key) 
+
+
+# Separators skipped between the tokens _iter_json_array_items looks for
+_JSON_SPACE_OR_COLON = re.compile(r'[ \t\r\n:]*')
+_JSON_SPACE_OR_COMMA = re.compile(r'[ \t\r\n,]*')
+
+
+def _split_range(start: int, end: int, parts: int) -> List[Tuple[int, int]]:
+    """Split [start, end] into up to `parts` windows sharing their boundaries"""
+    if end <= start:
+        return [(start, end)]
+    step = max(1, -(-(end - start) // parts))
+    return [(window_start, min(window_start + step, end)) for window_start in range(start, end, step)]
+
+
+def _iter_json_array_items(chunks: Iterable[bytes], key: str) -> Iterator[Any]:
+    """Incrementally decode the items of the array stored under `key` in a streamed JSON object
+
+    Items are decoded in place at a cursor into the buffer; the consumed
+    prefix is only dropped when a new chunk is appended, so each byte is
+    copied a bounded number of times. An item cut off by the end of the
+    buffer is retried once the unparsed tail has at least doubled, so large
+    items are not re-decoded once per chunk. Only the item being decoded and
+    about one network chunk are held in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer = ''
+    index = 0
+    exhausted = False
+
+    def read_more() -> bool:
+        """Append the next chunk, dropping the consumed prefix; False at end of stream"""
+        nonlocal buffer, index, exhausted
+        if exhausted:
+            return False
+        try:
+            text = text_decoder.decode(next(chunks))
+        except StopIteration:
+            text = text_decoder.decode(b'', final=True)
+            exhausted = True
+        buffer = buffer[index:] + text
+        index = 0
+        return True
+
+    def skip(pattern) -> bool:
+        """Move the cursor past characters matching `pattern`, reading more as needed; False at end of stream"""
+        nonlocal index
+        while True:
+            index = pattern.match(buffer, index).end()
+            if index < len(buffer):
+                return True
+            if not read_more():
+                return False
+
+    # Advance to the opening bracket of the array
+    marker = f'"{key}"'
+    while True:
+        found = buffer.find(marker, index)
+        if found >= 0:
+            index = found + len(marker)
+            break
+        index = max(index, len(buffer) - len(marker))
+        if not read_more():
+            return
+    if not skip(_JSON_SPACE_OR_COLON) or buffer[index] != '[':
+        return
+    index += 1
+
+    while skip(_JSON_SPACE_OR_COMMA):
+        if buffer[index] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, index)
+        except json.JSONDecodeError:
+            # Most likely a partial item: wait for twice as much input before retrying
+            wanted = 2 * (len(buffer) - index)
+            if not read_more():
+                raise
+            while len(buffer) - index < wanted and read_more():
+                pass
+            continue
+        index = end
+        yield item
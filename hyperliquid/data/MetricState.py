@@ -0,0 +1,394 @@
+from typing import Dict, Any, List, Optional
+import copy
+import math
+import numpy as np
+import pandas as pd
+from .ColumnarStore import FillBatch, DAY_NAMES, MS_PER_HOUR, MS_PER_DAY, _to_objects, _position_events
+from .RiskMetrics import risk_metrics_by_group
+
+# Version of the persisted layout; states of another version are rebuilt from the stored fills
+STATE_VERSION = 2
+# An order is settled, and its size and trade moved into the running tallies, once
+# its last fill is this old; fills of one order further apart count as two orders
+ORDER_SETTLE_MS = 24 * MS_PER_HOUR
+# Unmatched position opens or closes kept per coin; beyond this the oldest are dropped
+MAX_PENDING_HOLDS = 1000
+# Holding periods are kept in a log-spaced histogram; with 50 buckets per decade
+# the median and 90th percentile are within about 2.5% of the exact values
+HOLD_BUCKETS_PER_DECADE = 50
+
+'''
+This class is a trader's persisted metric accumulator.
+It holds the running counts, sums, histograms, hold queues and trade tally
+behind the fills-mode metrics and trading style, so a refresh only folds in
+the fills ingested since the last one instead of reprocessing the trader's
+whole history. Orders still receiving fills are kept individually until they
+settle (see ORDER_SETTLE_MS).
+INPUTS:
+    state: A dict previously produced by to_dict, or None for a new trader
+OUTPUTS:
+    None
+'''
+class TraderMetricState:
+    """Incrementally maintained fill metrics for one trader"""
+
+    def __init__(self, state: Optional[Dict[str, Any]] = None):
+        state = state or {}
+        if state.get('version') != STATE_VERSION:
+            state = {}
+        self.version = STATE_VERSION
+        # Newest fill time folded, and the tids folded at that millisecond
+        self.watermark = state.get('watermark', 0)
+        self.boundary_tids = set(state.get('boundary_tids', []))
+
+        # Activity
+        self.first_time = state.get('first_time')
+        self.last_time = state.get('last_time')
+        self.hourly = state.get('hourly', [0] * 24)
+        self.daily = state.get('daily', [0] * 7)
+        self.buy_volume = state.get('buy_volume', 0.0)
+        self.sell_volume = state.get('sell_volume', 0.0)
+        # Coin counts: coin -> [count, newest timestamp]
+        self.coins = state.get('coins', {})
+
+        # Fill sums
+        self.fill_count = state.get('fill_count', 0)
+        self.realized_pnl = state.get('realized_pnl', 0.0)
+        self.total_fees = state.get('total_fees', 0.0)
+        self.turnover = state.get('turnover', 0.0)
+
+        # Orders still receiving fills: str oid -> [size, last fill time, has trade,
+        # trade pnl net of fees, trade size, trade notional, trade close time]
+        self.recent_orders = state.get('recent_orders', {})
+
+        # Settled orders: count and size mean and variance (Welford)
+        self.order_count = state.get('order_count', 0)
+        self.size_count = state.get('size_count', 0)
+        self.size_mean = state.get('size_mean', 0.0)
+        self.size_m2 = state.get('size_m2', 0.0)
+
+        # Settled trades
+        self.trade_count = state.get('trade_count', 0)
+        self.win_count = state.get('win_count', 0)
+        self.win_sum = state.get('win_sum', 0.0)
+        self.loss_count = state.get('loss_count', 0)
+        self.loss_sum = state.get('loss_sum', 0.0)
+        self.trade_size_sum = state.get('trade_size_sum', 0.0)
+        self.trade_size_max = state.get('trade_size_max')
+        # Trade PnL per close day (str day index -> pnl) and the largest trade notional, for the risk metrics
+        self.daily_pnl = state.get('daily_pnl', {})
+        self.trade_notional_max = state.get('trade_notional_max', 0.0)
+
+        # Unmatched opens or closes per coin that has opened a position (coin -> [kind, [timestamps]])
+        # and matched holds: exact count and sum in hours plus a histogram (bucket -> count) for quantiles
+        self.pending_holds = state.get('pending_holds', {})
+        self.hold_count = state.get('hold_count', 0)
+        self.hold_sum = state.get('hold_sum', 0.0)
+        self.hold_histogram = state.get('hold_histogram', {})
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable snapshot of the state"""
+        state = dict(vars(self))
+        state['boundary_tids'] = sorted(self.boundary_tids)
+        return state
+
+    def fold(self, fills: List[Dict[str, Any]]) -> int:
+        """Fold fills newer than the watermark into the state
+
+        Fills are processed in (time, tid) order, the order the full fills
+        analysis uses.
+
+        Args:
+            fills (List[Dict[str, Any]]): userFills-shaped fills, e.g. from
+                `TraderDatabase.get_trader_fills(address, start_time=watermark)`;
+                fills already folded are skipped
+
+        Returns:
+            int: Number of fills folded
+        """
+        new_fills = [
+            fill for fill in fills
+            if fill['time'] > self.watermark or (fill['time'] == self.watermark and fill['tid'] not in self.boundary_tids)
+        ]
+        if not new_fills:
+            return 0
+
+        newest = max(fill['time'] for fill in new_fills)
+        at_newest = {fill['tid'] for fill in new_fills if fill['time'] == newest}
+        self.boundary_tids = self.boundary_tids | at_newest if newest == self.watermark else at_newest
+        self.watermark = newest
+
+        batch = FillBatch.from_fills(new_fills)
+        order = np.lexsort((batch.tid, batch.time))
+        times = batch.time[order]
+        sizes = batch.sz[order]
+        coins = _to_objects(batch.coin)[order]
+        closed_pnl = np.nan_to_num(batch.closed_pnl[order])
+        fees = np.nan_to_num(batch.fee[order])
+        notional = np.nan_to_num(batch.px[order] * sizes)
+        reducing, opens, closes = _position_events(batch, order)
+
+        self._fold_activity(times, _to_objects(batch.side)[order], sizes)
+        _count_values(self.coins, coins, times)
+        self.fill_count += len(times)
+        self.realized_pnl += float(closed_pnl.sum())
+        self.total_fees += float(fees.sum())
+        self.turnover += float(notional.sum())
+        self._fold_orders(batch.oid[order], times, sizes, reducing, closed_pnl - fees, notional)
+        self._fold_holds(coins, times, opens, closes)
+        self._settle_orders(self.watermark - ORDER_SETTLE_MS)
+        return len(new_fills)
+
+    def _fold_activity(self, timestamps: np.ndarray, sides: np.ndarray, sizes: np.ndarray):
+        first, last = int(timestamps.min()), int(timestamps.max())
+        self.first_time = first if self.first_time is None else min(self.first_time, first)
+        self.last_time = last if self.last_time is None else max(self.last_time, last)
+
+        hourly = np.bincount((timestamps // MS_PER_HOUR) % 24, minlength=24)
+        daily = np.bincount((timestamps // MS_PER_DAY + 3) % 7, minlength=7)
+        self.hourly = (np.asarray(self.hourly) + hourly).tolist()
+        self.daily = (np.asarray(self.daily) + daily).tolist()
+
+        volume = np.where(np.isnan(sizes), 0.0, sizes)
+        self.buy_volume += float(volume[sides == 'b'].sum())
+        self.sell_volume += float(volume[sides == 'a'].sum())
+
+    def _fold_orders(self, oids: np.ndarray, timestamps: np.ndarray, sizes: np.ndarray,
+                     reducing: np.ndarray, net_pnl: np.ndarray, notional: np.ndarray):
+        """Add each fill to its order; the reducing fills of an order make up its trade"""
+        sizes = np.nan_to_num(sizes)
+        for oid, timestamp, size, is_reducing, pnl, fill_notional in zip(
+                oids.tolist(), timestamps.tolist(), sizes.tolist(), reducing.tolist(), net_pnl.tolist(), notional.tolist()):
+            entry = self.recent_orders.setdefault(str(oid), [0.0, timestamp, False, 0.0, 0.0, 0.0, timestamp])
+            entry[0] += size
+            entry[1] = timestamp
+            if is_reducing:
+                entry[2] = True
+                entry[3] += pnl
+                entry[4] += size
+                entry[5] += fill_notional
+                entry[6] = timestamp
+
+    def _settle_orders(self, before: float):
+        """Move orders whose last fill is older than `before` into the running tallies"""
+        settled = [oid for oid, entry in self.recent_orders.items() if entry[1] < before]
+        if not settled:
+            return
+        entries = [self.recent_orders.pop(oid) for oid in settled]
+        self.order_count += len(entries)
+        self.size_count, self.size_mean, self.size_m2 = _merge_moments(
+            self.size_count, self.size_mean, self.size_m2, np.array([entry[0] for entry in entries])
+        )
+        for _, _, has_trade, pnl, size, notional, closed_at in entries:
+            if not has_trade:
+                continue
+            self.trade_count += 1
+            self.trade_size_sum += size
+            self.trade_size_max = size if self.trade_size_max is None else max(self.trade_size_max, size)
+            if pnl > 0:
+                self.win_count += 1
+                self.win_sum += pnl
+            elif pnl < 0:
+                self.loss_count += 1
+                self.loss_sum += pnl
+            day = str(closed_at // MS_PER_DAY)
+            self.daily_pnl[day] = self.daily_pnl.get(day, 0.0) + pnl
+            self.trade_notional_max = max(self.trade_notional_max, abs(notional))
+
+    def _fold_holds(self, coins: np.ndarray, timestamps: np.ndarray, opens: np.ndarray, closes: np.ndarray):
+        """Pair the k-th position open with the k-th close per coin, first in first out
+
+        A flip closes before it opens; closes before a coin's first open
+        belong to a position opened before the trader's history starts.
+        """
+        for coin, timestamp, is_open, is_close in zip(coins.tolist(), timestamps.tolist(), opens.tolist(), closes.tolist()):
+            if coin is None:
+                continue
+            if is_close and coin in self.pending_holds:
+                self._pair_hold(coin, 'close', timestamp)
+            if is_open:
+                self._pair_hold(coin, 'open', timestamp)
+
+    def _pair_hold(self, coin: str, kind: str, timestamp: int):
+        pending_kind, pending_times = self.pending_holds.get(coin, [kind, []])
+        if pending_kind == kind or not pending_times:
+            self.pending_holds[coin] = [kind, (pending_times + [timestamp])[-MAX_PENDING_HOLDS:]]
+            return
+
+        partner = pending_times.pop(0)
+        self.pending_holds[coin] = [pending_kind, pending_times]
+        open_time, close_time = (timestamp, partner) if kind == 'open' else (partner, timestamp)
+        if close_time > open_time:
+            hours = (close_time - open_time) / 1000 / 3600
+            bucket = str(math.floor(math.log10(hours) * HOLD_BUCKETS_PER_DECADE))
+            self.hold_count += 1
+            self.hold_sum += hours
+            self.hold_histogram[bucket] = self.hold_histogram.get(bucket, 0) + 1
+
+    def _settled(self) -> "TraderMetricState":
+        """A copy with every recent order settled, for reporting"""
+        state = TraderMetricState(copy.deepcopy(self.to_dict()))
+        state._settle_orders(math.inf)
+        return state
+
+    def metrics(self, account_value: Optional[float] = None) -> Dict[str, Any]:
+        """Metrics shaped like the fills-mode `HyperliquidAnalytics.analyze_trader`, without the rolling windows"""
+        metrics = {}
+        if not self.fill_count:
+            return metrics
+        state = self._settled()
+
+        first_date = pd.Timestamp(state.first_time, unit='ms')
+        last_date = pd.Timestamp(state.last_time, unit='ms')
+        total_days = (state.last_time - state.first_time) // MS_PER_DAY + 1
+        metrics['first_activity'] = first_date.isoformat()
+        metrics['last_activity'] = last_date.isoformat()
+        metrics['active_days'] = total_days
+        metrics['total_orders'] = state.order_count
+        metrics['activity_frequency'] = state.order_count / total_days if total_days > 0 else 0
+
+        metrics['hourly_distribution'] = {hour: count for hour, count in enumerate(state.hourly) if count}
+        metrics['daily_distribution'] = {
+            DAY_NAMES[day]: state.daily[day] for day in np.argsort(DAY_NAMES).tolist() if state.daily[day]
+        }
+        metrics['peak_activity_hour'] = int(np.argmax(state.hourly))
+
+        total_buy_volume = np.float64(state.buy_volume)
+        total_sell_volume = np.float64(state.sell_volume)
+        metrics['total_buy_volume'] = total_buy_volume
+        metrics['total_sell_volume'] = total_sell_volume
+        if total_buy_volume > total_sell_volume * 1.1:  # 10% threshold
+            metrics['position_bias'] = 'Long'
+        elif total_sell_volume > total_buy_volume * 1.1:
+            metrics['position_bias'] = 'Short'
+        else:
+            metrics['position_bias'] = 'Neutral'
+        total_volume = total_buy_volume + total_sell_volume
+        if total_volume > 0:
+            metrics['long_short_ratio'] = total_buy_volume / total_sell_volume if total_sell_volume > 0 else float('inf')
+            metrics['buy_percentage'] = (total_buy_volume / total_volume) * 100
+            metrics['sell_percentage'] = (total_sell_volume / total_volume) * 100
+
+        coin_counts = _ranked_counts(state.coins)
+        metrics['asset_distribution'] = dict(coin_counts)
+        metrics['most_traded_asset'] = coin_counts[0][0] if coin_counts else None
+        metrics['asset_count'] = len(coin_counts)
+        total_fills = sum(count for _, count in coin_counts)
+        if total_fills > 0:
+            concentration = sum((count/total_fills)**2 for _, count in coin_counts)
+            metrics['asset_concentration'] = concentration
+            if concentration > 0.5:
+                metrics['diversification'] = "Low"
+            elif concentration > 0.3:
+                metrics['diversification'] = "Moderate"
+            else:
+                metrics['diversification'] = "High"
+
+        metrics['total_fills'] = state.fill_count
+        metrics['realized_pnl'] = np.float64(state.realized_pnl)
+        metrics['total_fees'] = np.float64(state.total_fees)
+        metrics['total_pnl'] = np.float64(state.realized_pnl - state.total_fees)
+        metrics['turnover'] = np.float64(state.turnover)
+        metrics['fee_rate_bps'] = state.total_fees / state.turnover * 10000 if state.turnover > 0 else 0
+
+        if state.trade_count:
+            metrics['total_trades'] = state.trade_count
+            metrics['win_rate'] = np.float64(state.win_count / state.trade_count)
+            metrics['avg_win'] = np.float64(state.win_sum / state.win_count) if state.win_count else np.float64('nan')
+            metrics['avg_loss'] = np.float64(abs(state.loss_sum / state.loss_count)) if state.loss_count else np.float64('nan')
+            if metrics.get('avg_loss', 0) > 0:
+                metrics['risk_reward_ratio'] = metrics.get('avg_win', 0) / metrics.get('avg_loss', 1)
+            else:
+                metrics['risk_reward_ratio'] = float('inf')
+            metrics['avg_position_size'] = np.float64(state.trade_size_sum / state.trade_count)
+            metrics['max_position_size'] = np.float64(state.trade_size_max)
+
+            # Each day's PnL stands in for that day's trades; the largest trade notional is carried by the first day
+            days = np.array([int(day) for day in state.daily_pnl], dtype=np.int64)
+            notional = np.zeros(len(days))
+            notional[0] = state.trade_notional_max
+            risk = risk_metrics_by_group(
+                np.zeros(len(days), dtype=np.int64), days * MS_PER_DAY,
+                np.array(list(state.daily_pnl.values()), dtype=np.float64), notional, 1,
+                np.array([np.nan if account_value is None else account_value], dtype=np.float64)
+            )[0]
+            if risk is not None:
+                metrics.update(risk)
+
+        return metrics
+
+    def style(self) -> Dict[str, Any]:
+        """Trading style shaped like the fills-mode `HyperliquidAnalytics.analyze_trader`"""
+        style = {}
+        if not self.fill_count:
+            return style
+        state = self._settled()
+
+        if state.hold_count:
+            avg_holding = np.float64(state.hold_sum / state.hold_count)
+            style['avg_holding_period_hours'] = avg_holding
+            style['median_holding_period_hours'] = state._hold_quantile(0.5)
+            style['p90_holding_period_hours'] = state._hold_quantile(0.9)
+
+            if avg_holding < 1:
+                style['primary_style'] = 'Scalper'
+            elif avg_holding < 24:
+                style['primary_style'] = 'Day Trader'
+            elif avg_holding < 168:  # 7 days
+                style['primary_style'] = 'Swing Trader'
+            else:
+                style['primary_style'] = 'Position Trader'
+
+        if state.size_count:
+            size_std = np.float64(state.size_m2 / (state.size_count - 1)) ** 0.5 if state.size_count > 1 else np.float64('nan')
+            size_std = size_std / state.size_mean if state.size_mean > 0 else 0
+            style['position_size_consistency'] = size_std
+
+            if size_std < 0.3:
+                style['sizing_approach'] = 'Very Consistent'
+            elif size_std < 0.7:
+                style['sizing_approach'] = 'Moderately Consistent'
+            else:
+                style['sizing_approach'] = 'Variable'
+
+        return style
+
+    def _hold_quantile(self, q: float) -> np.float64:
+        """Approximate holding-period quantile, interpolated like np.percentile
+
+        Each hold is represented by the geometric midpoint of its bucket.
+        """
+        buckets = sorted((int(bucket), count) for bucket, count in self.hold_histogram.items())
+        edges = np.cumsum([count for _, count in buckets])
+        values = 10 ** ((np.array([bucket for bucket, _ in buckets]) + 0.5) / HOLD_BUCKETS_PER_DECADE)
+        rank = q * (self.hold_count - 1)
+        lower, upper = values[np.searchsorted(edges, [math.floor(rank), math.ceil(rank)], side='right')]
+        return np.float64(lower + (upper - lower) * (rank - math.floor(rank)))
+
+
+def _merge_moments(count: int, mean: float, m2: float, values: np.ndarray) -> tuple:
+    """Merge the values' count, mean and M2 into running totals (Chan et al.)"""
+    if not len(values):
+        return count, mean, m2
+    total = count + len(values)
+    values_mean = float(values.mean())
+    delta = values_mean - mean
+    m2 += float(((values - values_mean) ** 2).sum()) + delta ** 2 * count * len(values) / total
+    mean += delta * len(values) / total
+    return total, mean, m2
+
+
+def _count_values(counts: Dict[str, list], values: np.ndarray, timestamps: np.ndarray):
+    """Add per-value counts and newest timestamps, skipping missing values"""
+    for value, timestamp in zip(values.tolist(), timestamps.tolist()):
+        if value is None:
+            continue
+        entry = counts.setdefault(value, [0, timestamp])
+        entry[0] += 1
+        entry[1] = max(entry[1], timestamp)
+
+
+def _ranked_counts(counts: Dict[str, list]) -> List[tuple]:
+    """(value, count) pairs, most frequent first and most recently seen first on ties"""
+    ranked = sorted(counts.items(), key=lambda item: (-item[1][0], -item[1][1]))
+    return [(value, count) for value, (count, _) in ranked]
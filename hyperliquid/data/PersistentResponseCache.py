@@ -0,0 +1,113 @@
+from typing import Dict, Any, Optional, Tuple
+from contextlib import closing
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+from .ResponseCache import DEFAULT_TTLS
+
+# Expired responses are deleted once every this many writes
+PURGE_EVERY = 500
+
+'''
+This class is an on-disk cache for API responses shared between processes.
+Responses are keyed by a hash of the request payload and stored zlib-compressed
+in SQLite together with their expiry time, so the background jobs and the API
+can reuse each other's fetches and a restarted job warms up from disk.
+Expired rows are purged every PURGE_EVERY writes.
+INPUTS:
+    db_path: The path to the cache database file
+    ttls: Per-kind TTLs in seconds, merged over DEFAULT_TTLS
+    default_ttl: TTL for kinds without an explicit entry
+OUTPUTS:
+    None
+'''
+class PersistentResponseCache:
+    """SQLite-backed response cache with compressed bodies and expiry metadata"""
+
+    def __init__(self,
+                 db_path: str = "response_cache.db",
+                 ttls: Optional[Dict[str, float]] = None,
+                 default_ttl: float = 60):
+        self.db_path = db_path
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self._writes = 0
+        self.init_db()
+
+    def init_db(self):
+        """Initialize the cache table"""
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    request TEXT,
+                    body BLOB,
+                    created_at REAL,
+                    expires_at REAL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_expires_at ON responses (expires_at)')
+            conn.commit()
+
+    def get(self, payload: Dict[str, Any]) -> Any:
+        """Return the cached response for a payload, or None if missing or expired"""
+        return self.get_entry(payload)[0]
+
+    def get_entry(self, payload: Dict[str, Any]) -> Tuple[Any, float]:
+        """Return the cached response for a payload and its remaining TTL in seconds
+
+        Returns:
+            Tuple[Any, float]: (None, 0) if missing or expired
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT body, expires_at FROM responses WHERE key = ? AND expires_at > ?',
+                (self.make_key(payload), now)
+            ).fetchone()
+        if row is None:
+            return None, 0
+        return json.loads(zlib.decompress(row[0])), row[1] - now
+
+    def set(self, payload: Dict[str, Any], value: Any, kind: str):
+        """Store the response for a payload with the TTL of its kind"""
+        ttl = self.ttls.get(kind, self.default_ttl)
+        if ttl <= 0:
+            return
+
+        now = time.time()
+        request = _canonical(payload)
+        body = zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO responses (key, request, body, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (self.make_key(payload), request, body, now, now + ttl))
+            conn.commit()
+
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """Delete expired responses and return how many were removed"""
+        with self._connect() as conn:
+            cursor = conn.execute('DELETE FROM responses WHERE expires_at <= ?', (time.time(),))
+            conn.commit()
+            return cursor.rowcount
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        """Content address of a request payload"""
+        return hashlib.sha256(_canonical(payload).encode('utf-8')).hexdigest()
+
+    def _connect(self):
+        """A connection that is closed, not just committed, when its with block ends"""
+        return closing(sqlite3.connect(self.db_path, timeout=30))
+
+
+def _canonical(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'))
@@ -0,0 +1,258 @@
+from typing import Dict, Any, List, Optional
+import numpy as np
+import pandas as pd
+
+'''
+This class holds the trades closed by the position engine as parallel arrays.
+Rows are in the order the closing orders were processed, which is the order
+of the input arrays.
+INPUTS:
+    Column arrays produced by PositionEngine.run
+OUTPUTS:
+    ClosedTrades with coin, entry/exit price, size, PnL, entry side, the
+    index of the closing order in the input and its time
+'''
+class ClosedTrades:
+    """Columnar list of closed (or partially closed) trades"""
+
+    _columns = ('source_index', 'coin', 'entry_price', 'exit_price', 'size',
+                'pnl', 'entry_side', 'opened_at', 'closed_at')
+
+    def __init__(self, **columns):
+        for name in self._columns:
+            setattr(self, name, columns[name])
+
+    def __len__(self) -> int:
+        return len(self.source_index)
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame with the columns of the original per-trade dicts first"""
+        return pd.DataFrame({
+            'coin': self.coin,
+            'entry_price': self.entry_price,
+            'exit_price': self.exit_price,
+            'size': self.size,
+            'pnl': self.pnl,
+            'entry_side': self.entry_side,
+            'source_index': self.source_index,
+            'opened_at': self.opened_at,
+            'closed_at': self.closed_at
+        })
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Per-trade dicts as built by the original order loop"""
+        return [
+            {
+                'coin': coin,
+                'entry_price': entry_price,
+                'exit_price': exit_price,
+                'size': size,
+                'pnl': pnl,
+                'entry_side': entry_side
+            }
+            for coin, entry_price, exit_price, size, pnl, entry_side in zip(
+                self.coin.tolist(), self.entry_price.tolist(), self.exit_price.tolist(),
+                self.size.tolist(), self.pnl.tolist(), self.entry_side.tolist()
+            )
+        ]
+
+
+'''
+This class rebuilds positions from a time-ordered stream of fills.
+Every group (coin) holds at most one position. An order on the opposite side
+closes min(size, position) at the order price and books the PnL; if it is at
+least as large as the position the position is closed and the excess is
+dropped, otherwise the position shrinks. An order on the same side (or
+without a recognised side) adds to the position at the size-weighted
+average entry price.
+INPUTS:
+    long_side: Side value that opens or adds to longs
+    short_side: Side value that opens or adds to shorts
+OUTPUTS:
+    ClosedTrades
+'''
+class PositionEngine:
+    """Per-group position tracking over sorted NumPy arrays"""
+
+    def __init__(self, long_side: Any = 'b', short_side: Any = 'a'):
+        self.long_side = long_side
+        self.short_side = short_side
+
+    def run(self,
+            groups: np.ndarray,
+            sides: np.ndarray,
+            prices: np.ndarray,
+            sizes: np.ndarray,
+            times: Optional[np.ndarray] = None,
+            mask: Optional[np.ndarray] = None) -> ClosedTrades:
+        """Replay orders and return the trades they close
+
+        The arrays must already be in processing (time) order. Rows where
+        `mask` is False and rows with size 0 are skipped. The position
+        update is a sequential recurrence (a full close resets the side), so
+        each group is walked by a tight scalar kernel over plain floats; the
+        grouping, filtering and reordering around it are array operations.
+
+        Args:
+            groups (np.ndarray): Position key per row, usually the coin
+            sides (np.ndarray): Order side per row
+            prices (np.ndarray): Execution price per row
+            sizes (np.ndarray): Order size per row
+            times (Optional[np.ndarray]): Time per row, copied to opened_at/closed_at
+            mask (Optional[np.ndarray]): Rows to process, e.g. filled orders
+
+        Returns:
+            ClosedTrades: Closed trades in the order they were closed
+        """
+        count = len(groups)
+        keep = np.ones(count, dtype=bool) if mask is None else np.asarray(mask, dtype=bool).copy()
+        sizes = np.asarray(sizes, dtype=np.float64)
+        keep &= sizes != 0
+        rows = np.flatnonzero(keep)
+
+        codes, uniques = pd.factorize(pd.Series(np.asarray(groups, dtype=object)[rows], dtype=object), use_na_sentinel=False)
+        sides = np.asarray(sides, dtype=object)[rows]
+        direction = np.where(sides == self.long_side, 1, np.where(sides == self.short_side, -1, 0))
+        prices = np.asarray(prices, dtype=np.float64)[rows]
+        sizes = sizes[rows]
+        times = np.zeros(count, dtype=np.int64)[rows] if times is None else np.asarray(times)[rows]
+
+        # Rows of each group become contiguous while keeping their time order
+        order = np.argsort(codes, kind='stable')
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        starts = np.concatenate(([0], bounds)) if len(order) else np.array([], dtype=np.int64)
+        ends = np.concatenate((bounds, [len(order)])) if len(order) else np.array([], dtype=np.int64)
+
+        direction_list = direction[order].tolist()
+        price_list = prices[order].tolist()
+        size_list = sizes[order].tolist()
+        time_list = times[order].tolist()
+
+        closed = []
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            closed.extend(_walk_group(start, end, direction_list, price_list, size_list, time_list))
+
+        if closed:
+            grouped_rows, entry_price, exit_price, size, pnl, entry_direction, opened_at = map(list, zip(*closed))
+        else:
+            grouped_rows, entry_price, exit_price, size, pnl, entry_direction, opened_at = [], [], [], [], [], [], []
+
+        # Back to processing order: by position of the closing row in the input
+        positions = order[np.asarray(grouped_rows, dtype=np.int64)]
+        resort = np.argsort(positions, kind='stable')
+        positions = positions[resort]
+
+        entry_direction = np.asarray(entry_direction, dtype=np.int64)[resort]
+        side_lookup = np.array([self.short_side, None, self.long_side], dtype=object)
+        return ClosedTrades(
+            source_index=rows[positions],
+            coin=np.asarray(uniques, dtype=object)[codes[positions]],
+            entry_price=np.asarray(entry_price, dtype=np.float64)[resort],
+            exit_price=np.asarray(exit_price, dtype=np.float64)[resort],
+            size=np.asarray(size, dtype=np.float64)[resort],
+            pnl=np.asarray(pnl, dtype=np.float64)[resort],
+            entry_side=side_lookup[entry_direction + 1],
+            opened_at=np.asarray(opened_at, dtype=times.dtype)[resort],
+            closed_at=times[positions]
+        )
+
+    def holding_periods(self,
+                        groups: np.ndarray,
+                        sides: np.ndarray,
+                        times: np.ndarray,
+                        return_groups: bool = False):
+        """Pair the k-th entry on the long side with the k-th on the short side per group
+
+        Rows are ranked by time within each (group, side); the buy and sell
+        of equal rank form a pair and pairs whose sell comes after the buy
+        give a holding period. One lexsort pass covers every group, so the
+        cost does not grow with the number of coins.
+
+        Args:
+            groups (np.ndarray): Group per row, usually the coin
+            sides (np.ndarray): Order side per row
+            times (np.ndarray): datetime64 time per row
+            return_groups (bool): Also return the group of every period
+
+        Returns:
+            np.ndarray: Holding periods in hours, ordered by group (first
+            appearance) and then by rank; with return_groups, a
+            (groups, hours) tuple
+        """
+        codes, uniques = pd.factorize(pd.Series(np.asarray(groups, dtype=object), dtype=object))
+        sides = np.asarray(sides, dtype=object)
+        times = np.asarray(times)
+        if not np.issubdtype(times.dtype, np.datetime64):
+            times = times.astype('datetime64[ms]')
+        unit, _ = np.datetime_data(times.dtype)
+        ticks = times.view(np.int64)
+
+        def ranked(side):
+            rows = np.flatnonzero((sides == side) & (codes >= 0) & ~np.isnat(times))
+            rows = rows[np.lexsort((ticks[rows], codes[rows]))]
+            group_codes = codes[rows]
+            starts = np.flatnonzero(np.r_[True, group_codes[1:] != group_codes[:-1]]) if len(rows) else rows
+            group_start = np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+            return group_codes, np.arange(len(rows)) - group_start, ticks[rows]
+
+        buy_codes, buy_ranks, buy_ticks = ranked(self.long_side)
+        sell_codes, sell_ranks, sell_ticks = ranked(self.short_side)
+        stride = max(len(buy_ranks), len(sell_ranks)) + 1
+        _, buy_index, sell_index = np.intersect1d(
+            buy_codes * stride + buy_ranks,
+            sell_codes * stride + sell_ranks,
+            assume_unique=True,
+            return_indices=True
+        )
+
+        held = sell_ticks[sell_index] - buy_ticks[buy_index]
+        positive = held > 0
+        ticks_per_second = np.timedelta64(1, 's') / np.timedelta64(1, unit)
+        hours = held[positive] / ticks_per_second / 3600
+        if return_groups:
+            return np.asarray(uniques)[buy_codes[buy_index][positive]], hours
+        return hours
+
+
+def _walk_group(start: int, end: int, directions: List[int], prices: List[float],
+                sizes: List[float], times: List[Any]) -> List[tuple]:
+    """Position recurrence for one group's rows [start, end)
+
+    Returns (row, entry_price, exit_price, size, pnl, entry_direction, opened_at)
+    for every closing row. The arithmetic matches the original loop exactly.
+    """
+    closed = []
+    open_position = False
+    entry_price = position_size = 0.0
+    position_direction = 0
+    opened_at = None
+
+    for row in range(start, end):
+        direction = directions[row]
+        price = prices[row]
+        size = sizes[row]
+
+        if not open_position:
+            open_position = True
+            entry_price = price
+            position_size = size
+            position_direction = direction
+            opened_at = times[row]
+        elif position_direction * direction == -1:
+            closed_size = min(size, position_size)
+            if position_direction == 1:
+                pnl = (price - entry_price) * closed_size
+            else:
+                pnl = (entry_price - price) * closed_size
+            closed.append((row, entry_price, price, closed_size, pnl, position_direction, opened_at))
+
+            if size >= position_size:
+                open_position = False
+            else:
+                position_size -= size
+        else:
+            total_size = position_size + size
+            entry_price = ((entry_price * position_size) + (price * size)) / total_size
+            position_size = total_size
+
+    return closed
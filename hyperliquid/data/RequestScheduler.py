@@ -0,0 +1,189 @@
+from typing import Dict, Any, Optional
+import asyncio
+import random
+import threading
+import time
+
+# Hyperliquid charges info requests against a per-IP weight budget of 1200 per minute
+DEFAULT_WEIGHT_PER_MINUTE = 1200
+DEFAULT_REQUEST_WEIGHT = 20
+INFO_REQUEST_WEIGHTS = {
+    "clearinghouseState": 2,
+    "spotClearinghouseState": 2,
+    "l2Book": 2,
+    "allMids": 2,
+    "orderStatus": 2,
+    "exchangeStatus": 2,
+    "userRole": 60,
+}
+# Requests charged one extra unit of weight per ITEMS_PER_EXTRA_WEIGHT items returned
+ITEM_WEIGHTED_REQUESTS = {
+    "historicalOrders",
+    "userFills",
+    "userFillsByTime",
+    "userTwapSliceFills",
+    "fundingHistory",
+    "userFunding",
+    "userNonFundingLedgerUpdates",
+}
+ITEMS_PER_EXTRA_WEIGHT = 20
+
+'''
+This class schedules Hyperliquid info requests within the API weight budget.
+A token bucket refilled at weight_per_minute / 60 per second is charged the
+weight of every request before it is sent. Rate-limit responses pause the
+whole bucket (honouring Retry-After) and halve the refill rate, which then
+recovers additively on success. Retries use capped exponential backoff with
+full jitter.
+INPUTS:
+    weight_per_minute: Weight budget per minute
+    max_retries: Retries per request before giving up
+    base_backoff: Backoff for the first retry in seconds
+    max_backoff: Upper bound for a single backoff in seconds
+OUTPUTS:
+    None
+'''
+class RequestScheduler:
+    """Weight-budgeted token bucket with adaptive backoff"""
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self,
+                 weight_per_minute: int = DEFAULT_WEIGHT_PER_MINUTE,
+                 max_retries: int = 5,
+                 base_backoff: float = 0.5,
+                 max_backoff: float = 30.0):
+        self.capacity = float(weight_per_minute)
+        self.base_rate = weight_per_minute / 60.0
+        self.rate = self.base_rate
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.rate_limited = 0
+        self.waiting = 0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = float('-inf')
+        self._lock = threading.Lock()
+
+    @classmethod
+    def default(cls) -> "RequestScheduler":
+        """Process-wide scheduler, since the weight budget is shared per IP"""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    @staticmethod
+    def weight_for(payload: Dict[str, Any]) -> int:
+        """Weight charged up front for an info request"""
+        return INFO_REQUEST_WEIGHTS.get(payload.get("type"), DEFAULT_REQUEST_WEIGHT)
+
+    @staticmethod
+    def response_weight(payload: Dict[str, Any], data: Any) -> int:
+        """Extra weight charged after the fact for item-weighted responses"""
+        if payload.get("type") in ITEM_WEIGHTED_REQUESTS and isinstance(data, list):
+            return len(data) // ITEMS_PER_EXTRA_WEIGHT
+        return 0
+
+    def acquire(self, weight: int):
+        """Block until the request fits in the budget"""
+        delay = self._reserve(weight)
+        if delay > 0:
+            self._set_waiting(+1)
+            try:
+                time.sleep(delay)
+            finally:
+                self._set_waiting(-1)
+
+    async def acquire_async(self, weight: int):
+        """Wait without blocking the event loop until the request fits in the budget"""
+        delay = self._reserve(weight)
+        if delay > 0:
+            self._set_waiting(+1)
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self._set_waiting(-1)
+
+    def charge(self, weight: int):
+        """Deduct weight that is only known once the response arrives"""
+        if weight <= 0:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= weight
+
+    def on_success(self):
+        """Recover the refill rate additively after a successful request"""
+        with self._lock:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.05)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """Halve the refill rate and pause the bucket after a 429
+
+        Concurrent requests tend to be rejected together, so 429s arriving
+        within a second of the last decrease count as the same event.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.rate_limited += 1
+            if now - self._last_decrease >= 1.0:
+                self.rate = max(self.base_rate * 0.1, self.rate * 0.5)
+                self._last_decrease = now
+            pause = retry_after if retry_after is not None else self.base_backoff
+            self._blocked_until = max(self._blocked_until, now + pause)
+            self._tokens = min(self._tokens, 0.0)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to wait before retry number `attempt` (0-based)"""
+        delay = random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests currently waiting for budget"""
+        return self.waiting
+
+    def stats(self) -> Dict[str, Any]:
+        """Get scheduler state for monitoring"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                'queue_depth': self.waiting,
+                'available_weight': self._tokens,
+                'rate_per_second': self.rate,
+                'base_rate_per_second': self.base_rate,
+                'rate_limited': self.rate_limited
+            }
+
+    def _reserve(self, weight: int) -> float:
+        """Take weight from the bucket and return how long the caller must wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= weight
+            deficit_wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(deficit_wait, self._blocked_until - now)
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _set_waiting(self, change: int):
+        with self._lock:
+            self.waiting += change
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
@@ -0,0 +1,137 @@
+from typing import Dict, Any, Optional
+from collections import OrderedDict
+import sys
+import threading
+import time
+
+# Seconds each kind of response stays fresh. The kind is the cache key prefix
+# used by HyperliquidDataService ("orders_<address>", "positions_<address>", ...)
+DEFAULT_TTLS = {
+    "orders": 300,
+    "trades": 300,
+    "positions": 10,
+}
+
+'''
+This class is a bounded in-memory cache for API responses.
+Entries expire after a per-kind TTL and the least recently used entries are
+evicted once the approximate memory footprint exceeds the cap.
+INPUTS:
+    ttls: Per-kind TTLs in seconds, merged over DEFAULT_TTLS
+    default_ttl: TTL for kinds without an explicit entry
+    max_bytes: Approximate memory cap for all cached values
+OUTPUTS:
+    None
+'''
+class ResponseCache:
+    """In-memory TTL + LRU cache with hit/miss/eviction counters"""
+
+    def __init__(self,
+                 ttls: Optional[Dict[str, float]] = None,
+                 default_ttl: float = 60,
+                 max_bytes: int = 256 * 1024 * 1024):
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        """Return the cached value, or None if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, size, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.size_bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, kind: Optional[str] = None, ttl: Optional[float] = None):
+        """Store a value, using the key prefix as its kind unless given
+
+        A `ttl` shorter than the kind's TTL, such as what is left of an
+        entry loaded from the on-disk cache, takes precedence.
+        """
+        kind = kind or key.split('_', 1)[0]
+        kind_ttl = self.ttls.get(kind, self.default_ttl)
+        ttl = kind_ttl if ttl is None else min(ttl, kind_ttl)
+        size = _estimate_size(value)
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size_bytes -= old[1]
+            # A value that is not cached must not leave an older one behind
+            if ttl <= 0 or size > self.max_bytes:
+                return
+
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self.size_bytes += size
+
+            while self.size_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, key: str):
+        """Drop a single entry"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size_bytes -= entry[1]
+
+    def clear(self):
+        """Drop all entries, keeping the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache counters and current footprint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self.size_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _estimate_size(value: Any) -> int:
+    """Approximate the memory footprint of a decoded JSON value or a columnar batch"""
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    size = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return size
@@ -0,0 +1,162 @@
+'''
+Risk metrics from daily equity curves, computed for many traders at once.
+Closed-trade PnL is summed per calendar day between each trader's first
+and last trade, days without trades included, and added to a starting
+equity. The start is the trader's account value less the PnL over the
+period when the account value is known, otherwise the largest trade
+notional as a lower bound on the capital the trader deployed. All
+traders' curves are laid end to end in flat arrays, one segment per
+trader, so drawdowns and return statistics are a handful of NumPy
+reductions over the whole cohort.
+INPUTS:
+    Closed trades as parallel arrays of trader code, close time (ms), PnL
+    and notional, plus optional account values per trader code
+OUTPUTS:
+    Drawdown depth and duration, annualized return and volatility, and
+    Sharpe, Sortino and Calmar ratios per trader
+'''
+from typing import Dict, Any, List, Optional
+import numpy as np
+import pandas as pd
+from .ColumnarStore import MS_PER_DAY
+
+# Crypto markets trade every day
+DAYS_PER_YEAR = 365
+# Upper bounds of max drawdown and annualized volatility per risk profile, least to most aggressive
+RISK_PROFILES = (
+    ('Conservative', 0.10, 0.25),
+    ('Moderate', 0.25, 0.50),
+    ('Aggressive', 0.50, 1.00),
+)
+
+
+def risk_metrics_by_group(trade_groups: np.ndarray,
+                          trade_times: np.ndarray,
+                          trade_pnl: np.ndarray,
+                          trade_notional: np.ndarray,
+                          group_count: int,
+                          account_values: Optional[np.ndarray] = None) -> List[Optional[Dict[str, Any]]]:
+    """Risk metrics per trader from their closed trades
+
+    Args:
+        trade_groups (np.ndarray): Trader code of every trade
+        trade_times (np.ndarray): Close time of every trade in milliseconds
+        trade_pnl (np.ndarray): PnL of every trade; NaN trades are skipped
+        trade_notional (np.ndarray): Notional of every trade
+        group_count (int): Number of traders
+        account_values (Optional[np.ndarray]): Current account value per
+            trader code, NaN where unknown
+
+    Returns:
+        List[Optional[Dict[str, Any]]]: Metrics per trader code, None for
+            traders without trades or without a usable starting equity
+    """
+    trade_pnl = np.asarray(trade_pnl, dtype=np.float64)
+    valid = ~np.isnan(trade_pnl)
+    groups = np.asarray(trade_groups, dtype=np.int64)[valid]
+    days = np.asarray(trade_times, dtype=np.int64)[valid] // MS_PER_DAY
+    pnl = trade_pnl[valid]
+    notional = np.nan_to_num(np.abs(np.asarray(trade_notional, dtype=np.float64)[valid]))
+    results = [None] * group_count
+    if not len(pnl):
+        return results
+
+    first_day = np.full(group_count, np.iinfo(np.int64).max)
+    last_day = np.full(group_count, np.iinfo(np.int64).min)
+    np.minimum.at(first_day, groups, days)
+    np.maximum.at(last_day, groups, days)
+    total_pnl = np.bincount(groups, weights=pnl, minlength=group_count)
+    max_notional = np.zeros(group_count)
+    np.maximum.at(max_notional, groups, notional)
+
+    # Starting equity: account value less the period's PnL, else the largest trade notional
+    base = max_notional
+    if account_values is not None:
+        with np.errstate(invalid='ignore'):
+            implied = np.asarray(account_values, dtype=np.float64) - total_pnl
+            base = np.where(implied > 0, implied, max_notional)
+    active = (np.bincount(groups, minlength=group_count) > 0) & (base > 0)
+    if not active.any():
+        return results
+
+    # One segment of consecutive days per active trader
+    spans = np.where(active, last_day - first_day + 1, 0)
+    offsets = np.concatenate(([0], np.cumsum(spans)))
+    segments = np.repeat(np.arange(group_count), spans)
+    starts = offsets[:-1][active]
+    ends = offsets[1:][active] - 1
+    position = np.arange(offsets[-1])
+
+    keep = active[groups]
+    daily_pnl = np.bincount(offsets[groups[keep]] + days[keep] - first_day[groups[keep]],
+                            weights=pnl[keep], minlength=offsets[-1])
+    cumulative = np.cumsum(daily_pnl)
+    before = np.concatenate(([0.0], cumulative))[offsets[:-1]]
+    equity = base[segments] + cumulative - before[segments]
+    previous = equity - daily_pnl
+
+    # Drawdown below the running peak, which starts at the starting equity
+    peak = np.maximum(pd.Series(equity).groupby(segments).cummax().to_numpy(), base[segments])
+    drawdown = np.minimum((peak - equity) / peak, 1.0)
+
+    # Longest stretch of days under water: days since the last day at a peak
+    underwater = drawdown > 0
+    at_peak = np.where(underwater, -1, position)
+    at_peak[starts] = np.where(underwater[starts], starts - 1, starts)
+    duration = position - np.maximum.accumulate(at_peak)
+
+    # Daily returns on the previous day's equity, skipped once equity is gone
+    returns = np.full(len(position), np.nan)
+    np.divide(daily_pnl, previous, out=returns, where=previous > 0)
+    counted = ~np.isnan(returns)
+    returns = np.where(counted, returns, 0.0)
+    count = np.bincount(segments, weights=counted, minlength=group_count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.bincount(segments, weights=returns, minlength=group_count) / count
+        centered = np.where(counted, returns - mean[segments], 0.0)
+        std = np.sqrt(np.bincount(segments, weights=centered ** 2, minlength=group_count) / (count - 1))
+        downside = np.sqrt(np.bincount(segments, weights=np.minimum(returns, 0) ** 2, minlength=group_count) / count)
+
+    max_drawdown = np.maximum.reduceat(drawdown, starts)
+    max_duration = np.maximum.reduceat(duration, starts)
+    for i, group in enumerate(np.flatnonzero(active).tolist()):
+        annualized_return = mean[group] * DAYS_PER_YEAR
+        volatility = std[group] * np.sqrt(DAYS_PER_YEAR) if count[group] > 1 else np.nan
+        results[group] = {
+            'equity_base': float(base[group]),
+            'max_drawdown': float(max_drawdown[i]),
+            'max_drawdown_duration_days': int(max_duration[i]),
+            'current_drawdown': float(drawdown[ends[i]]),
+            'annualized_return': float(annualized_return),
+            'annualized_volatility': float(volatility),
+            'sharpe_ratio': float(annualized_return / volatility) if volatility > 0 else float('nan'),
+            'sortino_ratio': _ratio(annualized_return, downside[group] * np.sqrt(DAYS_PER_YEAR)),
+            'calmar_ratio': _ratio(annualized_return, max_drawdown[i])
+        }
+    return results
+
+
+def risk_profile(metrics: Dict[str, Any]) -> Optional[str]:
+    """Risk profile from max drawdown and annualized volatility, None without risk metrics
+
+    A trader is placed in the least aggressive profile whose bounds cover
+    both measures; an unknown volatility (a single day of trading) is
+    judged on drawdown alone.
+    """
+    drawdown = metrics.get('max_drawdown')
+    if drawdown is None or 'equity_base' not in metrics:
+        return None
+    volatility = metrics.get('annualized_volatility')
+    if volatility is None or np.isnan(volatility):
+        volatility = 0.0
+    for name, max_drawdown, max_volatility in RISK_PROFILES:
+        if drawdown < max_drawdown and volatility < max_volatility:
+            return name
+    return 'Very Aggressive'
+
+
+def _ratio(annualized_return: float, risk: float) -> float:
+    """Return over risk; infinite for a positive return with no risk taken"""
+    if risk > 0:
+        return float(annualized_return / risk)
+    return float('inf') if annualized_return > 0 else float('nan')
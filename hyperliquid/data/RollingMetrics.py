@@ -0,0 +1,133 @@
+from typing import Dict, Any, Optional
+import time
+import numpy as np
+from .ColumnarStore import MS_PER_HOUR
+
+# Standard windows in hours, matching the leaderboard's day/week/month plus a quarter
+WINDOWS = {
+    '24h': 24,
+    '7d': 7 * 24,
+    '30d': 30 * 24,
+    '90d': 90 * 24,
+}
+
+'''
+This class answers rolling-window questions about one trader's activity.
+Trades (by close time) and traded volume are summed into hourly buckets;
+only hours with activity are kept, so the series stays compact. Prefix sums
+over the buckets make any window two binary searches, so dashboards can
+switch windows without going back to the trade history.
+INPUTS:
+    hours: Sorted hour indexes (ms // MS_PER_HOUR) of the buckets
+    pnl, wins, trades, volume: Per-bucket sums
+OUTPUTS:
+    Window summaries with pnl, volume, trade_count and win_rate
+'''
+class RollingMetrics:
+    """Hourly-bucketed prefix sums of a trader's PnL, wins, trades and volume"""
+
+    _series = ('pnl', 'wins', 'trades', 'volume')
+
+    def __init__(self, hours: np.ndarray, pnl: np.ndarray, wins: np.ndarray,
+                 trades: np.ndarray, volume: np.ndarray):
+        self.hours = np.asarray(hours, dtype=np.int64)
+        self.buckets = {
+            'pnl': np.asarray(pnl, dtype=np.float64),
+            'wins': np.asarray(wins, dtype=np.int64),
+            'trades': np.asarray(trades, dtype=np.int64),
+            'volume': np.asarray(volume, dtype=np.float64),
+        }
+        # Prefix sums with a leading zero: the sum over buckets [i, j) is cum[j] - cum[i]
+        self.cumulative = {name: np.concatenate(([0], np.cumsum(values))) for name, values in self.buckets.items()}
+
+    @classmethod
+    def from_events(cls,
+                    trade_times: np.ndarray,
+                    trade_pnl: np.ndarray,
+                    volume_times: np.ndarray,
+                    volume: np.ndarray) -> "RollingMetrics":
+        """Bucket closed trades (time, PnL) and traded volume (time, notional) by hour"""
+        rolling = rolling_by_group(np.zeros(len(trade_times), dtype=np.int64), trade_times, trade_pnl,
+                                   np.zeros(len(volume_times), dtype=np.int64), volume_times, volume, 1)[0]
+        return rolling if rolling is not None else cls([], [], [], [], [])
+
+    def window(self, hours: Optional[int] = None, now_ms: Optional[int] = None) -> Dict[str, Any]:
+        """Sums over the last `hours` hours up to now_ms (the whole series if hours is None)"""
+        now_hour = int(now_ms if now_ms is not None else time.time() * 1000) // MS_PER_HOUR
+        end = np.searchsorted(self.hours, now_hour, side='right')
+        start = 0 if hours is None else np.searchsorted(self.hours, now_hour - hours + 1, side='left')
+
+        totals = {name: cumulative[end] - cumulative[start] for name, cumulative in self.cumulative.items()}
+        trade_count = int(totals['trades'])
+        return {
+            'pnl': float(totals['pnl']),
+            'volume': float(totals['volume']),
+            'trade_count': trade_count,
+            'win_rate': int(totals['wins']) / trade_count if trade_count else None
+        }
+
+    def summary(self, now_ms: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """The standard WINDOWS plus 'all'"""
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        summary = {name: self.window(hours, now_ms) for name, hours in WINDOWS.items()}
+        summary['all'] = self.window(None, now_ms)
+        return summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable per-bucket series"""
+        series = {'hours': self.hours.tolist()}
+        series.update({name: self.buckets[name].tolist() for name in self._series})
+        return series
+
+    @classmethod
+    def from_dict(cls, series: Dict[str, Any]) -> "RollingMetrics":
+        """Rebuild from to_dict output"""
+        return cls(series['hours'], series['pnl'], series['wins'], series['trades'], series['volume'])
+
+
+def rolling_by_group(trade_groups: np.ndarray,
+                     trade_times: np.ndarray,
+                     trade_pnl: np.ndarray,
+                     volume_groups: np.ndarray,
+                     volume_times: np.ndarray,
+                     volume: np.ndarray,
+                     group_count: int) -> list:
+    """RollingMetrics for many groups (traders) at once
+
+    The events of all groups are bucketed in one pass on (group, hour) keys
+    and each group gets a slice of the bucket arrays.
+
+    Returns:
+        list: RollingMetrics per group code, None for groups without events
+    """
+    trade_hours = np.asarray(trade_times, dtype=np.int64) // MS_PER_HOUR
+    volume_hours = np.asarray(volume_times, dtype=np.int64) // MS_PER_HOUR
+    all_hours = np.concatenate((trade_hours, volume_hours))
+    if not len(all_hours):
+        return [None] * group_count
+
+    span = int(all_hours.max()) + 1
+    keys = np.concatenate((
+        np.asarray(trade_groups, dtype=np.int64) * span + trade_hours,
+        np.asarray(volume_groups, dtype=np.int64) * span + volume_hours
+    ))
+    bucket_keys, inverse = np.unique(keys, return_inverse=True)
+    trade_buckets, volume_buckets = inverse[:len(trade_hours)], inverse[len(trade_hours):]
+    bucket_count = len(bucket_keys)
+
+    trade_pnl = np.nan_to_num(np.asarray(trade_pnl, dtype=np.float64))
+    pnl = np.bincount(trade_buckets, weights=trade_pnl, minlength=bucket_count)
+    wins = np.bincount(trade_buckets, weights=trade_pnl > 0, minlength=bucket_count).astype(np.int64)
+    trades = np.bincount(trade_buckets, minlength=bucket_count)
+    traded = np.bincount(volume_buckets, weights=np.nan_to_num(np.asarray(volume, dtype=np.float64)), minlength=bucket_count)
+
+    bucket_groups = bucket_keys // span
+    hours = bucket_keys % span
+    bounds = np.searchsorted(bucket_groups, np.arange(group_count + 1))
+    rolling = [None] * group_count
+    for group in np.flatnonzero(np.diff(bounds)).tolist():
+        start, end = bounds[group], bounds[group + 1]
+        rolling[group] = RollingMetrics(hours[start:end], pnl[start:end], wins[start:end],
+                                        trades[start:end], traded[start:end])
+    return rolling
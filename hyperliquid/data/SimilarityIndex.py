@@ -0,0 +1,235 @@
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
+import logging
+import math
+import os
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Coins with their own asset column, the ones traded by the most traders; the rest share one
+ASSET_FEATURES = 100
+# Scalar features are z-scores clipped to this many standard deviations, then scaled to [-1, 1]
+ZSCORE_CLIP = 3.0
+# Weight of each feature block; the distribution blocks have unit norm before weighting
+FEATURE_WEIGHTS = {
+    'hourly': 1.0,
+    'assets': 1.0,
+    'holding': 0.5,
+    'sizing': 0.5,
+    'win_rate': 0.5,
+}
+# Queries multiplied against the matrix at once by similar_many
+QUERY_BLOCK = 1024
+
+
+class _Snapshot(NamedTuple):
+    """One built index; replaced as a whole so queries never see a half-built one"""
+    addresses: List[str]
+    styles: List[Optional[str]]
+    matrix: np.ndarray
+    positions: Dict[str, int]
+
+'''
+This class finds traders whose behaviour resembles a given trader.
+Every trader's latest analysis becomes one row of a feature matrix: the
+square roots of its hourly and asset activity shares (so the dot product
+of two blocks is their Bhattacharyya coefficient), and clipped z-scores
+of its log holding period, log sizing dispersion and win rate. Rows are
+L2-normalised, so cosine similarity against the whole population is one
+matrix-vector product and the top k come from argpartition. The matrix is
+rebuilt from the database when new analyses have been stored, at most
+once per refresh interval, and published in a single assignment, so
+queries read without the lock.
+INPUTS:
+    db: TraderDatabase holding trader analyses
+    refresh_seconds: Minimum age before the index checks for new analyses,
+        defaults to SIMILARITY_REFRESH_SECONDS (300)
+OUTPUTS:
+    None
+'''
+class SimilarityIndex:
+    """Exact cosine nearest-neighbour index over trader feature vectors"""
+
+    def __init__(self, db, refresh_seconds: Optional[int] = None):
+        self.db = db
+        if refresh_seconds is None:
+            refresh_seconds = int(os.getenv("SIMILARITY_REFRESH_SECONDS", "300"))
+        self.refresh_seconds = refresh_seconds
+        self._snapshot = _Snapshot([], [], np.zeros((0, 0), dtype=np.float32), {})
+        self._version = None
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rebuild from the latest analyses if the index is stale and analyses changed
+
+        Returns:
+            bool: Whether the index was rebuilt
+        """
+        with self._lock:
+            if not force and self._built_at is not None and time.monotonic() - self._built_at < self.refresh_seconds:
+                return False
+            version = self.db.get_latest_analysis_id()
+            if not force and version == self._version:
+                self._built_at = time.monotonic()
+                return False
+
+            start = time.perf_counter()
+            analyses = self.db.get_latest_analyses()
+            self.build(analyses)
+            self._version = version
+            self._built_at = time.monotonic()
+            logger.info(f"Built similarity index over {len(self.addresses)} traders in {time.perf_counter() - start:.2f}s")
+            return True
+
+    @property
+    def addresses(self) -> List[str]:
+        return self._snapshot.addresses
+
+    @property
+    def styles(self) -> List[Optional[str]]:
+        return self._snapshot.styles
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._snapshot.matrix
+
+    def build(self, analyses: List[Dict[str, Any]]):
+        """Replace the index with the feature vectors of `analyses` (one per trader)"""
+        addresses, styles, matrix = feature_matrix(analyses)
+        matrix.setflags(write=False)
+        self._snapshot = _Snapshot(addresses, styles, matrix, {address: i for i, address in enumerate(addresses)})
+
+    def similar(self, address: str, k: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """The k traders most similar to `address`, None if it is not indexed"""
+        return self.similar_many([address], k).get(address)
+
+    def similar_many(self, addresses: List[str], k: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+        """Top-k similar traders for many addresses, with batched matrix products
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Neighbours per indexed address,
+                most similar first, each with user_address, similarity and
+                primary_style
+        """
+        snapshot = self._snapshot
+        matrix, known = snapshot.matrix, [address for address in addresses if address in snapshot.positions]
+        positions = np.array([snapshot.positions[address] for address in known], dtype=np.int64)
+        k = min(k, len(snapshot.addresses) - 1)
+        results = {}
+        if k <= 0 or not len(positions):
+            return {address: [] for address in known}
+
+        for start in range(0, len(positions), QUERY_BLOCK):
+            block = positions[start:start + QUERY_BLOCK]
+            scores = matrix[block] @ matrix.T
+            scores[np.arange(len(block)), block] = -np.inf  # never return the trader itself
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            for row, position in enumerate(block.tolist()):
+                results[snapshot.addresses[position]] = [
+                    {
+                        'user_address': snapshot.addresses[neighbour],
+                        'similarity': float(score),
+                        'primary_style': snapshot.styles[neighbour]
+                    }
+                    for neighbour, score in zip(top[row].tolist(), top_scores[row].tolist())
+                ]
+        return results
+
+    def __len__(self) -> int:
+        return len(self._snapshot.addresses)
+
+
+def feature_matrix(analyses: List[Dict[str, Any]]) -> Tuple[List[str], List[Optional[str]], np.ndarray]:
+    """L2-normalised feature rows of the analyses that have any activity
+
+    Returns:
+        Tuple: (addresses, primary styles, float32 matrix with one row per address)
+    """
+    count = len(analyses)
+    hourly = np.zeros((count, 24))
+    scalars = np.full((count, 3), np.nan)  # log holding hours, log sizing dispersion, win rate
+    asset_rows, asset_coins, asset_counts = [], [], []
+    addresses, styles = [], []
+
+    for row, analysis in enumerate(analyses):
+        metrics = analysis.get('metrics') or {}
+        style = analysis.get('trading_style') or {}
+        addresses.append(analysis.get('user_address'))
+        styles.append(style.get('primary_style'))
+
+        for hour, orders in (metrics.get('hourly_distribution') or {}).items():
+            hourly[row, int(hour) % 24] += orders
+        distribution = metrics.get('asset_distribution') or {}
+        asset_rows.extend([row] * len(distribution))
+        asset_coins.extend(distribution.keys())
+        asset_counts.extend(distribution.values())
+
+        scalars[row] = (
+            _log(style.get('avg_holding_period_hours')),
+            _log(style.get('position_size_consistency')),
+            _finite(metrics.get('win_rate'))
+        )
+
+    # Asset columns for the coins most traders trade, plus one for the rest
+    coins, coin_codes = np.unique(np.asarray(asset_coins, dtype=object).astype(str), return_inverse=True)
+    traders_per_coin = np.bincount(coin_codes, minlength=len(coins))
+    kept = np.argsort(-traders_per_coin, kind='stable')[:ASSET_FEATURES]
+    columns = np.full(len(coins), len(kept), dtype=np.int64)
+    columns[kept] = np.arange(len(kept))
+    assets = np.zeros((count, len(kept) + 1))
+    np.add.at(assets, (np.asarray(asset_rows, dtype=np.int64), columns[coin_codes]),
+              np.asarray(asset_counts, dtype=np.float64))
+
+    blocks = [
+        FEATURE_WEIGHTS['hourly'] * _share_roots(hourly),
+        FEATURE_WEIGHTS['assets'] * _share_roots(assets)
+    ]
+    for column, name in enumerate(('holding', 'sizing', 'win_rate')):
+        blocks.append(FEATURE_WEIGHTS[name] * _clipped_zscores(scalars[:, column])[:, None])
+    matrix = np.hstack(blocks)
+
+    # Traders without any hourly or asset activity have nothing to compare on
+    active = (hourly.sum(axis=1) > 0) | (assets.sum(axis=1) > 0)
+    matrix = matrix[active]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = (matrix / np.where(norms > 0, norms, 1)).astype(np.float32)
+    keep = np.flatnonzero(active).tolist()
+    return [addresses[i] for i in keep], [styles[i] for i in keep], matrix
+
+
+def _share_roots(counts: np.ndarray) -> np.ndarray:
+    """Square roots of each row's shares, so rows with activity have unit norm"""
+    totals = counts.sum(axis=1, keepdims=True)
+    return np.sqrt(counts / np.where(totals > 0, totals, 1))
+
+
+def _clipped_zscores(values: np.ndarray) -> np.ndarray:
+    """z-scores clipped to ZSCORE_CLIP and scaled to [-1, 1]; missing values are 0 (the mean)"""
+    known = ~np.isnan(values)
+    if known.sum() < 2:
+        return np.zeros(len(values))
+    std = values[known].std()
+    if std == 0:
+        return np.zeros(len(values))
+    scores = np.clip((values - values[known].mean()) / std, -ZSCORE_CLIP, ZSCORE_CLIP) / ZSCORE_CLIP
+    return np.where(known, scores, 0.0)
+
+
+def _finite(value: Any) -> float:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return value if math.isfinite(value) else math.nan
+
+
+def _log(value: Any) -> float:
+    value = _finite(value)
+    return math.log10(value + 1e-6) if value >= 0 else math.nan
@@ -1,8 +1,21 @@
 import sqlite3
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import json
 from datetime import datetime
 
+# Leaderboard fields compared between snapshots to detect traders whose activity changed
+LEADERBOARD_DIFF_FIELDS = (
+    'account_value', 'daily_pnl', 'daily_volume',
+    'weekly_pnl', 'monthly_pnl', 'all_time_pnl'
+)
+
+# Columns of a coin_flows row after the coin, as produced by CohortAggregator
+COIN_FLOW_FIELDS = (
+    'window_hours', 'traders', 'order_count', 'active_traders', 'buyers', 'sellers',
+    'buy_volume', 'sell_volume', 'net_flow', 'net_position_change',
+    'increasing_positions', 'decreasing_positions'
+)
+
 '''
 This class is the class used to store the data in the database.
 INPUTS:
@@ -33,9 +46,14 @@ class TraderDatabase:
                     monthly_pnl REAL,
                     all_time_pnl REAL,
                     last_updated TIMESTAMP,
-                    raw_data TEXT
+                    raw_data TEXT,
+                    last_changed TIMESTAMP
                 )
             ''')
+            # Databases created before last_changed existed
+            columns = {row[1] for row in cursor.execute('PRAGMA table_info(traders)').fetchall()}
+            if 'last_changed' not in columns:
+                cursor.execute('ALTER TABLE traders ADD COLUMN last_changed TIMESTAMP')
 
             # Create trading_history table for historical data
             cursor.execute('''
@@ -65,21 +83,132 @@ class TraderDatabase:
                 )
             ''')
 
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_trader_analysis_address
+                ON trader_analysis (trader_address, id)
+            ''')
+
+            # Create trader_fills table for incrementally ingested fills
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS trader_fills (
+                    trader_address TEXT,
+                    tid INTEGER,
+                    time INTEGER,
+                    coin TEXT,
+                    side TEXT,
+                    px REAL,
+                    sz REAL,
+                    start_position REAL,
+                    closed_pnl REAL,
+                    fee REAL,
+                    oid INTEGER,
+                    dir TEXT,
+                    hash TEXT,
+                    PRIMARY KEY (trader_address, tid),
+                    FOREIGN KEY (trader_address) REFERENCES traders(address)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_trader_fills_address_time
+                ON trader_fills (trader_address, time)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_trader_fills_time
+                ON trader_fills (time)
+            ''')
+
+            # Create fill_watermarks table tracking the newest ingested fill per trader
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS fill_watermarks (
+                    trader_address TEXT PRIMARY KEY,
+                    last_seen_time INTEGER,
+                    updated_at TIMESTAMP,
+                    FOREIGN KEY (trader_address) REFERENCES traders(address)
+                )
+            ''')
+
+            # Create trader_metric_state table holding each trader's incremental metric accumulator
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS trader_metric_state (
+                    trader_address TEXT PRIMARY KEY,
+                    watermark INTEGER,
+                    state TEXT,
+                    updated_at TIMESTAMP,
+                    FOREIGN KEY (trader_address) REFERENCES traders(address)
+                )
+            ''')
+
+            # Create analysis_history table: one compact row per analysis run
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS analysis_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    trader_address TEXT,
+                    timestamp TIMESTAMP,
+                    reputation_score REAL,
+                    trader_style TEXT,
+                    FOREIGN KEY (trader_address) REFERENCES traders(address)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_analysis_history_address_time
+                ON analysis_history (trader_address, timestamp)
+            ''')
+
+            # Create coin_flows table: the latest per-coin aggregate over all traders, replaced on every refresh
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS coin_flows (
+                    coin TEXT PRIMARY KEY,
+                    window_hours INTEGER,
+                    traders INTEGER,
+                    order_count INTEGER,
+                    active_traders INTEGER,
+                    buyers INTEGER,
+                    sellers INTEGER,
+                    buy_volume REAL,
+                    sell_volume REAL,
+                    net_flow REAL,
+                    net_position_change REAL,
+                    increasing_positions INTEGER,
+                    decreasing_positions INTEGER,
+                    updated_at TIMESTAMP
+                )
+            ''')
+
+            # Create trader_rolling_series table holding the hourly buckets behind each trader's rolling windows
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS trader_rolling_series (
+                    trader_address TEXT PRIMARY KEY,
+                    series TEXT,
+                    updated_at TIMESTAMP,
+                    FOREIGN KEY (trader_address) REFERENCES traders(address)
+                )
+            ''')
+
             conn.commit()
 
     def store_traders(self, traders: List[Dict[str, Any]]):
-        """Store or update trader data"""
+        """Store or update trader data
+
+        last_changed is set to now for new traders and traders whose
+        LEADERBOARD_DIFF_FIELDS moved, see `get_changed_traders`.
+        """
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             now = datetime.utcnow().isoformat()
+            snapshot = self._leaderboard_snapshot(cursor, ('last_changed',) + LEADERBOARD_DIFF_FIELDS)
 
             for trader in traders:
+                previous = snapshot.get(trader['address'])
+                if previous is None or _leaderboard_moved(trader, LEADERBOARD_DIFF_FIELDS, previous[1:]):
+                    last_changed = now
+                else:
+                    last_changed = previous[0]
                 cursor.execute('''
                     INSERT OR REPLACE INTO traders (
                         address, display_name, account_value, daily_pnl,
                         daily_roi, daily_volume, weekly_pnl, monthly_pnl,
-                        all_time_pnl, last_updated, raw_data
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        all_time_pnl, last_updated, raw_data, last_changed
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     trader['address'],
                     trader.get('display_name', ''),
@@ -91,7 +220,8 @@ class TraderDatabase:
                     trader.get('monthly_pnl', 0.0),
                     trader.get('all_time_pnl', 0.0),
                     now,
-                    json.dumps(trader)  # Store complete raw data
+                    json.dumps(trader),  # Store complete raw data
+                    last_changed
                 ))
 
                 # Store historical metrics
@@ -99,6 +229,45 @@ class TraderDatabase:
 
             conn.commit()
 
+    def get_changed_traders(self,
+                            traders: List[Dict[str, Any]],
+                            fields: Tuple[str, ...] = LEADERBOARD_DIFF_FIELDS,
+                            rel_tolerance: float = 1e-9) -> List[str]:
+        """Diff a fresh leaderboard against the stored snapshot
+
+        Call before `store_traders`, which overwrites the snapshot. A trader
+        is returned when it is new, has never been analysed, its latest
+        analysis is older than the last change to its leaderboard row (a
+        change whose analysis failed is retried), or any of `fields` moved
+        by more than `rel_tolerance` relative to the stored value.
+
+        Returns:
+            List[str]: Changed addresses, in leaderboard order
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            snapshot = self._leaderboard_snapshot(cursor, ('last_changed',) + tuple(fields))
+            cursor.execute('SELECT trader_address, MAX(timestamp) FROM trader_analysis GROUP BY trader_address')
+            analysed = dict(cursor.fetchall())
+
+        changed = []
+        for trader in traders:
+            address = trader['address']
+            previous = snapshot.get(address)
+            if previous is None or address not in analysed:
+                changed.append(address)
+                continue
+            last_changed, values = previous[0], previous[1:]
+            if (last_changed is not None and analysed[address] < last_changed) or \
+                    _leaderboard_moved(trader, fields, values, rel_tolerance):
+                changed.append(address)
+        return changed
+
+    def _leaderboard_snapshot(self, cursor, columns: Tuple[str, ...]) -> Dict[str, tuple]:
+        """Stored leaderboard columns per address"""
+        cursor.execute(f'SELECT address, {", ".join(columns)} FROM traders')
+        return {row[0]: row[1:] for row in cursor.fetchall()}
+
     def _store_historical_metrics(self, cursor, trader: Dict[str, Any], timestamp: str):
         """Store historical metrics for tracking changes over time"""
         metrics = {
@@ -158,11 +327,28 @@ class TraderDatabase:
             return [{'timestamp': row[0], 'value': row[1]} for row in cursor.fetchall()]
 
     def store_trader_analysis(self, trader_address: str, analysis: Dict[str, Any]):
-        """Store analysis results for a trader"""
+        """Store analysis results for a trader
+
+        The rolling-window series in the metrics is kept in its own table
+        rather than in the raw analysis, which is handed to the LLM.
+        """
+        metrics = analysis.get('metrics')
+        series = None
+        if isinstance(metrics, dict) and 'rolling_series' in metrics:
+            metrics = dict(metrics)
+            series = metrics.pop('rolling_series')
+            analysis = {**analysis, 'metrics': metrics}
+
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             now = datetime.utcnow().isoformat()
 
+            if series is not None:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO trader_rolling_series (trader_address, series, updated_at)
+                    VALUES (?, ?, ?)
+                ''', (trader_address, json.dumps(series), now))
+
             cursor.execute('''
                 INSERT INTO trader_analysis (
                     trader_address, timestamp, trading_style, risk_profile,
@@ -182,6 +368,213 @@ class TraderDatabase:
 
             conn.commit()
             
+    def get_metric_state(self, trader_address: str) -> Dict[str, Any]:
+        """Retrieve a trader's incremental metric state, or None if there is none yet"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT state FROM trader_metric_state WHERE trader_address = ?', (trader_address,))
+            result = cursor.fetchone()
+            return json.loads(result[0]) if result else None
+
+    def store_metric_state(self, trader_address: str, state: Dict[str, Any]):
+        """Store or replace a trader's incremental metric state"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO trader_metric_state (trader_address, watermark, state, updated_at)
+                VALUES (?, ?, ?, ?)
+            ''', (trader_address, state.get('watermark'), json.dumps(state), datetime.utcnow().isoformat()))
+            conn.commit()
+
+    def get_rolling_series(self, trader_address: str) -> Dict[str, Any]:
+        """Retrieve the hourly series behind a trader's rolling windows, or None if there is none"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT series FROM trader_rolling_series WHERE trader_address = ?', (trader_address,))
+            result = cursor.fetchone()
+            return json.loads(result[0]) if result else None
+
+    def store_analysis_history(self, records: List[Dict[str, Any]]):
+        """Append analysis records as kept by AnalysisMemory"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO analysis_history (trader_address, timestamp, reputation_score, trader_style)
+                VALUES (?, ?, ?, ?)
+            ''', [
+                (record['user_address'], record['timestamp'], record['reputation_score'], record['trader_style'])
+                for record in records
+            ])
+            conn.commit()
+
+    def get_analysis_history(self, trader_address: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get a trader's most recent analysis records, newest first"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT timestamp, reputation_score, trader_style
+                FROM analysis_history
+                WHERE trader_address = ?
+                ORDER BY timestamp DESC
+                LIMIT ?
+            ''', (trader_address, limit))
+            return [
+                {
+                    'user_address': trader_address,
+                    'timestamp': row[0],
+                    'reputation_score': row[1],
+                    'trader_style': row[2]
+                }
+                for row in cursor.fetchall()
+            ]
+
+    def store_fills(self, trader_address: str, fills: List[Dict[str, Any]]) -> int:
+        """Append fills for a trader and advance its watermark
+
+        Fills already stored (same tid) are ignored, so overlapping time ranges
+        are safe to ingest.
+
+        Returns:
+            int: Number of newly stored fills
+        """
+        if not fills:
+            return 0
+
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            now = datetime.utcnow().isoformat()
+            before = conn.total_changes
+
+            cursor.executemany('''
+                INSERT OR IGNORE INTO trader_fills (
+                    trader_address, tid, time, coin, side, px, sz,
+                    start_position, closed_pnl, fee, oid, dir, hash
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(
+                trader_address,
+                fill['tid'],
+                fill['time'],
+                fill.get('coin'),
+                fill.get('side'),
+                float(fill.get('px', 0)),
+                float(fill.get('sz', 0)),
+                float(fill.get('startPosition', 0)),
+                float(fill.get('closedPnl', 0)),
+                float(fill.get('fee', 0)),
+                fill.get('oid'),
+                fill.get('dir'),
+                fill.get('hash')
+            ) for fill in fills])
+            inserted = conn.total_changes - before
+
+            _advance_fill_watermark(cursor, trader_address, max(fill['time'] for fill in fills), now)
+            conn.commit()
+            return inserted
+
+    def advance_fill_watermark(self, trader_address: str, last_seen_time: int):
+        """Move a trader's watermark forward without storing fills, e.g. after an empty history"""
+        with sqlite3.connect(self.db_path) as conn:
+            _advance_fill_watermark(conn.cursor(), trader_address, last_seen_time, datetime.utcnow().isoformat())
+            conn.commit()
+
+    def get_fill_watermarks(self, addresses: List[str] = None) -> Dict[str, int]:
+        """Get the last ingested fill time (ms) per trader"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT trader_address, last_seen_time FROM fill_watermarks')
+            watermarks = {row[0]: row[1] for row in cursor.fetchall()}
+
+        if addresses is not None:
+            return {address: watermarks[address] for address in addresses if address in watermarks}
+        return watermarks
+
+    def get_trader_fills(self, trader_address: str, start_time: int = None) -> List[Dict[str, Any]]:
+        """Get stored fills for a trader in the same shape as the userFills API, oldest first"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            query = '''
+                SELECT tid, time, coin, side, px, sz, start_position,
+                       closed_pnl, fee, oid, dir, hash
+                FROM trader_fills
+                WHERE trader_address = ?
+            '''
+            params = [trader_address]
+
+            if start_time is not None:
+                query += ' AND time >= ?'
+                params.append(start_time)
+
+            query += ' ORDER BY time, tid'
+
+            cursor.execute(query, params)
+            return [{
+                'tid': row[0],
+                'time': row[1],
+                'coin': row[2],
+                'side': row[3],
+                'px': row[4],
+                'sz': row[5],
+                'startPosition': row[6],
+                'closedPnl': row[7],
+                'fee': row[8],
+                'oid': row[9],
+                'dir': row[10],
+                'hash': row[11]
+            } for row in cursor.fetchall()]
+
+    def get_fills_since(self, start_time: int) -> List[Dict[str, Any]]:
+        """Get the stored fills of all traders at or after start_time (ms)"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT trader_address, time, coin, side, px, sz, start_position
+                FROM trader_fills
+                WHERE time >= ?
+            ''', (start_time,))
+            return [{
+                'trader_address': row[0],
+                'time': row[1],
+                'coin': row[2],
+                'side': row[3],
+                'px': row[4],
+                'sz': row[5],
+                'start_position': row[6]
+            } for row in cursor.fetchall()]
+
+    def store_coin_flows(self, flows: List[Dict[str, Any]]):
+        """Replace the coin_flows table with a new set of per-coin aggregates"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            now = datetime.utcnow().isoformat()
+            cursor.execute('DELETE FROM coin_flows')
+            cursor.executemany(f'''
+                INSERT INTO coin_flows (coin, {', '.join(COIN_FLOW_FIELDS)}, updated_at)
+                VALUES ({', '.join('?' * (len(COIN_FLOW_FIELDS) + 2))})
+            ''', [
+                (flow['coin'], *(flow[field] for field in COIN_FLOW_FIELDS), now)
+                for flow in flows
+            ])
+            conn.commit()
+
+    def get_coin_flows(self, limit: int = None) -> List[Dict[str, Any]]:
+        """Get the latest per-coin aggregates, most traded first"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            query = f'''
+                SELECT coin, {', '.join(COIN_FLOW_FIELDS)}, updated_at
+                FROM coin_flows
+                ORDER BY buy_volume + sell_volume DESC, order_count DESC
+            '''
+            if limit is not None:
+                query += ' LIMIT ?'
+                cursor.execute(query, (limit,))
+            else:
+                cursor.execute(query)
+            return [
+                dict(zip(('coin',) + COIN_FLOW_FIELDS + ('updated_at',), row))
+                for row in cursor.fetchall()
+            ]
+
     def get_total_trader_count(self) -> int:
         """Get total number of traders in the database"""
         with sqlite3.connect(self.db_path) as conn:
@@ -202,6 +595,26 @@ class TraderDatabase:
             ''', (trader_address, limit))
             return [json.loads(row[0]) for row in cursor.fetchall()]
 
+    def get_latest_analyses(self) -> List[Dict[str, Any]]:
+        """Get the latest raw analysis of every analysed trader"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT ta.raw_analysis
+                FROM trader_analysis ta
+                JOIN (
+                    SELECT MAX(id) AS id FROM trader_analysis GROUP BY trader_address
+                ) latest ON ta.id = latest.id
+            ''')
+            return [json.loads(row[0]) for row in cursor.fetchall() if row[0]]
+
+    def get_latest_analysis_id(self) -> int:
+        """Id of the most recently stored analysis, 0 if there is none; changes whenever an analysis is stored"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT MAX(id) FROM trader_analysis')
+            return cursor.fetchone()[0] or 0
+
     def get_traders_by_style(self, trading_style: str, limit: int = 100) -> List[Dict[str, Any]]:
         """Get traders matching a specific trading style"""
         with sqlite3.connect(self.db_path) as conn:
@@ -340,4 +753,26 @@ class TraderDatabase:
                     'has_next': page < total_pages,
                     'has_previous': page > 1
                 }
-            } 
\ No newline at end of file
+            } 
+
+
+def _leaderboard_moved(trader: Dict[str, Any], fields: Tuple[str, ...], previous: tuple,
+                       rel_tolerance: float = 1e-9) -> bool:
+    """Whether any of `fields` moved by more than `rel_tolerance` from the stored values"""
+    for field, old in zip(fields, previous):
+        new = trader.get(field, 0.0)
+        old = old or 0.0
+        if abs(new - old) > rel_tolerance * max(abs(new), abs(old)):
+            return True
+    return False
+
+
+def _advance_fill_watermark(cursor, trader_address: str, last_seen_time: int, now: str):
+    """Upsert a fill watermark; it never moves backwards"""
+    cursor.execute('''
+        INSERT INTO fill_watermarks (trader_address, last_seen_time, updated_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT(trader_address) DO UPDATE SET
+            last_seen_time = MAX(last_seen_time, excluded.last_seen_time),
+            updated_at = excluded.updated_at
+    ''', (trader_address, last_seen_time, now))
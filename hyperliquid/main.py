@@ -2,6 +2,7 @@ from llm_agent import LLMAgent
 from data.HyperliquidAnalytics import HyperliquidAnalytics
 from data.HyperliquidDataService import HyperliquidDataService
 from db.database import TraderDatabase
+from background_jobs.analysis_pool import analyze_chunks
 import time
 from datetime import datetime, timedelta
 
@@ -15,27 +16,30 @@ def main():
     try:
         # Fetch and store trader data
         print(f"Fetching trader data at {datetime.now()}")
-        top_traders = data_service.get_top_traders(limit=10000)
+        top_traders = data_service.get_top_traders(limit=10000, stream=True)
         db.store_traders(top_traders)
         print(f"Stored {len(top_traders)} traders in database")
 
-        # Analyze each trader and store results
+        # Analyze traders in chunks (across ANALYSIS_WORKERS processes) and store results here
         print("\nAnalyzing traders...")
-        for i, trader in enumerate(top_traders):
-            try:
-                print(f"\nAnalyzing trader {i+1}/{len(top_traders)}: {trader['address']}")
-                analysis = analytics.analyze_trader(trader['address'])
-                # print(analysis)
-                if not analysis['metrics'] :
-                    print(f"No metrics for {trader['address']}")
-                    continue
-                print(analysis['metrics'])
-                db.store_trader_analysis(trader['address'], analysis)
-                print(f"Stored analysis for {trader['address']}")
-                
-            except Exception as e:
-                print(f"Error analyzing trader {trader['address']}: {e}")
+        addresses = [trader['address'] for trader in top_traders]
+        account_values = {trader['address']: trader['account_value'] for trader in top_traders}
+        for chunk, analyses, error in analyze_chunks(addresses, analytics=analytics, account_values=account_values):
+            if error is not None:
+                print(f"Error analyzing a chunk of {len(chunk)} traders: {error}")
                 continue
+            for address in chunk:
+                try:
+                    analysis = analyses.get(address)
+                    if analysis is None or not analysis['metrics']:
+                        print(f"No metrics for {address}")
+                        continue
+                    db.store_trader_analysis(address, analysis)
+                    print(f"Stored analysis for {address}")
+
+                except Exception as e:
+                    print(f"Error storing analysis for {address}: {e}")
+                    continue
 
         print("\nAnalysis complete. Waiting 5 minutes before next update...")
         time.sleep(300)
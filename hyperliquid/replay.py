@@ -0,0 +1,314 @@
+from typing import Dict, Any, Optional, Tuple
+from contextlib import closing
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+import httpx
+import requests
+from llm_agent import LLMAgent
+
+'''
+Record/replay harness for upstream traffic.
+In record mode every HTTP call made through requests (HyperliquidDataService,
+VaultDataService, SentimentDataService, the Ollama provider) or httpx
+(HyperliquidDataService bulk fetches) and every LLMAgent.generate_response
+call is forwarded as usual and its response is written to a compact fixture
+store. In replay mode the same calls are answered from the store without
+touching the network, optionally after an injected delay, so the background
+jobs can be profiled and benchmarked offline and deterministically.
+
+Enable it from the environment before the services are used:
+    REPLAY_MODE=record|replay   (unset or "off" disables the harness)
+    REPLAY_STORE=fixtures.db    (fixture store path)
+    REPLAY_LATENCY_MS=0         (delay added to every replayed response)
+
+Requests that depend on the current time, like the fill history backfill
+windows, take it from now_ms() so a replay asks for the same ranges.
+
+SentimentDataService still needs SENTIMENT_API_KEY to be set in replay mode;
+any placeholder value works since no request leaves the machine.
+'''
+
+logger = logging.getLogger(__name__)
+
+# Response headers worth keeping; everything else is dropped to keep fixtures small
+RECORDED_HEADERS = ('content-type', 'retry-after')
+
+
+class ReplayMissError(Exception):
+    """Raised in replay mode when a request has no recorded response"""
+
+
+'''
+This class is the fixture store used by the harness.
+Responses are keyed by a hash of the normalized request and stored
+zlib-compressed in SQLite.
+INPUTS:
+    db_path: The path to the fixture store
+OUTPUTS:
+    None
+'''
+class FixtureStore:
+    """SQLite-backed store of recorded upstream responses"""
+
+    def __init__(self, db_path: str = "fixtures.db"):
+        self.db_path = db_path
+        self.init_db()
+
+    def init_db(self):
+        """Initialize the fixtures table"""
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS fixtures (
+                    key TEXT PRIMARY KEY,
+                    service TEXT,
+                    request TEXT,
+                    status INTEGER,
+                    headers TEXT,
+                    body BLOB,
+                    recorded_at REAL
+                )
+            ''')
+            conn.commit()
+
+    def put(self, service: str, request: str, status: int, headers: Dict[str, str], body: bytes):
+        """Record a response, replacing any earlier recording of the same request"""
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO fixtures (key, service, request, status, headers, body, recorded_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (_hash(request), service, request, status, json.dumps(headers), zlib.compress(body), time.time()))
+            conn.commit()
+
+    def get(self, request: str) -> Optional[Tuple[int, Dict[str, str], bytes]]:
+        """Look up the recorded (status, headers, body) for a request"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT status, headers, body FROM fixtures WHERE key = ?', (_hash(request),)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), zlib.decompress(row[2])
+
+    def stats(self) -> Dict[str, Any]:
+        """Count recorded responses and compressed bytes per service"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT service, COUNT(*), SUM(LENGTH(body)) FROM fixtures GROUP BY service'
+            ).fetchall()
+        return {service: {'responses': count, 'compressed_bytes': size} for service, count, size in rows}
+
+    def _connect(self):
+        """A connection that is closed, not just committed, when its with block ends"""
+        return closing(sqlite3.connect(self.db_path, timeout=30))
+
+
+class _Harness:
+    """Installed patches and their settings"""
+
+    def __init__(self, mode: str, store: FixtureStore, latency_ms: float):
+        self.mode = mode
+        self.store = store
+        self.latency = latency_ms / 1000.0
+        self.originals = {}
+
+
+_harness: Optional[_Harness] = None
+_install_lock = threading.Lock()
+
+
+def install(mode: str, store_path: str = "fixtures.db", latency_ms: float = 0) -> bool:
+    """Patch requests, httpx and LLMAgent to record or replay upstream traffic
+
+    Args:
+        mode (str): "record", "replay" or "off"
+        store_path (str): Fixture store path
+        latency_ms (float): Delay injected before every replayed response
+
+    Returns:
+        bool: Whether the harness is active
+    """
+    global _harness
+    mode = (mode or "off").lower()
+    if mode == "off":
+        uninstall()
+        return False
+    if mode not in ("record", "replay"):
+        raise ValueError(f"Unknown replay mode: {mode}")
+
+    with _install_lock:
+        if _harness is not None:
+            _restore(_harness)
+        _harness = _Harness(mode, FixtureStore(store_path), latency_ms)
+        _harness.originals = {
+            'requests': requests.Session.request,
+            'httpx': httpx.AsyncClient.send,
+            'llm': LLMAgent.generate_response,
+        }
+        requests.Session.request = _patched_requests_request
+        httpx.AsyncClient.send = _patched_httpx_send
+        LLMAgent.generate_response = _patched_generate_response
+
+    logger.info(f"Replay harness active in {mode} mode using {store_path}")
+    return True
+
+
+def install_from_env() -> bool:
+    """Install the harness from REPLAY_MODE / REPLAY_STORE / REPLAY_LATENCY_MS"""
+    return install(
+        os.getenv("REPLAY_MODE", "off"),
+        os.getenv("REPLAY_STORE", "fixtures.db"),
+        float(os.getenv("REPLAY_LATENCY_MS", "0"))
+    )
+
+
+def uninstall():
+    """Restore the original network and LLM calls"""
+    global _harness
+    with _install_lock:
+        if _harness is not None:
+            _restore(_harness)
+            _harness = None
+
+
+def _restore(harness: _Harness):
+    requests.Session.request = harness.originals['requests']
+    httpx.AsyncClient.send = harness.originals['httpx']
+    LLMAgent.generate_response = harness.originals['llm']
+
+
+def now_ms(name: str = "clock") -> int:
+    """Current time in milliseconds, repeatable under the harness
+
+    Requests built from the current time (e.g. the end of a fill history
+    window) would never match a recording. In record mode the time is
+    stored under `name`; in replay mode the recorded time is returned.
+    Without the harness this is just the wall clock.
+    """
+    harness = _harness
+    request = f"CLOCK {name}"
+    if harness is None:
+        return int(time.time() * 1000)
+    if harness.mode == "replay":
+        _, _, body = _replay(harness, request)
+        return int(body)
+
+    now = int(time.time() * 1000)
+    harness.store.put('clock', request, 200, {}, str(now).encode('utf-8'))
+    return now
+
+
+def _patched_requests_request(session, method, url, *args, **kwargs):
+    harness = _harness
+    prepared = requests.Request(
+        method, url,
+        params=kwargs.get('params'),
+        data=kwargs.get('data'),
+        json=kwargs.get('json')
+    ).prepare()
+    request = _describe_http(prepared.method, prepared.url, prepared.body)
+
+    if harness.mode == "replay":
+        status, headers, body = _replay(harness, request)
+        if harness.latency:
+            time.sleep(harness.latency)
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response._content = body
+        response._content_consumed = True
+        response.url = prepared.url
+        response.request = prepared
+        response.encoding = 'utf-8'
+        return response
+
+    response = harness.originals['requests'](session, method, url, *args, **kwargs)
+    _record(harness, _service_for(prepared.url), request, response.status_code, response.headers, response.content)
+    return response
+
+
+async def _patched_httpx_send(client, request, *args, **kwargs):
+    harness = _harness
+    description = _describe_http(request.method, str(request.url), request.content)
+
+    if harness.mode == "replay":
+        status, headers, body = _replay(harness, description)
+        if harness.latency:
+            await asyncio.sleep(harness.latency)
+        return httpx.Response(status, headers=headers, content=body, request=request)
+
+    response = await harness.originals['httpx'](client, request, *args, **kwargs)
+    await response.aread()
+    _record(harness, _service_for(str(request.url)), description, response.status_code, response.headers, response.content)
+    return response
+
+
+def _patched_generate_response(agent, *args, **kwargs):
+    harness = _harness
+    bound = inspect.signature(harness.originals['llm']).bind(agent, *args, **kwargs)
+    bound.apply_defaults()
+    call = dict(bound.arguments)
+    call.pop('agent', None)
+    call.pop('self', None)
+    call['provider'] = agent.provider.value
+    request = "LLM " + json.dumps(call, sort_keys=True)
+
+    if harness.mode == "replay":
+        _, _, body = _replay(harness, request)
+        if harness.latency:
+            time.sleep(harness.latency)
+        return json.loads(body)
+
+    result = harness.originals['llm'](agent, *args, **kwargs)
+    harness.store.put('llm', request, 200, {}, json.dumps(result).encode('utf-8'))
+    return result
+
+
+def _replay(harness: _Harness, request: str) -> Tuple[int, Dict[str, str], bytes]:
+    recorded = harness.store.get(request)
+    if recorded is None:
+        raise ReplayMissError(f"No recorded response for {request[:200]}")
+    return recorded
+
+
+def _record(harness: _Harness, service: str, request: str, status: int, headers, body: bytes):
+    kept = {name: headers[name] for name in RECORDED_HEADERS if name in headers}
+    harness.store.put(service, request, status, kept, body)
+
+
+def _describe_http(method: str, url: str, body) -> str:
+    """Normalize an HTTP request so sync and async calls for the same payload share a fixture"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    body = body or b''
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(',', ':')).encode('utf-8')
+    except ValueError:
+        pass
+    return f"{method.upper()} {url} {body.decode('utf-8', errors='replace')}"
+
+
+def _service_for(url: str) -> str:
+    if 'lunarcrush' in url:
+        return 'lunarcrush'
+    if 'hyperliquid' in url:
+        return 'hyperliquid'
+    return 'http'
+
+
+def _hash(request: str) -> str:
+    return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+
+if __name__ == "__main__":
+    # Print what a fixture store contains
+    store = FixtureStore(os.getenv("REPLAY_STORE", "fixtures.db"))
+    for service, counts in store.stats().items():
+        print(f"{service}: {counts['responses']} responses, {counts['compressed_bytes']:,} bytes compressed")
@@ -0,0 +1,184 @@
+from typing import Dict, Any, List, Tuple
+import pandas as pd
+
+'''
+Row-by-row implementations that the vectorised code replaced, kept
+verbatim (minus the class) so tests can check the replacements give the
+same results and benchmarks can time them side by side.
+INPUTS:
+    The same inputs as the functions they mirror
+OUTPUTS:
+    The same outputs as the functions they mirror
+'''
+
+
+def process_orders_to_dataframe(orders: List[Dict[str, Any]]) -> pd.DataFrame:
+    """HyperliquidDataService.process_orders_to_dataframe before it was vectorised"""
+    if not orders:
+        return pd.DataFrame()
+        
+    # Extract order details and status into a flat structure
+    processed_orders = []
+    for order_data in orders:
+        order = order_data['order']
+        status = order_data['status']
+        status_timestamp = order_data['statusTimestamp']
+        
+        processed_order = {
+            'coin': order['coin'],
+            'side': order['side'],
+            'limitPx': order['limitPx'],
+            'sz': order['sz'],
+            'origSz': order['origSz'],
+            'oid': order['oid'],
+            'timestamp': order['timestamp'],
+            'orderType': order['orderType'],
+            'tif': order['tif'],
+            'reduceOnly': order['reduceOnly'],
+            'status': status,
+            'statusTimestamp': status_timestamp
+        }
+        processed_orders.append(processed_order)
+        
+    df = pd.DataFrame(processed_orders)
+    
+    # Convert timestamps
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    df['statusTimestamp'] = pd.to_datetime(df['statusTimestamp'], unit='ms')
+    
+    # Convert numeric columns
+    numeric_columns = ['limitPx', 'sz', 'origSz']
+    for col in numeric_columns:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+            
+    # Convert side to lowercase for consistency and add position type
+    if 'side' in df.columns:
+        df['side'] = df['side'].str.lower()
+        df['position_type'] = df['side'].map({'a': 'Short', 'b': 'Long'})
+        
+    # Calculate PnL for filled orders
+    if all(col in df.columns for col in ['side', 'limitPx', 'sz', 'status']):
+        # Sort by timestamp ascending for calculations
+        df = df.sort_values('timestamp')
+        
+        # Calculate position size (negative for shorts, positive for longs)
+        df['position_size'] = df.apply(
+            lambda x: -float(x['sz']) if x['side'] == 'a' else float(x['sz']),
+            axis=1
+        )
+        
+        # Calculate cumulative position
+        df['cumulative_position'] = df.groupby('coin')['position_size'].cumsum()
+        
+        # Calculate entry price for each position
+        df['entry_price'] = df.groupby('coin')['limitPx'].transform('first')
+        
+        # Calculate PnL for filled orders
+        df['pnl'] = df.apply(
+            lambda x: (
+                (float(x['limitPx']) - float(x['entry_price'])) * float(x['sz'])
+                if x['side'] == 'b'  # Long position
+                else (float(x['entry_price']) - float(x['limitPx'])) * float(x['sz'])
+                if x['side'] == 'a'  # Short position
+                else 0
+            ) if x['status'] == 'filled' else 0,
+            axis=1
+        )
+        
+        # Calculate cumulative PnL
+        df['cumulative_pnl'] = df.groupby('coin')['pnl'].cumsum()
+        
+        # Calculate ROI
+        df['roi'] = df['cumulative_pnl'] / (df['entry_price'] * df['position_size'].abs())
+        
+        # Sort back to descending order (newest first)
+        df = df.sort_values('timestamp', ascending=False)
+        
+    return df
+
+
+def track_positions(orders_df: pd.DataFrame) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """The iterrows position loop of HyperliquidAnalytics._calculate_metrics before PositionEngine
+
+    Returns:
+        Tuple: (closed trades, positions left open per coin)
+    """
+    # Sort by timestamp for position tracking
+    orders_df = orders_df.sort_values('timestamp')
+    
+    # Initialize position tracking
+    positions = {}  # {coin: {'entry_price': price, 'size': size, 'side': side}}
+    trades = []     # List of completed trades with PnL
+    
+    # Process each order
+    for _, order in orders_df.iterrows():
+        
+        if order['status'] != 'filled':
+            continue
+            
+        coin = order['coin']
+        side = order['side']
+        price = float(order['limitPx'])
+        size = float(order['sz'])
+        
+        if size == 0:
+            continue
+        if coin not in positions:
+            # Opening a new position
+            positions[coin] = {
+                'entry_price': price,
+                'size': size,
+                'side': side
+            }
+        else:
+            # Closing or reducing an existing position
+            pos = positions[coin]
+            # Check if this is a closing order
+            if (pos['side'] == 'b' and side == 'a') or (pos['side'] == 'a' and side == 'b'):
+                # Calculate PnL
+                if pos['side'] == 'b':  # Long position
+                    pnl = (price - pos['entry_price']) * min(size, pos['size'])
+                else:  # Short position
+                    pnl = (pos['entry_price'] - price) * min(size, pos['size'])
+                    
+                trades.append({
+                    'coin': coin,
+                    'entry_price': pos['entry_price'],
+                    'exit_price': price,
+                    'size': min(size, pos['size']),
+                    'pnl': pnl,
+                    'entry_side': pos['side']
+                })
+                
+                # Update or remove position
+                if size >= pos['size']:
+                    del positions[coin]
+                else:
+                    pos['size'] -= size
+            else:
+                # Adding to existing position - update average entry price
+                total_size = pos['size'] + size
+                pos['entry_price'] = ((pos['entry_price'] * pos['size']) + (price * size)) / total_size
+                pos['size'] = total_size
+    
+    return trades, positions
+
+
+def holding_periods(orders_df: pd.DataFrame) -> List[float]:
+    """The per-coin buy/sell pairing of HyperliquidAnalytics._analyze_trading_style before PositionEngine"""
+    holding_times = []
+    
+    for coin in orders_df['coin'].unique():
+        coin_trades = orders_df[orders_df['coin'] == coin].sort_values('timestamp')
+        
+        if len(coin_trades) > 1:
+            buys = coin_trades[coin_trades['side'] == 'b'].reset_index()
+            sells = coin_trades[coin_trades['side'] == 'a'].reset_index()
+            
+            for i in range(min(len(buys), len(sells))):
+                if sells.loc[i, 'timestamp'] > buys.loc[i, 'timestamp']:
+                    holding_period = (sells.loc[i, 'timestamp'] - buys.loc[i, 'timestamp']).total_seconds() / 3600
+                    holding_times.append(holding_period)
+    
+    return holding_times
@@ -0,0 +1,113 @@
+from typing import Dict, Any, List
+import random
+
+# Start of the synthetic histories (2023-11-14 22:13:20 UTC)
+START_MS = 1_700_000_000_000
+
+'''
+Synthetic Hyperliquid payloads for the tests and benchmarks.
+Orders are shaped like the historicalOrders response, with string
+prices and sizes, so they go through the same parsing as real data.
+INPUTS:
+    count: Number of orders
+    coins: Number of distinct coins
+    seed: Random seed, so every run sees the same data
+    messy: Also produce unknown sides and unparseable prices
+OUTPUTS:
+    A list of order dictionaries, oldest first
+'''
+
+
+def generate_orders(count: int, coins: int = 20, seed: int = 0, messy: bool = False) -> List[Dict[str, Any]]:
+    """historicalOrders-shaped orders; about 5% of timestamps step back to create ties and reorderings"""
+    rng = random.Random(seed)
+    names = [f"C{i}" for i in range(coins)]
+    orders = []
+    timestamp = START_MS
+    for oid in range(count):
+        timestamp += rng.randint(0, 60_000)
+        side = rng.choice(['A', 'B'])
+        if messy and rng.random() < 0.01:
+            side = 'X'
+        price = f"{rng.uniform(1, 100):.4f}"
+        if messy and rng.random() < 0.01:
+            price = "bad"
+        orders.append({
+            'order': {
+                'coin': rng.choice(names),
+                'side': side,
+                'limitPx': price,
+                'sz': f"{rng.uniform(0, 10):.3f}",
+                'origSz': f"{rng.uniform(0, 10):.3f}",
+                'oid': oid,
+                'timestamp': timestamp if rng.random() > 0.05 else timestamp - 1000,
+                'orderType': rng.choice(['Limit', 'Market']),
+                'tif': rng.choice(['Gtc', 'Ioc', None]),
+                'reduceOnly': rng.random() < 0.1
+            },
+            'status': rng.choice(['filled', 'filled', 'canceled', 'open', 'rejected']),
+            'statusTimestamp': timestamp + rng.randint(0, 1000)
+        })
+    return orders
+
+
+
+def generate_fills(count: int, coins: int = 5, seed: int = 0) -> List[Dict[str, Any]]:
+    """userFills-shaped fills of orders split into one to three fills, oldest first
+
+    startPosition and closedPnl follow a running position per coin, so
+    orders open, add to, reduce, close and flip positions. Fills of one
+    order share a millisecond, and about 5% of orders share it with the
+    previous order.
+    """
+    rng = random.Random(seed)
+    names = [f"C{i}" for i in range(coins)]
+    positions = {name: 0.0 for name in names}
+    fills = []
+    timestamp = START_MS
+    oid = 0
+    while len(fills) < count:
+        oid += 1
+        if rng.random() > 0.05:
+            timestamp += rng.randint(1, 600_000)
+        coin = rng.choice(names)
+        position = positions[coin]
+        side = rng.choice(['A', 'B'])
+        size = round(rng.uniform(0.1, 10), 3)
+        if position and rng.random() < 0.3:
+            # Close the position exactly
+            side = 'A' if position > 0 else 'B'
+            size = abs(position)
+        price = rng.uniform(1, 100)
+        for part in _split(rng, size):
+            start = position
+            position = round(position + (part if side == 'B' else -part), 3)
+            reducing = start != 0 and (start > 0) == (side == 'A')
+            fills.append({
+                'coin': coin,
+                'px': f"{price:.4f}",
+                'sz': f"{part:.3f}",
+                'side': side,
+                'time': timestamp,
+                'startPosition': f"{start:.3f}",
+                'dir': 'Close' if reducing else 'Open',
+                'closedPnl': f"{rng.uniform(-50, 50):.4f}" if reducing else "0.0",
+                'hash': '0x',
+                'oid': oid,
+                'crossed': True,
+                'fee': f"{rng.uniform(0, 1):.4f}",
+                'tid': len(fills) + 1,
+                'feeToken': 'USDC'
+            })
+        positions[coin] = position
+    return fills[:count]
+
+
+def _split(rng: random.Random, size: float) -> List[float]:
+    """Split an order size into one to three fill sizes"""
+    parts = rng.randint(1, 3)
+    if parts == 1 or size < 0.01:
+        return [size]
+    cuts = sorted(round(rng.uniform(0, size), 3) for _ in range(parts - 1))
+    sizes = [b - a for a, b in zip([0.0] + cuts, cuts + [size])]
+    return [round(part, 3) for part in sizes if round(part, 3) > 0]
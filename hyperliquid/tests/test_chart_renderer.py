@@ -0,0 +1,54 @@
+import threading
+from concurrent.futures import Future
+from data.ChartRenderer import ChartRenderer, chart_key
+
+
+class ImmediateExecutor:
+    """Runs the submitted call in place, so its future is done before submit returns"""
+
+    def submit(self, function, *args):
+        future = Future()
+        future.set_result(b"png")
+        return future
+
+    def shutdown(self):
+        pass
+
+
+def test_render_of_an_already_finished_future_does_not_deadlock():
+    renderer = ChartRenderer(workers=1)
+    renderer._pool = ImmediateExecutor()
+    data = {'hourly_distribution': {1: 2}}
+    results = []
+
+    worker = threading.Thread(target=lambda: results.append(renderer.render('hourly_activity', data).result()))
+    worker.daemon = True
+    worker.start()
+    worker.join(timeout=5)
+
+    assert not worker.is_alive()
+    assert results == [b"png"]
+    assert renderer._inflight == {}
+    assert renderer.cache.get(f"chart_{chart_key('hourly_activity', data)}") == b"png"
+
+
+class PendingExecutor(ImmediateExecutor):
+    """Leaves submitted futures pending, like renders queued behind others"""
+
+    def submit(self, function, *args):
+        return Future()
+
+
+def test_cancelled_render_is_forgotten(caplog):
+    renderer = ChartRenderer(workers=1)
+    renderer._pool = PendingExecutor()
+    data = {'hourly_distribution': {3: 1}}
+
+    future = renderer.render('hourly_activity', data)
+    assert future.cancel()
+
+    # An error escaping the done-callback is logged by concurrent.futures
+    assert not [record for record in caplog.records if record.levelname == 'ERROR']
+    assert renderer._inflight == {}
+    assert renderer.cache.get(f"chart_{chart_key('hourly_activity', data)}") is None
+    assert renderer.render('hourly_activity', data) is not future
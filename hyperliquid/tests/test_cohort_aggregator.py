@@ -0,0 +1,47 @@
+from data.CohortAggregator import CohortAggregator, aggregate_analyses
+from db.database import TraderDatabase
+from tests.synthetic import START_MS
+
+
+def _analysis(address, distribution):
+    return {
+        'user_address': address,
+        'timestamp': '2023-11-15T00:00:00',
+        'metrics': {'asset_distribution': distribution, 'total_orders': sum(distribution.values())},
+        'trading_style': {'primary_style': 'Day Trader'},
+        'reputation_scores': {'overall': 50}
+    }
+
+
+def _flows_by_coin(flows):
+    return {flow['coin']: flow for flow in flows}
+
+
+def test_repeated_analyses_of_a_trader_count_once(tmp_path):
+    db = TraderDatabase(str(tmp_path / "traders.db"))
+    # Two main job cycles for the same trader, then one for another
+    db.store_trader_analysis("0xa", _analysis("0xa", {'BTC': 10, 'ETH': 4}))
+    db.store_trader_analysis("0xa", _analysis("0xa", {'BTC': 12, 'SOL': 1}))
+    db.store_trader_analysis("0xb", _analysis("0xb", {'BTC': 3}))
+    db.store_fills("0xa", [{
+        'tid': 1, 'time': START_MS, 'coin': 'BTC', 'side': 'B', 'px': '100', 'sz': '2',
+        'startPosition': '0', 'closedPnl': '0', 'fee': '0.1', 'oid': 1, 'dir': 'Open Long', 'hash': '0x'
+    }])
+
+    flows = _flows_by_coin(CohortAggregator(db, window_hours=24).build(now_ms=START_MS + 1000))
+
+    assert flows['BTC']['traders'] == 2
+    assert flows['BTC']['order_count'] == 15
+    assert flows['SOL']['traders'] == 1
+    assert 'ETH' not in flows
+    assert flows['BTC']['buy_volume'] == 200.0
+
+
+def test_history_rows_are_keyed_by_address(tmp_path):
+    db = TraderDatabase(str(tmp_path / "traders.db"))
+    for count in (5, 7):
+        db.store_trader_analysis("0xa", _analysis("0xa", {'BTC': count}))
+
+    counts = aggregate_analyses(db.get_all_trader_analyses())
+    assert counts.loc['BTC', 'traders'] == 1
+    assert counts.loc['BTC', 'order_count'] == 7
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from data.HyperliquidAnalytics import HyperliquidAnalytics
+from data.HyperliquidDataService import HyperliquidDataService
+from data.ColumnarStore import MS_PER_HOUR
+from tests.synthetic import START_MS
+
+ADDRESS = "0xtrader"
+
+
+def fill(tid, hours, side, size, start, closed_pnl=0.0, coin="BTC"):
+    """A userFills row `hours` after START_MS; every fill is its own order"""
+    return {
+        'coin': coin, 'px': "100", 'sz': str(size), 'side': side, 'time': START_MS + int(hours * MS_PER_HOUR),
+        'startPosition': str(start), 'dir': '', 'closedPnl': str(closed_pnl), 'hash': '0x',
+        'oid': tid, 'crossed': True, 'fee': "0", 'tid': tid
+    }
+
+
+# Hand-computed cases: fills, holding periods in hours, closed trades
+CASES = {
+    # Buy 10, sell 3 after 2h, sell the other 7 after 10h: one 10h hold, two reducing trades
+    'partial_reduce': ([
+        fill(1, 0, 'B', 10, 0),
+        fill(2, 2, 'A', 3, 10, closed_pnl=6),
+        fill(3, 10, 'A', 7, 7, closed_pnl=-1),
+    ], [10.0], 2),
+    # Buy 10, sell 15 after 4h (closes the long, opens a 5 short), buy 5 after 6h
+    'flip': ([
+        fill(1, 0, 'B', 10, 0),
+        fill(2, 4, 'A', 15, 10, closed_pnl=5),
+        fill(3, 6, 'B', 5, -5, closed_pnl=2),
+    ], [4.0, 2.0], 2),
+    # Buy 4, add 6 after 1h, reduce by 5 after 3h, close after 5h
+    'add_then_reduce': ([
+        fill(1, 0, 'B', 4, 0),
+        fill(2, 1, 'B', 6, 4),
+        fill(3, 3, 'A', 5, 10, closed_pnl=1),
+        fill(4, 5, 'A', 5, 5, closed_pnl=1),
+    ], [5.0], 2),
+    # A short closed in two parts, on two coins
+    'two_coins': ([
+        fill(1, 0, 'A', 2, 0),
+        fill(2, 1, 'B', 1, 0, coin="ETH"),
+        fill(3, 3, 'B', 1, -2, closed_pnl=1),
+        fill(4, 4, 'A', 1, 1, closed_pnl=1, coin="ETH"),
+        fill(5, 8, 'B', 1, -1, closed_pnl=1),
+    ], [3.0, 8.0], 3),
+}
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_fill_holding_periods_are_exact(name):
+    fills, holds, trades = CASES[name]
+    analysis = HyperliquidAnalytics(HyperliquidDataService())._analyze_fills({ADDRESS: fills})[ADDRESS]
+    style = analysis['trading_style']
+
+    assert style['avg_holding_period_hours'] == pytest.approx(sum(holds) / len(holds))
+    assert style['median_holding_period_hours'] == pytest.approx(np.median(holds))
+    assert analysis['metrics']['total_trades'] == trades
@@ -0,0 +1,66 @@
+from data.FillIngestionService import FillIngestionService
+from data.HyperliquidDataService import HyperliquidDataService
+from db.database import TraderDatabase
+from tests.synthetic import START_MS
+
+END_MS = START_MS + 1_000_000
+
+
+def _fill(tid, time):
+    return {'tid': tid, 'time': time, 'coin': 'BTC', 'side': 'B', 'px': '100', 'sz': '1',
+            'startPosition': '0', 'closedPnl': '0', 'fee': '0', 'oid': tid, 'dir': 'Open Long', 'hash': '0x'}
+
+
+class FakeFillSource:
+    """Data service returning canned histories; None stands for a failed fetch"""
+
+    def __init__(self, histories, since=None):
+        self.histories = histories
+        self.since = since or {}
+        self.backfilled = []
+
+    def fetch_fill_histories(self, addresses, end_time=None):
+        self.backfilled.extend(addresses)
+        for address in addresses:
+            yield address, self.histories.get(address, [])
+
+    def fetch_fills_since(self, start_times):
+        for address in start_times:
+            yield address, self.since.get(address, [])
+
+
+def test_incomplete_backfill_is_retried_and_empty_history_gets_a_watermark(tmp_path):
+    db = TraderDatabase(str(tmp_path / "traders.db"))
+    source = FakeFillSource({'0xfailed': None, '0xempty': [], '0xactive': [_fill(1, START_MS), _fill(2, START_MS + 5)]})
+
+    new_fills = FillIngestionService(db, source).ingest(['0xfailed', '0xempty', '0xactive'], end_time=END_MS)
+
+    assert new_fills == {'0xactive': 2}
+    assert db.get_fill_watermarks() == {'0xempty': END_MS, '0xactive': START_MS + 5}
+    assert db.get_trader_fills('0xfailed') == []
+
+    # Next run: only the failed trader is backfilled again
+    source.histories['0xfailed'] = [_fill(3, START_MS + 7)]
+    source.backfilled = []
+    new_fills = FillIngestionService(db, source).ingest(['0xfailed', '0xempty', '0xactive'], end_time=END_MS + 10)
+    assert source.backfilled == ['0xfailed']
+    assert new_fills == {'0xfailed': 1}
+    assert db.get_fill_watermarks()['0xempty'] == END_MS
+
+
+def test_failed_window_makes_the_history_incomplete():
+    service = HyperliquidDataService()
+
+    async def payloads(requests_to_make, max_concurrency):
+        for key, payload, _ in requests_to_make:
+            address, window_start, _ = key
+            if address == '0xgap' and window_start > START_MS:
+                yield key, None
+            else:
+                yield key, [_fill(window_start, window_start)]
+
+    service._afetch_payloads = payloads
+    histories = dict(service.fetch_fill_histories(['0xgap', '0xfine'], start_time=START_MS, end_time=END_MS, windows=4))
+
+    assert histories['0xgap'] is None
+    assert len(histories['0xfine']) == 4
@@ -0,0 +1,40 @@
+from db.database import TraderDatabase
+
+
+def _trader(address, account_value):
+    return {'address': address, 'account_value': account_value, 'daily_pnl': 1.0, 'daily_volume': 10.0,
+            'weekly_pnl': 2.0, 'monthly_pnl': 3.0, 'all_time_pnl': 4.0}
+
+
+def _analysis(address):
+    return {'user_address': address, 'metrics': {'total_orders': 1}, 'trading_style': {}}
+
+
+def _cycle(db, traders, analysed):
+    """One main job cycle: diff, store the snapshot, store the analyses that succeeded"""
+    changed = db.get_changed_traders(traders)
+    db.store_traders(traders)
+    for address in changed:
+        if address in analysed:
+            db.store_trader_analysis(address, _analysis(address))
+    return changed
+
+
+def test_failed_analysis_is_retried_until_it_succeeds(tmp_path):
+    db = TraderDatabase(str(tmp_path / "traders.db"))
+    assert _cycle(db, [_trader("0xa", 100.0), _trader("0xb", 100.0)], analysed={"0xa", "0xb"}) == ["0xa", "0xb"]
+    assert _cycle(db, [_trader("0xa", 100.0), _trader("0xb", 100.0)], analysed={"0xa", "0xb"}) == []
+
+    # 0xb changes but its analysis fails; the unchanged leaderboard must not hide it next cycle
+    assert _cycle(db, [_trader("0xa", 100.0), _trader("0xb", 120.0)], analysed={"0xa"}) == ["0xb"]
+    assert _cycle(db, [_trader("0xa", 100.0), _trader("0xb", 120.0)], analysed={"0xa"}) == ["0xb"]
+    assert _cycle(db, [_trader("0xa", 100.0), _trader("0xb", 120.0)], analysed={"0xa", "0xb"}) == ["0xb"]
+    assert _cycle(db, [_trader("0xa", 100.0), _trader("0xb", 120.0)], analysed={"0xa", "0xb"}) == []
+
+
+def test_snapshot_keeps_fresh_values(tmp_path):
+    db = TraderDatabase(str(tmp_path / "traders.db"))
+    _cycle(db, [_trader("0xa", 100.0)], analysed=set())
+    _cycle(db, [_trader("0xa", 150.0)], analysed=set())
+    assert db.get_changed_traders([_trader("0xa", 150.0)]) == ["0xa"]
+    assert db.get_trader("0xa")['account_value'] == 150.0
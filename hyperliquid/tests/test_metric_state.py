@@ -0,0 +1,106 @@
+import json
+import math
+import numpy as np
+import pytest
+from data.HyperliquidAnalytics import HyperliquidAnalytics
+from data.HyperliquidDataService import HyperliquidDataService
+from data.MetricState import TraderMetricState, ORDER_SETTLE_MS
+from db.database import TraderDatabase
+from tests.synthetic import generate_fills
+from tests.test_fill_analysis import CASES
+
+ADDRESS = "0xtrader"
+# Keys only the full analysis has
+FULL_ONLY = {'rolling_windows', 'rolling_series'}
+# The incremental holding-period quantiles come from a histogram
+APPROXIMATE = {'median_holding_period_hours', 'p90_holding_period_hours'}
+
+
+@pytest.fixture
+def db(tmp_path):
+    return TraderDatabase(str(tmp_path / "traders.db"))
+
+
+def _fold_in_chunks(db, fills, chunks, account_value=None):
+    """Ingest the fills in chunks and fold each one like the main job does"""
+    analytics = HyperliquidAnalytics(HyperliquidDataService())
+    bounds = np.linspace(0, len(fills), chunks + 1).astype(int)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        db.store_fills(ADDRESS, fills[start:end])
+        state = TraderMetricState(db.get_metric_state(ADDRESS))
+        analysis = analytics.analyze_trader_incremental(
+            ADDRESS, state, db.get_trader_fills(ADDRESS, start_time=state.watermark or None), account_value
+        )
+        db.store_metric_state(ADDRESS, state.to_dict())
+    return analysis, state
+
+
+def _assert_close(incremental, full, approximate=()):
+    assert set(incremental) == set(full) - FULL_ONLY
+    for key, value in incremental.items():
+        expected = full[key]
+        if isinstance(value, (float, np.floating)) and not (math.isnan(value) and math.isnan(expected)):
+            tolerance = 0.03 if key in approximate else 1e-9
+            assert value == pytest.approx(expected, rel=tolerance, abs=1e-9), key
+        elif not isinstance(value, (float, np.floating)):
+            assert value == expected, key
+
+
+@pytest.mark.parametrize("count,coins,seed,chunks", [
+    (1, 1, 1, 1),
+    (50, 2, 2, 7),
+    (2000, 5, 3, 1),
+    (2000, 5, 3, 13),
+    (5000, 3, 4, 40),
+])
+def test_incremental_matches_full(db, count, coins, seed, chunks):
+    fills = generate_fills(count, coins=coins, seed=seed)
+    incremental, state = _fold_in_chunks(db, fills, chunks, account_value=50_000.0)
+    full = HyperliquidAnalytics(HyperliquidDataService())._analyze_fills(
+        {ADDRESS: db.get_trader_fills(ADDRESS)}, {ADDRESS: 50_000.0}
+    )[ADDRESS]
+
+    assert state.fill_count == count
+    _assert_close(incremental['metrics'], full['metrics'])
+    _assert_close(incremental['trading_style'], full['trading_style'], APPROXIMATE)
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_holds_match_hand_computed_values(name):
+    fills, holds, trades = CASES[name]
+    state = TraderMetricState()
+    for fill in fills:
+        state = TraderMetricState(json.loads(json.dumps(state.to_dict())))
+        state.fold([fill])
+
+    assert state.hold_count == len(holds)
+    assert state.hold_sum == pytest.approx(sum(holds))
+    style = state.style()
+    assert style['avg_holding_period_hours'] == pytest.approx(sum(holds) / len(holds))
+    assert style['median_holding_period_hours'] == pytest.approx(np.median(holds), rel=0.03)
+    assert state.metrics()['total_trades'] == trades
+
+
+def test_state_stays_bounded(db):
+    fills = generate_fills(5000, coins=3, seed=5)
+    _, state = _fold_in_chunks(db, fills, 50)
+
+    # Only orders filled within the settle horizon are kept individually
+    assert all(entry[1] >= state.watermark - ORDER_SETTLE_MS for entry in state.recent_orders.values())
+    assert len(state.recent_orders) < len({fill['oid'] for fill in fills}) / 5
+    assert all(len(times) <= 1 for _, times in state.pending_holds.values())
+    assert json.loads(json.dumps(state.to_dict())) == state.to_dict()
+
+
+def test_refolding_skips_folded_fills(db):
+    fills = generate_fills(300, coins=2, seed=6)
+    db.store_fills(ADDRESS, fills)
+    state = TraderMetricState()
+    assert state.fold(db.get_trader_fills(ADDRESS)) == 300
+    assert state.fold(db.get_trader_fills(ADDRESS, start_time=state.watermark)) == 0
+
+
+def test_other_state_versions_are_rebuilt():
+    state = TraderMetricState({'watermark': 123, 'boundary_oids': [1], 'total_orders': 10})
+    assert state.watermark == 0
+    assert state.metrics() == {}
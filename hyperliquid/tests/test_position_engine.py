@@ -0,0 +1,94 @@
+import math
+import numpy as np
+import pytest
+from data.HyperliquidAnalytics import HyperliquidAnalytics
+from data.HyperliquidDataService import HyperliquidDataService
+from data.ColumnarStore import OrderBatch
+from data.PositionEngine import PositionEngine
+from tests import reference
+from tests.synthetic import generate_orders
+
+CASES = [
+    (1, 1, 1, False),
+    (5, 2, 2, False),
+    (300, 3, 3, True),
+    (2000, 20, 4, True),
+    (3000, 5, 5, False),
+    (5000, 2, 6, True),
+]
+
+
+def _orders_frame(count, coins, seed, messy):
+    df = HyperliquidDataService().process_orders_to_dataframe(generate_orders(count, coins=coins, seed=seed, messy=messy))
+    if count > 100:
+        # Zero sizes, orders without a side and a run of tied timestamps
+        df.loc[df.index[:20], 'sz'] = 0.0
+        df['side'] = df['side'].astype(object)
+        df.loc[df.index[20:40], 'side'] = None
+        df.loc[df.index[40:200], 'timestamp'] = df['timestamp'].iloc[40]
+    return df
+
+
+def _run_engine(df):
+    df = df.sort_values('timestamp')
+    return PositionEngine().run(
+        df['coin'].to_numpy(), df['side'].to_numpy(),
+        df['limitPx'].astype(float).to_numpy(), df['sz'].astype(float).to_numpy(),
+        times=df['timestamp'].to_numpy(), mask=(df['status'] == 'filled').to_numpy()
+    )
+
+
+def _same_records(actual, expected):
+    assert len(actual) == len(expected)
+    for got, want in zip(actual, expected):
+        assert got.keys() == want.keys()
+        for key, value in want.items():
+            if isinstance(value, float) and math.isnan(value):
+                assert math.isnan(got[key])
+            else:
+                assert got[key] == value, (key, got, want)
+
+
+@pytest.mark.parametrize("count, coins, seed, messy", CASES)
+def test_closed_trades_match_loop(count, coins, seed, messy):
+    df = _orders_frame(count, coins, seed, messy)
+    expected_trades, _ = reference.track_positions(df)
+
+    # Same trades in the same order, with bit-identical prices, sizes and PnL
+    _same_records(_run_engine(df).to_records(), expected_trades)
+
+
+@pytest.mark.parametrize("count, coins, seed, messy", CASES)
+def test_holding_periods_match_loop(count, coins, seed, messy):
+    df = _orders_frame(count, coins, seed, messy)
+    expected = np.sort(reference.holding_periods(df))
+
+    actual = PositionEngine().holding_periods(df['coin'].to_numpy(), df['side'].to_numpy(), df['timestamp'].to_numpy())
+    np.testing.assert_allclose(np.sort(actual), expected, rtol=1e-12)
+
+
+def test_batch_style_and_metrics_match_loop_per_trader():
+    analytics = HyperliquidAnalytics(HyperliquidDataService())
+    histories = [generate_orders(count, coins=coins, seed=seed) for count, coins, seed in
+                 [(400, 3, 10), (1, 1, 11), (1500, 8, 12), (0, 1, 13), (900, 2, 14)]]
+    batch = OrderBatch.from_orders([order for orders in histories for order in orders])
+    traders = np.repeat(np.arange(len(histories)), [len(orders) for orders in histories])
+
+    styles = analytics._analyze_trading_style_batch(batch, traders, len(histories))
+    metrics = analytics._calculate_metrics_batch(batch, traders, len(histories))
+
+    for orders, style, trader_metrics in zip(histories, styles, metrics):
+        df = reference.process_orders_to_dataframe(orders)
+        holding = reference.holding_periods(df) if orders else []
+        if holding:
+            assert style['avg_holding_period_hours'] == pytest.approx(np.mean(holding), rel=1e-12)
+            assert style['median_holding_period_hours'] == pytest.approx(np.median(holding), rel=1e-12)
+        else:
+            assert 'avg_holding_period_hours' not in style
+
+        trades = reference.track_positions(df)[0] if orders else []
+        if trades:
+            assert trader_metrics['total_trades'] == len(trades)
+            assert trader_metrics['total_pnl'] == pytest.approx(sum(trade['pnl'] for trade in trades), rel=1e-9)
+        else:
+            assert 'total_trades' not in trader_metrics
@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+from data.HyperliquidDataService import HyperliquidDataService
+from data.ColumnarStore import OrderBatch
+from tests import reference
+from tests.synthetic import generate_orders
+
+# Columns the analytics read; the batch keeps categorical strings and float
+# sizes where the row-wise version kept object columns
+COMPARED_COLUMNS = [
+    'coin', 'side', 'limitPx', 'sz', 'origSz', 'oid', 'timestamp', 'orderType', 'tif',
+    'reduceOnly', 'status', 'statusTimestamp', 'position_type', 'position_size',
+    'cumulative_position', 'entry_price', 'pnl', 'cumulative_pnl', 'roi'
+]
+
+
+def _comparable(df: pd.DataFrame) -> pd.DataFrame:
+    df = df[COMPARED_COLUMNS].copy()
+    for column in ('coin', 'side', 'orderType', 'tif', 'status', 'position_type'):
+        df[column] = df[column].astype(object).where(df[column].notna(), None)
+    for column in ('limitPx', 'sz', 'origSz', 'position_size', 'cumulative_position',
+                   'entry_price', 'pnl', 'cumulative_pnl', 'roi'):
+        df[column] = df[column].astype(float)
+    df['oid'] = df['oid'].astype('int64')
+    df['reduceOnly'] = df['reduceOnly'].astype(bool)
+    return df
+
+
+@pytest.mark.parametrize("count, coins, seed, messy", [
+    (1, 1, 0, False),
+    (50, 3, 1, False),
+    (2000, 20, 2, False),
+    (3000, 5, 3, True),
+])
+def test_matches_row_wise_version(count, coins, seed, messy):
+    orders = generate_orders(count, coins=coins, seed=seed, messy=messy)
+    service = HyperliquidDataService()
+
+    expected = _comparable(reference.process_orders_to_dataframe(orders))
+    for source in (orders, OrderBatch.from_orders(orders)):
+        actual = _comparable(service.process_orders_to_dataframe(source))
+        pd.testing.assert_frame_equal(actual, expected, check_index_type=False)
+
+
+def test_empty_orders():
+    service = HyperliquidDataService()
+    assert service.process_orders_to_dataframe([]).empty
+    assert service.process_orders_to_dataframe(OrderBatch.from_orders([])).empty
+
+
+def test_pnl_is_float_without_filled_orders():
+    orders = [dict(order, status='canceled') for order in generate_orders(20, seed=4)]
+    df = HyperliquidDataService().process_orders_to_dataframe(orders)
+    assert df['pnl'].dtype == 'float64'
+    assert (df['pnl'] == 0).all()
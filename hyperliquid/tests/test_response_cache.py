@@ -0,0 +1,20 @@
+from data.ResponseCache import ResponseCache
+
+
+def test_oversized_value_replaces_the_cached_one():
+    cache = ResponseCache(max_bytes=10_000)
+    cache.set("orders_0xa", [1, 2, 3])
+    assert cache.get("orders_0xa") == [1, 2, 3]
+
+    cache.set("orders_0xa", list(range(10_000)))
+
+    assert cache.get("orders_0xa") is None
+    assert len(cache) == 0
+    assert cache.size_bytes == 0
+
+
+def test_uncacheable_kind_drops_the_cached_value():
+    cache = ResponseCache()
+    cache.set("positions_0xa", {'a': 1})
+    cache.set("positions_0xa", {'a': 2}, ttl=0)
+    assert cache.get("positions_0xa") is None
@@ -0,0 +1,54 @@
+import threading
+from data.SimilarityIndex import SimilarityIndex
+
+
+def _analyses(count, prefix):
+    return [{
+        'user_address': f"{prefix}{i}",
+        'metrics': {
+            'hourly_distribution': {i % 24: 10, (i * 7) % 24: 3},
+            'asset_distribution': {f"C{i % 5}": 5, 'BTC': 1},
+            'win_rate': (i % 10) / 10
+        },
+        'trading_style': {'primary_style': 'Scalper' if i % 2 else 'Day Trader', 'avg_holding_period_hours': i + 1}
+    } for i in range(count)]
+
+
+def test_similar_returns_nearest_other_traders():
+    index = SimilarityIndex(db=None, refresh_seconds=0)
+    index.build(_analyses(50, "0x"))
+
+    neighbours = index.similar("0x3", k=5)
+    assert len(neighbours) == 5
+    assert "0x3" not in [neighbour['user_address'] for neighbour in neighbours]
+    assert [neighbour['similarity'] for neighbour in neighbours] == sorted(
+        (neighbour['similarity'] for neighbour in neighbours), reverse=True)
+    assert index.similar("0xunknown") is None
+
+
+def test_queries_during_rebuilds_see_one_whole_index():
+    index = SimilarityIndex(db=None, refresh_seconds=0)
+    large, small = _analyses(400, "L"), _analyses(40, "S")
+    index.build(large)
+    stop = threading.Event()
+    errors = []
+
+    def rebuild():
+        while not stop.is_set():
+            index.build(small)
+            index.build(large)
+
+    builder = threading.Thread(target=rebuild, daemon=True)
+    builder.start()
+    try:
+        for _ in range(300):
+            for address, neighbours in index.similar_many(["L5", "S5", "L399"], k=10).items():
+                prefix = address[0]
+                if any(neighbour['user_address'][0] != prefix for neighbour in neighbours):
+                    errors.append((address, neighbours))
+    except IndexError as e:
+        errors.append(e)
+    finally:
+        stop.set()
+        builder.join()
+    assert not errors